@@ -0,0 +1,190 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from feedback import FeedbackService
+from feedback_cache import make_cache_key
+from scenarios import load_catalog
+
+DEFAULT_WORKERS = 8
+DEFAULT_REPORT_SECONDS = 10.0
+
+
+def read_items(path):
+    """Yield (line number, item, error) for every non-blank line of a JSONL file
+
+    A line that is not a JSON object has item None and an error message.
+    """
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield number, None, f"JSONDecodeError: {e}"
+                continue
+            if not isinstance(item, dict):
+                yield number, None, f"ValueError: expected a JSON object, got {type(item).__name__}"
+                continue
+            yield number, item, None
+
+
+def item_id(number, item):
+    """Stable id of an input item: its own "id" field or its line number"""
+    return str(item.get("id", number))
+
+
+def completed_ids(path):
+    """Ids already graded in an existing output file, used to resume a run
+
+    Rows that errored or fell back to local scoring are graded again.
+    """
+    if not os.path.exists(path):
+        return set()
+    done = set()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except ValueError:
+                # A partially written last line from an interrupted run
+                continue
+            if row.get("feedback", {}).get("source") not in (None, "fallback"):
+                done.add(row["id"])
+    return done
+
+
+class BatchStats:
+    """Throughput counters for one grading run"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.graded = 0
+        self.deduplicated = 0
+        self.skipped = 0
+        self.failed = 0
+        self.sources = {}
+
+    def record(self, feedback):
+        self.graded += 1
+        source = feedback.get("source", "unknown")
+        self.sources[source] = self.sources.get(source, 0) + 1
+
+    def report(self):
+        elapsed = time.monotonic() - self.started
+        rate = self.graded / elapsed if elapsed else 0.0
+        sources = ", ".join(f"{k}={v}" for k, v in sorted(self.sources.items()))
+        return (f"{self.graded} graded in {elapsed:.1f}s ({rate:.1f} items/s), "
+                f"{self.deduplicated} deduplicated, {self.skipped} resumed, {self.failed} failed"
+                + (f" [{sources}]" if sources else ""))
+
+
+def grade_item(service, item):
+    """Feedback for one input item, raising on invalid input"""
+    scenario_key = item["scenario_key"]
+    if scenario_key not in service.scenarios:
+        raise ValueError(f"Unknown scenario: {scenario_key}")
+    return service.get_feedback(scenario_key, item["prompt"], item["response"], item.get("history") or ())
+
+
+def grade_file(service, input_path, output_path, workers=DEFAULT_WORKERS, report_every=DEFAULT_REPORT_SECONDS,
+               log=sys.stderr):
+    """Grade every item of input_path into output_path and return the run's BatchStats
+
+    Items already present in the output file are skipped, so an interrupted
+    run picks up where it stopped. Identical items (same scenario, prompt,
+    normalized response and history) share one grading call. At most
+    workers * 2 items are in flight, so memory stays flat on large inputs.
+    """
+    stats = BatchStats()
+    done = completed_ids(output_path)
+    waiting = {}
+    by_key = {}
+    last_report = time.monotonic()
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="grade") as pool, \
+            open(output_path, "a", encoding="utf-8") as out:
+
+        def write(future):
+            key, idents = waiting.pop(future)
+            by_key.pop(key, None)
+            try:
+                feedback = future.result()
+                rows = [{"id": ident, "feedback": feedback} for ident in idents]
+                for _ in idents:
+                    stats.record(feedback)
+            except Exception as e:
+                rows = [{"id": ident, "error": f"{type(e).__name__}: {e}"} for ident in idents]
+                stats.failed += len(idents)
+            for row in rows:
+                out.write(json.dumps(row, ensure_ascii=False) + "\n")
+            out.flush()
+
+        def drain(block):
+            nonlocal last_report
+            if waiting:
+                finished, _ = wait(list(waiting), timeout=None if block else 0, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    write(future)
+            if log is not None and time.monotonic() - last_report >= report_every:
+                last_report = time.monotonic()
+                print(stats.report(), file=log, flush=True)
+
+        for number, item, error in read_items(input_path):
+            ident = str(number) if item is None else item_id(number, item)
+            if ident in done:
+                stats.skipped += 1
+                continue
+            done.add(ident)
+            if error is not None:
+                out.write(json.dumps({"id": ident, "error": error}, ensure_ascii=False) + "\n")
+                out.flush()
+                stats.failed += 1
+                continue
+
+            # Identical answers still being graded share one call
+            key = (make_cache_key(item["scenario_key"], item["prompt"], item["response"], item.get("history"))
+                   if {"scenario_key", "prompt", "response"} <= item.keys() else ("line", ident))
+            future = by_key.get(key)
+            if future is not None:
+                waiting[future][1].append(ident)
+                stats.deduplicated += 1
+                continue
+            future = pool.submit(grade_item, service, item)
+            by_key[key] = future
+            waiting[future] = (key, [ident])
+
+            while len(waiting) >= workers * 2:
+                drain(block=True)
+            drain(block=False)
+
+        while waiting:
+            drain(block=True)
+
+    if log is not None:
+        print(stats.report(), file=log, flush=True)
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Grade learner responses from a JSONL file without the UI")
+    parser.add_argument("input", help="JSONL file with scenario_key, prompt, response and optional history and id")
+    parser.add_argument("output", help="JSONL file to append results to; existing ids are skipped on resume")
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("BATCH_WORKERS", DEFAULT_WORKERS)),
+                        help="items graded in parallel (default: %(default)s)")
+    parser.add_argument("--report-every", type=float, default=DEFAULT_REPORT_SECONDS,
+                        help="seconds between progress reports on stderr (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    service = FeedbackService.from_env(load_catalog().scenarios)
+    stats = grade_file(service, args.input, args.output, workers=args.workers, report_every=args.report_every)
+    return 1 if stats.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,340 @@
+import argparse
+import gc
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "streamlit_app.py")
+DEFAULT_MOCK = "latency=0.8,jitter=0.3,seed=1"
+DEFAULT_USERS = 10
+DEFAULT_TURNS = 10
+DEFAULT_SESSIONS = 5
+DEFAULT_UNIQUE = 0.5
+DEFAULT_TOLERANCE = 0.1
+SESSION_TIMEOUT = 60
+
+# AppTest swaps a process-wide Runtime singleton in and out around every run
+_apptest_lock = threading.Lock()
+
+
+def percentile(samples, q):
+    """Linearly interpolated percentile of samples, q in [0, 1]"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    position = (len(ordered) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(seconds, elapsed):
+    """Count, throughput and latency percentiles (ms) of a list of durations"""
+    return {
+        "count": len(seconds),
+        "throughput": round(len(seconds) / elapsed, 2) if elapsed else 0.0,
+        **{f"p{int(q * 100)}_ms": round(percentile(seconds, q) * 1000, 1) if seconds else None
+           for q in (0.5, 0.95, 0.99)},
+        "max_ms": round(max(seconds) * 1000, 1) if seconds else None,
+    }
+
+
+def scripted_turns(scenarios, user, turns, unique_rate, rng):
+    """(scenario key, prompt, response, new conversation) for one simulated learner
+
+    Learners work through each scenario's prompts in order and then move on
+    to the next scenario. Answers are the suggested responses, made unique
+    at unique_rate so the feedback cache sees a realistic mix.
+    """
+    keys = list(scenarios)
+    position = user % len(keys)
+    turn_in_scenario = 0
+    for turn in range(turns):
+        prompts = scenarios[keys[position]]['prompts']
+        if turn_in_scenario >= len(prompts):
+            position = (position + 1) % len(keys)
+            prompts = scenarios[keys[position]]['prompts']
+            turn_in_scenario = 0
+        prompt = prompts[turn_in_scenario]
+        response = prompt.get('suggested_response') or prompt['german']
+        if rng.random() < unique_rate:
+            response += f" Das ist meine Antwort Nummer {user}-{turn}."
+        yield keys[position], prompt['german'], response, turn_in_scenario == 0
+        turn_in_scenario += 1
+
+
+def run_feedback_load(service, users=DEFAULT_USERS, turns=DEFAULT_TURNS, unique_rate=DEFAULT_UNIQUE, seed=1):
+    """Drive FeedbackService.get_feedback, as get_ai_feedback does, from concurrent learners
+
+    Every request streams, so time to the first real feedback field is
+    measured alongside the total.
+    """
+    lock = threading.Lock()
+    totals, first_fields, sources = [], [], {}
+    errors = []
+
+    def learner(user):
+        rng = random.Random(seed * 1000 + user)
+        history, context = [], None
+        for scenario_key, prompt, response, new_conversation in scripted_turns(
+                service.scenarios, user, turns, unique_rate, rng):
+            if new_conversation:
+                history, context = [], service.new_context()
+            first = []
+
+            def on_partial(fields):
+                if not first and not fields.get('provisional'):
+                    first.append(time.perf_counter())
+
+            started = time.perf_counter()
+            try:
+                feedback = service.get_feedback(scenario_key, prompt, response, history,
+                                                on_partial=on_partial, context=context)
+            except Exception as e:
+                with lock:
+                    errors.append(f"{type(e).__name__}: {e}")
+                continue
+            finished = time.perf_counter()
+            history.append({'prompt': prompt, 'response': response})
+            with lock:
+                totals.append(finished - started)
+                if first:
+                    first_fields.append(first[0] - started)
+                source = feedback.get('source', 'local')
+                sources[source] = sources.get(source, 0) + 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users, thread_name_prefix="learner") as pool:
+        list(pool.map(learner, range(users)))
+    elapsed = time.perf_counter() - started
+    return {
+        "users": users,
+        "elapsed_s": round(elapsed, 2),
+        "latency": summarize(totals, elapsed),
+        "first_field": summarize(first_fields, elapsed),
+        "sources": sources,
+        "errors": len(errors),
+    }
+
+
+def _click(at, label_prefix, sidebar=False):
+    buttons = at.sidebar.button if sidebar else at.button
+    for button in buttons:
+        if button.label.startswith(label_prefix):
+            return button.click().run()
+    raise RuntimeError(f"No button starting with {label_prefix!r}")
+
+
+def _continue_session(at):
+    """Fresh AppTest carrying on at's session, untimed
+
+    After st.rerun() switches screens, AppTest keeps widgets of the previous
+    screen in its element tree and fails on the next interaction; a browser
+    would have dropped them. Button states cannot be set and are left out.
+    """
+    from streamlit.testing.v1 import AppTest
+
+    buttons = {button.key for button in list(at.button) + list(at.sidebar.button) if button.key}
+    fresh = AppTest.from_file(APP_PATH, default_timeout=SESSION_TIMEOUT)
+    for key, value in at.session_state.filtered_state.items():
+        if key not in buttons:
+            fresh.session_state[key] = value
+    with _apptest_lock:
+        fresh = fresh.run()
+    if fresh.exception:
+        raise RuntimeError(fresh.exception[0].value)
+    return fresh
+
+
+def run_session(scenarios, scenario_key, timings):
+    """Walk one headless session through landing, scenarios, practice, feedback and progress
+
+    Each step's duration is appended to timings[step]. Returns the AppTest,
+    so its session stays alive until the caller drops it.
+    """
+    from streamlit.testing.v1 import AppTest
+
+    def step(name, action):
+        screen = at.session_state.current_screen if "current_screen" in at.session_state else None
+        with _apptest_lock:
+            started = time.perf_counter()
+            result = action()
+        timings.setdefault(name, []).append(time.perf_counter() - started)
+        if result.exception:
+            raise RuntimeError(f"{name}: {result.exception[0].value}")
+        if result.session_state.current_screen != screen:
+            result = _continue_session(result)
+        return result
+
+    at = AppTest.from_file(APP_PATH, default_timeout=SESSION_TIMEOUT)
+    at = step("landing", at.run)
+    at = step("scenarios", lambda: _click(at, "🚀"))
+    at = step("practice", lambda: at.button(key=f"btn_{scenario_key}").click().run())
+    prompts = scenarios[scenario_key]['prompts']
+    for _ in range(len(prompts) + 1):
+        if at.session_state.current_screen != 'practice':
+            break
+        prompt = prompts[min(at.session_state.current_turn, len(prompts) - 1)]
+        at.text_input(key="chat_input").input(prompt.get('suggested_response') or prompt['german'])
+        at = step("submit", lambda: at.button(key="send_btn").click().run())
+    if at.session_state.current_screen != 'feedback':
+        raise RuntimeError(f"expected the feedback screen, got {at.session_state.current_screen}")
+    at = step("progress", lambda: _click(at, "📊", sidebar=True))
+    return at
+
+
+def run_session_load(scenarios, sessions=DEFAULT_SESSIONS):
+    """Interleaved headless sessions through the scripted flow, with memory per live session
+
+    AppTest cannot run scripts in parallel, so sessions take turns step by
+    step and all stay alive until the end; concurrency on the feedback path
+    is what run_feedback_load measures. One warm-up session loads modules
+    and shared resources first, so the memory figure is what each
+    additional session costs.
+    """
+    # Session threads read AppTest state between runs, outside any script context
+    logging.getLogger("streamlit.runtime.scriptrunner.script_run_context").addFilter(
+        lambda record: "missing ScriptRunContext" not in record.getMessage())
+    keys = list(scenarios)
+    run_session(scenarios, keys[0], {})
+    gc.collect()
+
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    timings, errors, live = {}, [], []
+    lock = threading.Lock()
+
+    def session(index):
+        try:
+            at = run_session(scenarios, keys[index % len(keys)], timings)
+            with lock:
+                live.append(at)
+        except Exception as e:
+            with lock:
+                errors.append(str(e))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions, thread_name_prefix="session") as pool:
+        list(pool.map(session, range(sessions)))
+    elapsed = time.perf_counter() - started
+    gc.collect()
+    after, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "sessions": sessions,
+        "elapsed_s": round(elapsed, 2),
+        "steps": {name: summarize(values, elapsed) for name, values in timings.items()},
+        "memory_per_session_bytes": (after - before) // max(1, len(live)),
+        "peak_memory_bytes": peak - before,
+        "errors": len(errors),
+    }
+
+
+def _flatten(report, prefix=""):
+    for key, value in report.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            yield from _flatten(value, f"{name}.")
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield name, value
+
+
+def compare(report, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Regressions of report against baseline, as human-readable lines
+
+    Latencies and memory regress when they grow by more than tolerance,
+    throughput when it drops by more than tolerance, errors when they grow
+    at all.
+    """
+    current = dict(_flatten(report))
+    regressions = []
+    for name, old in _flatten(baseline):
+        new = current.get(name)
+        if new is None:
+            continue
+        leaf = name.rsplit(".", 1)[-1]
+        if leaf == "errors":
+            worse = new > old
+        elif leaf == "throughput":
+            worse = new < old * (1 - tolerance)
+        elif leaf.endswith("_ms") or leaf.endswith("_bytes"):
+            worse = old > 0 and new > old * (1 + tolerance)
+        else:
+            continue
+        if worse:
+            regressions.append(f"{name}: {old} -> {new}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the feedback pipeline and the app against a mock Gemini")
+    parser.add_argument("--mode", choices=("feedback", "sessions", "all"), default="all")
+    parser.add_argument("--users", type=int, default=DEFAULT_USERS,
+                        help="concurrent learners calling the feedback pipeline (default: %(default)s)")
+    parser.add_argument("--turns", type=int, default=DEFAULT_TURNS,
+                        help="answers submitted per learner (default: %(default)s)")
+    parser.add_argument("--unique", type=float, default=DEFAULT_UNIQUE,
+                        help="share of answers that are not repeats (default: %(default)s)")
+    parser.add_argument("--sessions", type=int, default=DEFAULT_SESSIONS,
+                        help="concurrent headless Streamlit sessions (default: %(default)s)")
+    parser.add_argument("--mock", default=os.environ.get("GEMINI_MOCK", DEFAULT_MOCK),
+                        help="mock Gemini options, e.g. latency=0.5,error_rate=0.05,malformed_rate=0.1")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="JSON report to compare against; regressions exit with status 1")
+    parser.add_argument("--save-baseline", action="store_true", help="write the report to --baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed relative slowdown before a figure counts as a regression (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    # Everything runs against the mock and throwaway stores
+    os.environ["GEMINI_MOCK"] = args.mock
+    os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+    os.environ.setdefault("FEEDBACK_STORE", "")
+    os.environ.setdefault("PROGRESS_STORE", os.path.join(tempfile.mkdtemp(prefix="benchmark"), "progress.db"))
+    os.environ.setdefault("TTS_ENGINE", "off")
+    os.environ.setdefault("STT_MODEL", "")
+
+    from feedback import FeedbackService
+    from scenarios import load_catalog
+
+    scenarios = load_catalog().scenarios
+    report = {"mock": args.mock}
+    if args.mode in ("feedback", "all"):
+        service = FeedbackService.from_env(scenarios)
+        report["feedback"] = run_feedback_load(service, args.users, args.turns, args.unique)
+        print(f"feedback: {json.dumps(report['feedback']['latency'])}", file=sys.stderr)
+    if args.mode in ("sessions", "all"):
+        report["sessions"] = run_session_load(scenarios, args.sessions)
+        print(f"sessions: {report['sessions']['memory_per_session_bytes'] // 1024} KiB per session, "
+              f"{report['sessions']['errors']} errors", file=sys.stderr)
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline and args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        return 0
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"regression: {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
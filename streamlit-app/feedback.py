@@ -0,0 +1,595 @@
+import copy
+import json
+import os
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from feedback_cache import FeedbackCache, make_cache_key
+from feedback_store import open_feedback_store
+from gemini_client import GeminiBusyError, GeminiClient
+from job_queue import DONE, JobFailedError, JobTimeoutError, open_job_queue
+from json_extract import FieldSchema, JSONObjectScanner
+from metrics import REGISTRY, TOKEN_BUCKETS
+from mock_gemini import MockGeminiModel
+from prompt_context import DEFAULT_SUMMARY_TOKENS, DEFAULT_TOKEN_BUDGET, ConversationContext, estimate_tokens
+from resilience import CircuitBreaker, CircuitOpenError, EventCounter, RateLimitedError, TokenBucket
+from scoring import PromptScorer, build_scorers
+
+FEEDBACK_FIELDS = ('relevance_score', 'what_worked', 'improvement', 'suggested_response', 'score_explanation')
+
+FEEDBACK_SCHEMA = FieldSchema({
+    'relevance_score': 'score',
+    'what_worked': 'text_list',
+    'improvement': 'text',
+    'suggested_response': 'text',
+    'score_explanation': 'text',
+})
+
+# Errors that mean Gemini is overloaded rather than broken
+OVERLOAD_ERRORS = (CircuitOpenError, RateLimitedError, GeminiBusyError, JobTimeoutError)
+
+_json_decoder = json.JSONDecoder()
+
+
+def clean_partial_feedback(fields):
+    """fields with each feedback field coerced through FEEDBACK_SCHEMA and unusable ones left out
+
+    Other keys, such as the provisional flag, pass through unchanged.
+    """
+    clean, _ = FEEDBACK_SCHEMA.validate(fields)
+    extra = {name: value for name, value in fields.items() if name not in FEEDBACK_SCHEMA.fields}
+    return dict(extra, **clean)
+
+
+def parse_partial_feedback(text):
+    """Extract the feedback fields that are already complete and valid in a partial JSON response"""
+    fields = {}
+    for name in FEEDBACK_FIELDS:
+        match = re.search(r'"%s"\s*:\s*' % name, text)
+        if not match:
+            continue
+        try:
+            value, end = _json_decoder.raw_decode(text, match.end())
+        except ValueError:
+            continue
+        # A value is only complete once the next delimiter has arrived
+        if end < len(text):
+            fields[name] = value
+    return clean_partial_feedback(fields)
+
+
+def job_request(scenario_key, prompt, user_response, conversation_history=()):
+    """A feedback request as plain JSON for the job queue"""
+    return {
+        "scenario_key": scenario_key,
+        "prompt": prompt,
+        "user_response": user_response,
+        "history": [{"prompt": turn['prompt'], "response": turn['response']} for turn in conversation_history],
+        "dropped": getattr(conversation_history, "dropped", 0),
+    }
+
+
+class FeedbackJob:
+    """A response handed to a queue worker, read back with FeedbackService.job_feedback"""
+
+    def __init__(self, job_id, cache_key, user_response, local, deadline):
+        self.job_id = job_id
+        self.cache_key = cache_key
+        self.user_response = user_response
+        self.local = local
+        self.deadline = deadline
+        # What to show until the worker publishes fields of its own
+        self.partial = {'relevance_score': local['relevance_score'], 'provisional': True}
+
+
+def generate_feedback(client, system_prompt, on_partial=None, wait=True, defaults=None):
+    """Call Gemini and parse its JSON feedback
+
+    The first balanced JSON object is taken from the output, whatever prose
+    or code fences surround it, and checked against FEEDBACK_SCHEMA. Fields
+    that are missing or malformed are asked for again in one short follow-up
+    call instead of regenerating everything; any still missing are taken
+    from defaults, or a ValueError is raised when there are none.
+
+    Safe to run off the script thread: it touches no Streamlit state.
+    """
+    scanner = JSONObjectScanner()
+    response_chars = 0
+    REGISTRY.observe("prompt_tokens", estimate_tokens(system_prompt), buckets=TOKEN_BUCKETS)
+    with REGISTRY.span("gemini", mode="single" if on_partial is None else "stream"):
+        if on_partial is None:
+            text = client.generate(system_prompt, wait=wait)
+            response_chars = len(text)
+            scanner.feed(text)
+        else:
+            # Stream chunks and report fields as soon as they are complete
+            reported = {}
+            for chunk_text in client.stream(system_prompt):
+                response_chars += len(chunk_text)
+                scanner.feed(chunk_text)
+                fields = parse_partial_feedback(scanner.partial)
+                if len(fields) > len(reported):
+                    reported = fields
+                    on_partial(fields)
+    REGISTRY.observe("response_tokens", response_chars // 4 + 1, buckets=TOKEN_BUCKETS)
+
+    with REGISTRY.span("parse"):
+        try:
+            parsed = scanner.result()
+        except ValueError:
+            # Truncated or malformed: keep whichever fields did come through
+            parsed = parse_partial_feedback(scanner.partial)
+        feedback, missing = FEEDBACK_SCHEMA.validate(parsed)
+
+    if missing:
+        with REGISTRY.span("repair"):
+            repaired = repair_feedback(client, system_prompt, missing, wait)
+        feedback.update(repaired)
+        feedback['repaired_fields'] = list(missing)
+        missing = [name for name in missing if name not in repaired]
+    if missing:
+        if defaults is None:
+            raise ValueError(f"Feedback is missing fields: {', '.join(missing)}")
+        for name in missing:
+            feedback[name] = defaults[name]
+        feedback['defaulted_fields'] = missing
+
+    feedback['source'] = 'gemini'
+    return feedback
+
+
+def repair_feedback(client, system_prompt, missing, wait=True):
+    """Ask Gemini for just the missing fields; returns the valid ones it gave, possibly none"""
+    repair_prompt = (
+        system_prompt
+        + "\n\nReply with only this JSON object and nothing else:\n"
+        + FEEDBACK_SCHEMA.template(missing)
+    )
+    try:
+        scanner = JSONObjectScanner()
+        scanner.feed(client.generate(repair_prompt, wait=wait))
+        repaired, _ = FEEDBACK_SCHEMA.validate(scanner.result())
+    except OVERLOAD_ERRORS:
+        return {}
+    except ValueError:
+        return {}
+    return {name: repaired[name] for name in missing if name in repaired}
+
+
+class FeedbackService:
+    """Turns learner responses into feedback; one instance is shared per process
+
+    Lookups go local gate -> memory cache -> persistent store -> speculative
+    call in flight -> identical request in flight -> Gemini, falling back to the local scorer when Gemini
+    cannot be reached. Used by the Streamlit app and the batch grader alike.
+    With a job queue and live workers, the Gemini step runs in a worker
+    process instead (see feedback_worker.py); the app queues it with
+    queue_feedback and reads the result back with job_feedback, so no
+    script run waits on Gemini.
+    """
+
+    def __init__(self, scenarios, client, cache, store=None, executor=None, context_budget=DEFAULT_TOKEN_BUDGET,
+                 summary_budget=DEFAULT_SUMMARY_TOKENS, jobs=None):
+        self.scenarios = scenarios
+        self.client = client
+        self.cache = cache
+        self.store = store
+        self.executor = executor or ThreadPoolExecutor(max_workers=4, thread_name_prefix="prefetch")
+        self.context_budget = context_budget
+        self.summary_budget = summary_budget
+        self.jobs = jobs
+        self.scorers = build_scorers(scenarios)
+        self.fallbacks = EventCounter()
+        self.repairs = EventCounter()
+        self.coalescing = EventCounter()
+        self._in_flight = {}
+        self._in_flight_lock = threading.Lock()
+        self._queued = {}
+        self._speculative = {}
+        self._prompt_parts = {}
+
+    @classmethod
+    def from_env(cls, scenarios, environ=os.environ):
+        """Build the service from GEMINI_*, FEEDBACK_* and PREFETCH_* settings"""
+        store = open_feedback_store(environ.get("FEEDBACK_STORE", ""), environ)
+        cache = FeedbackCache(
+            ttl_seconds=int(environ.get("FEEDBACK_CACHE_TTL", 24 * 60 * 60)),
+            max_bytes=int(environ.get("FEEDBACK_CACHE_MAX_BYTES", 32 * 1024 * 1024)),
+            max_entries=int(environ.get("FEEDBACK_CACHE_MAX_ENTRIES", 10_000)),
+        )
+
+        # Warm up with the most requested entries so a fresh process starts hot
+        if store is not None:
+            for key, feedback in store.hottest(int(environ.get("FEEDBACK_STORE_WARMUP", 500))):
+                cache.put(key, feedback)
+
+        # GEMINI_MOCK swaps in a local stand-in for benchmarks and offline runs
+        mock = environ.get("GEMINI_MOCK")
+        client = GeminiClient(
+            api_key=environ.get("GEMINI_API_KEY"),
+            model=MockGeminiModel.from_spec(mock) if mock else None,
+            model_name=environ.get("GEMINI_MODEL", "gemini-1.5-flash"),
+            max_concurrency=int(environ.get("GEMINI_MAX_CONCURRENCY", 8)),
+            timeout=float(environ.get("GEMINI_TIMEOUT", 30)),
+            queue_timeout=float(environ.get("GEMINI_QUEUE_TIMEOUT", 10)),
+            transport=environ.get("GEMINI_TRANSPORT") or None,
+            rate_limiter=TokenBucket(
+                rate=float(environ.get("GEMINI_RATE_LIMIT", 5)),
+                capacity=float(environ.get("GEMINI_RATE_BURST", 10)),
+            ),
+            breaker=CircuitBreaker(
+                failure_threshold=int(environ.get("GEMINI_BREAKER_THRESHOLD", 5)),
+                reset_timeout=float(environ.get("GEMINI_BREAKER_RESET", 30)),
+            ),
+            retries=int(environ.get("GEMINI_RETRIES", 2)),
+        )
+        executor = ThreadPoolExecutor(
+            max_workers=int(environ.get("PREFETCH_WORKERS", 4)),
+            thread_name_prefix="prefetch",
+        )
+        executor.submit(client.warm)
+        return cls(
+            scenarios, client, cache, store=store, executor=executor,
+            context_budget=int(environ.get("CONTEXT_TOKEN_BUDGET", DEFAULT_TOKEN_BUDGET)),
+            summary_budget=int(environ.get("CONTEXT_SUMMARY_TOKENS", DEFAULT_SUMMARY_TOKENS)),
+            jobs=open_job_queue(environ.get("FEEDBACK_QUEUE", ""), environ),
+        )
+
+    def use_scenarios(self, scenarios):
+        """Switch to a reloaded scenario catalog; a no-op for the one already in use"""
+        if scenarios is self.scenarios:
+            return
+        scorers = build_scorers(scenarios)
+        self._prompt_parts = {}
+        self.scorers = scorers
+        self.scenarios = scenarios
+
+    def static_prompt_parts(self, scenario_key, prompt):
+        """Static pieces of the system prompt for one scenario turn
+
+        Only the conversation context and the user response change between
+        requests, so everything around them is built once per (scenario, prompt).
+        """
+        parts = self._prompt_parts.get((scenario_key, prompt))
+        if parts is not None:
+            return parts
+
+        scenario = self.scenarios[scenario_key]
+        head = f"""You are a German language tutor providing feedback on workplace conversation practice.
+
+Scenario: {scenario['title']}
+Context: {scenario['context']}
+Formality: {scenario['formality']}
+Difficulty: {scenario['difficulty']}
+
+"""
+        middle = f"""
+
+Current Prompt: "{prompt}"
+User Response: \""""
+        tail = f"""\"
+
+Provide feedback in this exact JSON format:
+{{
+    "relevance_score": <1-5>,
+    "what_worked": ["point 1", "point 2"],
+    "improvement": "one specific improvement area",
+    "suggested_response": "a better German response",
+    "score_explanation": "brief explanation of score"
+}}
+
+Evaluate:
+1. Relevance to the prompt (1-5)
+2. Appropriateness of formality ({scenario['formality']})
+3. Grammar and vocabulary
+4. Cultural appropriateness for German workplace
+
+Be encouraging but specific. Focus on practical improvements."""
+        parts = (head, middle, tail)
+        self._prompt_parts[(scenario_key, prompt)] = parts
+        return parts
+
+    def new_context(self):
+        """An empty conversation context with this service's token budgets"""
+        return ConversationContext(self.context_budget, self.summary_budget)
+
+    def build_system_prompt(self, scenario_key, prompt, user_response, conversation_history, context=None):
+        """Assemble the full system prompt for one feedback request
+
+        Pass a long-lived context (one per conversation) so only new turns are
+        rendered; without one the history is rendered from scratch.
+        """
+        head, middle, tail = self.static_prompt_parts(scenario_key, prompt)
+        if context is None:
+            context = self.new_context()
+        context_str = context.update(conversation_history).render()
+        return "".join((head, context_str, middle, user_response, tail))
+
+    def local_feedback(self, scenario_key, prompt, user_response):
+        """Instant deterministic feedback from the local scoring engine"""
+        scorer = self.scorers.get((scenario_key, prompt))
+        if scorer is None:
+            scorer = PromptScorer(self.scenarios[scenario_key]['formality'])
+        return scorer.score(user_response)
+
+    def cached_feedback(self, cache_key):
+        """Feedback for cache_key from memory or the persistent store, or None"""
+        cached = self.cache.get(cache_key)
+        if cached is None and self.store is not None:
+            cached = self.store.get(cache_key)
+            if cached is not None:
+                self.cache.put(cache_key, cached)
+        return cached
+
+    def remember(self, cache_key, feedback):
+        """Write feedback through to the memory cache and the persistent store
+
+        Feedback already degraded to local scoring, such as a worker's
+        fallback, is not worth caching and is skipped.
+        """
+        if feedback.get('source') == 'fallback':
+            return
+        self.cache.put(cache_key, feedback)
+        if self.store is not None:
+            self.store.put(cache_key, feedback)
+
+    def get_feedback(self, scenario_key, prompt, user_response, conversation_history=(), on_partial=None,
+                     on_error=None, context=None):
+        """Feedback for one response
+
+        When on_partial is given the response is streamed and on_partial is
+        called with every newly completed set of fields, score first. It is
+        called once up front with the local provisional score, flagged as
+        provisional. on_error is told about failures other than overload.
+        """
+        # Empty or non-German answers never reach Gemini
+        with REGISTRY.span("local_score"):
+            local = self.local_feedback(scenario_key, prompt, user_response)
+        if local['gate'] is not None:
+            self._count_request("gate")
+            if on_partial is not None:
+                on_partial(local)
+            return local
+        if on_partial is not None:
+            on_partial({'relevance_score': local['relevance_score'], 'provisional': True})
+
+        # Serve repeated answers from the cache
+        with REGISTRY.span("cache_lookup"):
+            cache_key = make_cache_key(scenario_key, prompt, user_response, conversation_history)
+            cached = self.cached_feedback(cache_key)
+        if cached is not None:
+            self._count_request("cache")
+            cached['transcript'] = user_response
+            if on_partial is not None:
+                on_partial(cached)
+            return cached
+
+        try:
+            # Reuse a speculative call for the same text that is still running, within the Gemini deadline
+            feedback = None
+            pending = self._speculative.get(cache_key)
+            if pending is not None:
+                with REGISTRY.span("speculative_wait"):
+                    try:
+                        if pending.exception(timeout=self.client.timeout) is None:
+                            feedback = pending.result()
+                    except FutureTimeoutError:
+                        pass
+            if feedback is not None:
+                self._count_request("speculative")
+                if on_partial is not None:
+                    on_partial(feedback)
+                self.remember(cache_key, feedback)
+            else:
+                feedback = self._single_flight(cache_key, on_partial, lambda: self._fresh_feedback(
+                    scenario_key, prompt, user_response, conversation_history, local, on_partial, context
+                ), remember=self.remember)
+
+            feedback['transcript'] = user_response
+            return feedback
+
+        except OVERLOAD_ERRORS as e:
+            # Degrade quietly while Gemini is overloaded or the breaker is open
+            feedback = self.fallback_feedback(local, reason=type(e).__name__)
+        except Exception as e:
+            if on_error is not None:
+                on_error(e)
+            feedback = self.fallback_feedback(local, reason=type(e).__name__)
+
+        if on_partial is not None:
+            on_partial(feedback)
+        return feedback
+
+    def queue_feedback(self, scenario_key, prompt, user_response, conversation_history=()):
+        """Hand a response to a queue worker and return its FeedbackJob without waiting
+
+        Returns None when get_feedback should answer instead: when no worker
+        is running, or when the response is gated, cached or already being
+        evaluated in this process, none of which needs a job. Identical
+        responses queued while a job runs share it.
+        """
+        if self.jobs is None or not self.jobs.has_workers():
+            return None
+        local = self.local_feedback(scenario_key, prompt, user_response)
+        if local['gate'] is not None:
+            return None
+        cache_key = make_cache_key(scenario_key, prompt, user_response, conversation_history)
+        if cache_key in self._speculative or self.cached_feedback(cache_key) is not None:
+            return None
+        with self._in_flight_lock:
+            if cache_key in self._in_flight:
+                return None
+            job = self._queued.get(cache_key)
+        if job is not None:
+            self.coalescing.incr("coalesced")
+            return job
+        job_id = self.jobs.run(job_request(scenario_key, prompt, user_response, conversation_history))
+        job = FeedbackJob(job_id, cache_key, user_response, local, self.jobs.deadline())
+        with self._in_flight_lock:
+            self._queued[cache_key] = job
+        self.coalescing.incr("leaders")
+        return job
+
+    def job_feedback(self, job, on_error=None):
+        """Feedback for a queued job once its worker is done, else None
+
+        Reads the job row once. Fields the worker has published so far are
+        kept in job.partial. A job that failed or ran past its deadline gets
+        the local fallback; on_error is told about failures other than
+        timeouts.
+        """
+        try:
+            status, partial, result = self.jobs.check(job.job_id, job.deadline)
+        except JobTimeoutError as e:
+            feedback = self.fallback_feedback(job.local, reason=type(e).__name__)
+        except Exception as e:
+            if on_error is not None:
+                on_error(e)
+            feedback = self.fallback_feedback(job.local, reason=type(e).__name__)
+        else:
+            if status != DONE:
+                if partial is not None:
+                    job.partial = partial
+                return None
+            feedback = result
+            self._count_request("queue")
+            self.remember(job.cache_key, feedback)
+        with self._in_flight_lock:
+            if self._queued.get(job.cache_key) is job:
+                del self._queued[job.cache_key]
+        feedback['transcript'] = job.user_response
+        return feedback
+
+    def _fresh_feedback(self, scenario_key, prompt, user_response, conversation_history, local, on_partial, context):
+        """Feedback from a queue worker when one is running, else from Gemini in this process"""
+        if self.jobs is not None and self.jobs.has_workers():
+            with REGISTRY.span("queue_wait"):
+                job_id = self.jobs.run(job_request(scenario_key, prompt, user_response, conversation_history))
+                feedback = self.jobs.wait(job_id, on_partial)
+            self._count_request("queue")
+            return feedback
+        with REGISTRY.span("build_prompt"):
+            system_prompt = self.build_system_prompt(
+                scenario_key, prompt, user_response, conversation_history, context
+            )
+        feedback = self.generate(system_prompt, local, on_partial)
+        self._count_request("gemini")
+        return feedback
+
+    def _single_flight(self, cache_key, on_partial, compute, remember=None):
+        """Result of compute(), shared with every identical request that arrives while it runs
+
+        The first request for cache_key computes and streams as usual; the
+        others wait for its result and get their own copy of it, or its
+        exception. A classroom submitting the same answer makes one call.
+        The leader passes its result to remember(cache_key, result) before
+        leaving the in-flight map, so a request arriving just after finds it
+        in the cache.
+        """
+        with self._in_flight_lock:
+            future = self._in_flight.get(cache_key)
+            leader = future is None
+            if leader:
+                future = self._in_flight[cache_key] = Future()
+        if leader:
+            self.coalescing.incr("leaders")
+            try:
+                feedback = compute()
+            except BaseException as e:
+                future.set_exception(e)
+                raise
+            else:
+                if remember is not None:
+                    remember(cache_key, feedback)
+                # Followers copy from a snapshot the leader's caller cannot mutate
+                future.set_result(copy.deepcopy(feedback))
+            finally:
+                with self._in_flight_lock:
+                    self._in_flight.pop(cache_key, None)
+            return feedback
+
+        self.coalescing.incr("coalesced")
+        with REGISTRY.span("coalesced_wait"):
+            feedback = copy.deepcopy(future.result())
+        self._count_request("coalesced")
+        if on_partial is not None:
+            on_partial(feedback)
+        return feedback
+
+    def coalescing_stats(self) -> dict:
+        """Leader and coalesced request counts, and the share of requests that were coalesced"""
+        counts = self.coalescing.snapshot()
+        leaders, coalesced = counts.get("leaders", 0), counts.get("coalesced", 0)
+        with self._in_flight_lock:
+            in_flight = len(self._in_flight) + len(self._queued)
+        return {
+            "leaders": leaders,
+            "coalesced": coalesced,
+            "rate": coalesced / (leaders + coalesced) if leaders + coalesced else 0.0,
+            "in_flight": in_flight,
+        }
+
+    def generate(self, system_prompt, local, on_partial=None, wait=True):
+        """Gemini feedback with unusable fields repaired, or filled in from the local scorer"""
+        feedback = generate_feedback(self.client, system_prompt, on_partial, wait=wait, defaults=local)
+        for name in feedback.get('repaired_fields', ()):
+            self.repairs.incr(name)
+        for name in feedback.get('defaulted_fields', ()):
+            self.repairs.incr(f"{name}_defaulted")
+        return feedback
+
+    def fallback_feedback(self, local, reason):
+        """Local scorer feedback used when Gemini cannot be reached, clearly labelled as such"""
+        self.fallbacks.incr(reason)
+        self._count_request("fallback")
+        return dict(local, source="fallback", fallback_reason=reason)
+
+    def _count_request(self, source):
+        REGISTRY.incr("feedback_requests", source=source)
+        REGISTRY.annotate(source=source)
+
+    def speculate(self, scenario_key, prompt, user_response, conversation_history, context=None):
+        """Start evaluating a typed but unsubmitted answer in the background
+
+        Returns True if a call was started. The result lands in the feedback
+        cache, where get_feedback picks it up if the submitted text matches.
+        """
+        local = self.local_feedback(scenario_key, prompt, user_response)
+        if local['gate'] is not None:
+            return False
+        cache_key = make_cache_key(scenario_key, prompt, user_response, conversation_history)
+        if cache_key in self._speculative or self.cache.get(cache_key) is not None:
+            return False
+
+        def store_result(future):
+            self._speculative.pop(cache_key, None)
+            if future.exception() is None:
+                self.remember(cache_key, future.result())
+
+        system_prompt = self.build_system_prompt(
+            scenario_key, prompt, user_response, conversation_history, context
+        )
+        future = self.executor.submit(self.generate, system_prompt, local, wait=False)
+        self._speculative[cache_key] = future
+        future.add_done_callback(store_result)
+        return True
+
+    def prefetch(self, scenario_key, turn):
+        """Precompute the static prompt parts for an upcoming turn"""
+        prompts = self.scenarios[scenario_key]['prompts']
+        if turn < len(prompts):
+            self.static_prompt_parts(scenario_key, prompts[turn]['german'])
+
+    def stats(self) -> dict:
+        """Cache, Gemini client, fallback and repair counters"""
+        return {
+            "cache": self.cache.stats(),
+            "gemini": self.client.stats(),
+            "fallbacks": self.fallbacks.snapshot(),
+            "repairs": self.repairs.snapshot(),
+            "speculative_in_flight": len(self._speculative),
+            "coalescing": self.coalescing_stats(),
+            "queue": self.jobs.stats() if self.jobs is not None else None,
+        }
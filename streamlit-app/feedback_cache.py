@@ -0,0 +1,125 @@
+import hashlib
+import json
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+# Defaults for the process-wide feedback cache
+DEFAULT_TTL_SECONDS = 24 * 60 * 60
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+DEFAULT_MAX_ENTRIES = 10_000
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_SPACE_BEFORE_PUNCT_RE = re.compile(r"\s+([,.!?;:])")
+
+
+def normalize_response(text: str) -> str:
+    """Normalize a learner response so near-identical answers share a cache key"""
+    text = unicodedata.normalize("NFKC", text or "")
+    text = _WHITESPACE_RE.sub(" ", text).strip()
+    return _SPACE_BEFORE_PUNCT_RE.sub(r"\1", text)
+
+
+def history_fingerprint(conversation_history) -> str:
+    """Stable fingerprint of the previous turns of a conversation"""
+    digest = hashlib.sha1()
+    for turn in conversation_history or []:
+        digest.update(normalize_response(turn['prompt']).encode("utf-8"))
+        digest.update(b"\x00")
+        digest.update(normalize_response(turn['response']).encode("utf-8"))
+        digest.update(b"\x01")
+    return digest.hexdigest()
+
+
+def make_cache_key(scenario_key, prompt, user_response, conversation_history=None) -> str:
+    """Build the cache key for one feedback request"""
+    parts = [
+        scenario_key,
+        normalize_response(prompt),
+        normalize_response(user_response),
+        history_fingerprint(conversation_history),
+    ]
+    return hashlib.sha1("\x00".join(parts).encode("utf-8")).hexdigest()
+
+
+class FeedbackCache:
+    """Thread-safe LRU cache with TTL expiry and a size cap in bytes
+
+    Values are stored as JSON so every hit hands out a fresh copy and the
+    byte accounting matches what is actually held in memory.
+    """
+
+    def __init__(self, ttl_seconds=DEFAULT_TTL_SECONDS, max_bytes=DEFAULT_MAX_BYTES,
+                 max_entries=DEFAULT_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (payload, expires_at, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        """Return a copy of the cached feedback for key, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            payload, expires_at, _ = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return json.loads(payload)
+
+    def put(self, key, feedback):
+        """Store feedback under key, evicting least recently used entries as needed"""
+        payload = json.dumps(feedback, ensure_ascii=False)
+        size = len(key) + len(payload.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (payload, time.monotonic() + self.ttl_seconds, size)
+            self._bytes += size
+            while self._entries and (self._bytes > self.max_bytes or len(self._entries) > self.max_entries):
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every cached entry"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        """Snapshot of the cache counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _remove(self, key):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,161 @@
+import json
+import os
+from abc import ABC, abstractmethod
+import sqlite3
+import threading
+import time
+
+DEFAULT_TTL_SECONDS = 30 * 24 * 60 * 60
+# Hit counts are kept in memory and written at most this often, so reads never take the write lock
+HIT_FLUSH_SECONDS = 30.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS feedback (
+    key TEXT PRIMARY KEY,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_hit_at REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_feedback_hits ON feedback (hits DESC, last_hit_at DESC);
+"""
+
+
+class FeedbackStore(ABC):
+    """Interface for persistent feedback backends shared between worker processes"""
+
+    @abstractmethod
+    def get(self, key):
+        """Return stored feedback for key, or None"""
+
+    @abstractmethod
+    def put(self, key, feedback):
+        """Persist feedback under key"""
+
+    @abstractmethod
+    def hottest(self, limit):
+        """Return up to limit (key, feedback) pairs, most requested first"""
+
+    def close(self):
+        pass
+
+
+class SQLiteFeedbackStore(FeedbackStore):
+    """Feedback store in a single SQLite file in WAL mode
+
+    WAL lets any number of Streamlit processes read concurrently while one
+    writes, and the file survives restarts and deploys. Each thread gets its
+    own connection because sqlite3 connections cannot be shared. Hits are
+    counted in memory and added to the file in one write every
+    hit_flush_seconds, so serving a cached result is a plain read.
+    """
+
+    def __init__(self, path, ttl_seconds=DEFAULT_TTL_SECONDS, hit_flush_seconds=HIT_FLUSH_SECONDS):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.hit_flush_seconds = hit_flush_seconds
+        self._local = threading.local()
+        self._hits_lock = threading.Lock()
+        self._hits = {}
+        self._hits_flushed_at = time.monotonic()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        conn.executescript(_SCHEMA)
+        conn.commit()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT payload, created_at FROM feedback WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        payload, created_at = row
+        now = time.time()
+        if created_at + self.ttl_seconds <= now:
+            return None
+        with self._hits_lock:
+            count, _ = self._hits.get(key, (0, now))
+            self._hits[key] = (count + 1, now)
+            due = time.monotonic() - self._hits_flushed_at >= self.hit_flush_seconds
+        if due:
+            self.flush_hits()
+        return json.loads(payload)
+
+    def flush_hits(self):
+        """Add the hits counted in memory since the last flush to the file"""
+        with self._hits_lock:
+            hits, self._hits = self._hits, {}
+            self._hits_flushed_at = time.monotonic()
+        if not hits:
+            return
+        conn = self._connection()
+        try:
+            conn.execute("BEGIN")
+            conn.executemany(
+                "UPDATE feedback SET hits = hits + ?, last_hit_at = MAX(last_hit_at, ?) WHERE key = ?",
+                [(count, last_hit_at, key) for key, (count, last_hit_at) in hits.items()],
+            )
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            # Hit counts only rank the warm-up; losing a few is harmless
+
+    def put(self, key, feedback):
+        now = time.time()
+        self._connection().execute(
+            """INSERT INTO feedback (key, payload, created_at, last_hit_at, hits)
+               VALUES (?, ?, ?, ?, 0)
+               ON CONFLICT(key) DO UPDATE SET payload = excluded.payload,
+                                              created_at = excluded.created_at""",
+            (key, json.dumps(feedback, ensure_ascii=False), now, now),
+        )
+
+    def hottest(self, limit):
+        self.flush_hits()
+        rows = self._connection().execute(
+            "SELECT key, payload FROM feedback WHERE created_at > ? "
+            "ORDER BY hits DESC, last_hit_at DESC LIMIT ?",
+            (time.time() - self.ttl_seconds, limit),
+        ).fetchall()
+        return [(key, json.loads(payload)) for key, payload in rows]
+
+    def prune(self):
+        """Delete expired entries and return how many were removed"""
+        cursor = self._connection().execute(
+            "DELETE FROM feedback WHERE created_at <= ?", (time.time() - self.ttl_seconds,)
+        )
+        return cursor.rowcount
+
+    def close(self):
+        self.flush_hits()
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def open_feedback_store(url, environ=os.environ):
+    """Open the feedback store described by url, or return None when unset
+
+    Accepts a plain file path or a ``sqlite:///path`` URL.
+    """
+    if not url:
+        return None
+    if url.startswith("sqlite:///"):
+        url = url[len("sqlite:///"):]
+    elif "://" in url:
+        raise ValueError(f"Unsupported feedback store: {url}")
+    return SQLiteFeedbackStore(url, ttl_seconds=float(environ.get("FEEDBACK_STORE_TTL", DEFAULT_TTL_SECONDS)))
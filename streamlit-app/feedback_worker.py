@@ -0,0 +1,139 @@
+import argparse
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+
+from feedback import FeedbackService, clean_partial_feedback
+from job_queue import DEFAULT_RETENTION_SECONDS, WORKER_STALE_SECONDS, open_job_queue
+from scenarios import CONTENT_DIR, CatalogLoader
+from session_model import TurnHistory
+
+DEFAULT_PROCESSES = 2
+DEFAULT_THREADS = 4
+IDLE_POLL_SECONDS = 0.1
+# Longest a slot waits before trying the queue again after an error
+MAX_BACKOFF_SECONDS = 5.0
+PRUNE_INTERVAL = 60.0
+
+logger = logging.getLogger(__name__)
+
+
+def handle_job(service, queue, job_id, request):
+    """Feedback for one queued request, publishing fields to the queue as they stream in"""
+    scenario_key = request["scenario_key"]
+    if scenario_key not in service.scenarios:
+        raise ValueError(f"Unknown scenario: {scenario_key}")
+    history = TurnHistory(request.get("history") or ())
+    history.dropped = request.get("dropped", 0)
+    return service.get_feedback(
+        scenario_key, request["prompt"], request["user_response"], history,
+        on_partial=lambda fields: queue.publish(job_id, clean_partial_feedback(fields)),
+    )
+
+
+def work(queue_url, name, threads, stop):
+    """Worker process: threads slots claiming and grading jobs until stop is set"""
+    # Ctrl+C reaches the whole process group; the parent decides when to stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # The UI-side settings would have this process enqueue to itself
+    environ = dict(os.environ, FEEDBACK_QUEUE="")
+    # Same content and reload check as the app, so edits reach the workers too
+    catalog = CatalogLoader(
+        environ.get("CATALOG_DIR", CONTENT_DIR),
+        check_interval=float(environ.get("CATALOG_RELOAD_SECONDS", 2)),
+    )
+    service = FeedbackService.from_env(catalog.get().scenarios, environ)
+    queue = open_job_queue(queue_url)
+
+    def slot(index):
+        worker = f"{name}/{index}"
+        backoff = IDLE_POLL_SECONDS
+        while not stop.is_set():
+            try:
+                job = queue.claim(worker)
+                if job is None:
+                    stop.wait(IDLE_POLL_SECONDS)
+                    continue
+                job_id, request = job
+                try:
+                    service.use_scenarios(catalog.get().scenarios)
+                    feedback = handle_job(service, queue, job_id, request)
+                except Exception as e:
+                    queue.fail(job_id, worker, f"{type(e).__name__}: {e}")
+                else:
+                    queue.complete(job_id, worker, feedback)
+            except Exception:
+                # A locked or unreachable queue; an unfinished job goes to another worker once its lease expires
+                logger.exception("%s: job queue error, retrying in %.1fs", worker, backoff)
+                stop.wait(backoff)
+                backoff = min(MAX_BACKOFF_SECONDS, backoff * 2)
+            else:
+                backoff = IDLE_POLL_SECONDS
+
+    slots = [threading.Thread(target=slot, args=(index,), name=f"job-{index}", daemon=True) for index in range(threads)]
+    for thread in slots:
+        thread.start()
+
+    # Busy slots cannot check in, so the process does it for them while any is left
+    last_prune = 0.0
+    while not stop.is_set():
+        if not any(thread.is_alive() for thread in slots):
+            logger.error("%s: no job slots left, stopping", name)
+            break
+        try:
+            queue.heartbeat(name)
+            if time.monotonic() - last_prune >= PRUNE_INTERVAL:
+                queue.prune(DEFAULT_RETENTION_SECONDS)
+                last_prune = time.monotonic()
+        except Exception:
+            logger.exception("%s: heartbeat failed", name)
+        stop.wait(WORKER_STALE_SECONDS / 3)
+    for thread in slots:
+        thread.join()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Grade feedback jobs queued by the Streamlit app")
+    parser.add_argument("--queue", default=os.environ.get("FEEDBACK_QUEUE", ""),
+                        help="SQLite file (or sqlite:///path) shared with the app (default: $FEEDBACK_QUEUE)")
+    parser.add_argument("--processes", type=int, default=int(os.environ.get("FEEDBACK_WORKER_PROCESSES", DEFAULT_PROCESSES)),
+                        help="worker processes (default: %(default)s)")
+    parser.add_argument("--threads", type=int, default=int(os.environ.get("FEEDBACK_WORKER_THREADS", DEFAULT_THREADS)),
+                        help="jobs each process grades concurrently (default: %(default)s)")
+    args = parser.parse_args(argv)
+    if not args.queue:
+        parser.error("set --queue or FEEDBACK_QUEUE")
+    # Create the schema once before the workers race for it
+    open_job_queue(args.queue).close()
+
+    context = multiprocessing.get_context("spawn")
+    stop = context.Event()
+    host = socket.gethostname()
+    processes = [
+        context.Process(target=work, args=(args.queue, f"{host}-{os.getpid()}-{index}", args.threads, stop),
+                        name=f"feedback-worker-{index}")
+        for index in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    # SIGTERM shuts down like Ctrl+C: workers finish their current jobs first
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    print(f"{len(processes)} workers x {args.threads} threads on {args.queue}", file=sys.stderr, flush=True)
+    try:
+        while any(process.is_alive() for process in processes):
+            time.sleep(1.0)
+    except KeyboardInterrupt:
+        pass
+    stop.set()
+    for process in processes:
+        process.join()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
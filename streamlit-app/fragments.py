@@ -0,0 +1,140 @@
+import hashlib
+import json
+import os
+from functools import lru_cache
+
+STYLESHEET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "style.css")
+
+# Landing page introduction, per language
+LANDING_CONTENT = {
+    'en': """
+            <div style='color: #1e293b !important;'>
+            <h3 style='color: #1e293b !important;'>Practice German workplace conversations with confidence</h3>
+
+            <p style='color: #1e293b !important;'>✅ <strong>Low-pressure environment</strong> - Practice without judgment</p>
+            <p style='color: #1e293b !important;'>✅ <strong>Instant AI feedback</strong> - Get specific improvement tips</p>
+            <p style='color: #1e293b !important;'>✅ <strong>Real scenarios</strong> - Work-relevant conversations</p>
+            <p style='color: #1e293b !important;'>✅ <strong>Your pace</strong> - Practice anytime, anywhere</p>
+
+            <p style='color: #1e293b !important;'>Perfect for professionals who can read German but want to improve speaking confidence.</p>
+            </div>
+            """,
+    'de': """
+            <div style='color: #1e293b !important;'>
+            <h3 style='color: #1e293b !important;'>Üben Sie deutsche Gespräche am Arbeitsplatz mit Selbstvertrauen</h3>
+
+            <p style='color: #1e293b !important;'>✅ <strong>Entspannte Umgebung</strong> - Üben Sie ohne Beurteilung</p>
+            <p style='color: #1e293b !important;'>✅ <strong>Sofortiges KI-Feedback</strong> - Erhalten Sie spezifische Verbesserungstipps</p>
+            <p style='color: #1e293b !important;'>✅ <strong>Echte Szenarien</strong> - Arbeitsrelevante Gespräche</p>
+            <p style='color: #1e293b !important;'>✅ <strong>Ihr Tempo</strong> - Üben Sie jederzeit, überall</p>
+
+            <p style='color: #1e293b !important;'>Perfekt für Fachkräfte, die Deutsch lesen können, aber ihr Sprechvertrauen verbessern möchten.</p>
+            </div>
+            """,
+}
+
+
+@lru_cache(maxsize=1)
+def stylesheet():
+    """(digest, CSS) of style.css, read once per process"""
+    with open(STYLESHEET_PATH, encoding="utf-8") as f:
+        css = f.read()
+    return hashlib.sha256(css.encode("utf-8")).hexdigest()[:16], css
+
+
+@lru_cache(maxsize=1)
+def stylesheet_injector_html():
+    """Script that installs the app's CSS in the page head, where it outlives the element that sent it
+
+    Rendered through components.html, whose frame shares the app's origin.
+    Installing again replaces the previous version rather than adding one.
+    """
+    _, css = stylesheet()
+    return f"""<script>
+const doc = window.parent.document;
+let style = doc.getElementById("deutsch-fluent-style");
+if (!style) {{
+    style = doc.createElement("style");
+    style.id = "deutsch-fluent-style";
+    doc.head.appendChild(style);
+}}
+style.textContent = {json.dumps(css)};
+</script>"""
+
+
+@lru_cache(maxsize=16)
+def landing_header_html(title_text, subtitle_text):
+    """Landing page title block"""
+    return f"""
+        <h1 style='text-align: center; color: #1f77b4 !important;'>{title_text}</h1>
+        <h3 style='text-align: center; color: #666 !important;'>{subtitle_text}</h3>
+    """
+
+
+@lru_cache(maxsize=256)
+def scenario_card_html(icon, title, level_label, difficulty, formality_label, formality, context):
+    """Scenario card on the selection screen, rendered as a single element"""
+    return (
+        f"<h3 style='color: #1e293b !important;'>{icon} {title}</h3>"
+        f"<p style='color: #1e293b !important;'><strong>{level_label}:</strong> {difficulty}</p>"
+        f"<p style='color: #1e293b !important;'><strong>{formality_label}:</strong> {formality}</p>"
+        f"<p style='color: #64748b !important; font-style: italic;'>{context[:60]}...</p>"
+    )
+
+
+@lru_cache(maxsize=4096)
+def assistant_bubble_html(german, english, lang, speak=True):
+    """Assistant chat bubble (left, muted background) with the translation below
+
+    speak adds a button that reads the German text with the browser's voice.
+    """
+    display_text = english if lang == 'en' and english else german
+    translation_text = german if lang == 'en' and english else english
+    translation = (
+        f'<p class="chat-translation" style="margin: 8px 0 0 0; color: #64748b !important;">{translation_text}</p>'
+        if translation_text else ''
+    )
+    spoken = german.replace("'", "\\'")
+    button = (
+        f'<button onclick="speakGerman(\'{spoken}\')" style="background: none; border: none; cursor: pointer; padding: 4px; flex-shrink: 0; opacity: 0.7;">🔊</button>'
+        if speak else ''
+    )
+    return f"""
+            <div style="display: flex; justify-content: flex-start; margin-bottom: 16px;">
+                <div class="chat-bubble chat-bubble-assistant" style="max-width: 85%;">
+                    <div style="display: flex; align-items: flex-start; gap: 8px;">
+                        <div style="flex: 1;">
+                            <p style="margin: 0; font-size: 14px; line-height: 1.6; color: #1e293b !important;">{display_text}</p>
+                            {translation}
+                        </div>
+                        {button}
+                    </div>
+                </div>
+            </div>
+            """
+
+
+@lru_cache(maxsize=4096)
+def user_bubble_html(content):
+    """User chat bubble (right, blue background)"""
+    return f"""
+            <div style="display: flex; justify-content: flex-end; margin-bottom: 16px;">
+                <div class="chat-bubble chat-bubble-user" style="max-width: 85%;">
+                    <p style="margin: 0; font-size: 14px; line-height: 1.6; color: white !important;">{content}</p>
+                </div>
+            </div>
+            """
+
+
+@lru_cache(maxsize=256)
+def pronunciation_html(words):
+    """Expected text with each (word, score) pair coloured by its pronunciation score"""
+    spans = []
+    for word, score in words:
+        if score is None:
+            color, title = "#94a3b8", "–"
+        else:
+            color = "#4caf50" if score >= 80 else "#ff9800" if score >= 50 else "#f44336"
+            title = f"{score}/100"
+        spans.append(f"<span title='{title}' style='color: {color} !important; font-weight: 600;'>{word}</span>")
+    return f"<p style='font-size: 18px; line-height: 1.8;'>{' '.join(spans)}</p>"
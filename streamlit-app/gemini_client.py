@@ -0,0 +1,245 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+
+import google.generativeai as genai
+from google.api_core import exceptions as api_exceptions
+
+from resilience import RateLimitedError, backoff_delay
+
+DEFAULT_MODEL = "gemini-1.5-flash"
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_TIMEOUT_SECONDS = 30.0
+DEFAULT_QUEUE_TIMEOUT_SECONDS = 10.0
+DEFAULT_RETRIES = 2
+
+# Upstream errors worth another attempt after a backoff
+RETRYABLE_ERRORS = (
+    api_exceptions.ResourceExhausted,
+    api_exceptions.TooManyRequests,
+    api_exceptions.ServiceUnavailable,
+    api_exceptions.InternalServerError,
+    api_exceptions.DeadlineExceeded,
+    TimeoutError,
+)
+
+_STREAM_END = object()
+
+
+class GeminiBusyError(RuntimeError):
+    """Raised when no concurrency slot frees up within the queue timeout"""
+
+
+class GeminiClient:
+    """Process-wide Gemini client shared by every session
+
+    The SDK is configured once and a single model handle is reused, so all
+    requests go over the same long-lived gRPC channel (one HTTP/2 connection
+    with TLS already negotiated) instead of a fresh client per rerun. A
+    semaphore caps how many calls are admitted at once across all sessions,
+    and every call runs on a worker pool of the same size so the timeout can
+    be enforced without leaving more upstream calls running than allowed.
+
+    Each upstream attempt takes a token from the optional rate limiter,
+    retryable errors are retried with jittered exponential backoff, and the
+    optional circuit breaker sees one success or failure per call.
+    """
+
+    def __init__(self, api_key=None, model_name=DEFAULT_MODEL, max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                 timeout=DEFAULT_TIMEOUT_SECONDS, queue_timeout=DEFAULT_QUEUE_TIMEOUT_SECONDS,
+                 transport=None, model=None, rate_limiter=None, breaker=None, retries=DEFAULT_RETRIES):
+        if model is None:
+            genai.configure(api_key=api_key, transport=transport)
+            model = genai.GenerativeModel(model_name)
+        self.model = model
+        self.model_name = model_name
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.queue_timeout = queue_timeout
+        self.rate_limiter = rate_limiter
+        self.breaker = breaker
+        self.retries = retries
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="gemini")
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._in_flight = 0
+        self.requests = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.retried = 0
+
+    def warm(self):
+        """Open the connection ahead of the first real request"""
+        try:
+            self.model.count_tokens("Hallo")
+        except Exception:
+            # Warming is best effort; the first real call will surface errors
+            pass
+
+    def generate(self, prompt, wait=True):
+        """Run one generate_content call and return the response text
+
+        With wait=False the call gives up at once instead of queueing for a
+        rate limit token or a concurrency slot, which suits speculative work.
+        """
+        outcome = None
+        self._before_call()
+        try:
+            attempt = 0
+            while True:
+                try:
+                    text = self._generate_once(prompt, wait)
+                    break
+                except RETRYABLE_ERRORS:
+                    if attempt >= self.retries:
+                        raise
+                    self._backoff(attempt)
+                    attempt += 1
+            outcome = "success"
+            return text
+        except (GeminiBusyError, RateLimitedError):
+            raise
+        except Exception:
+            outcome = "failure"
+            raise
+        finally:
+            self._after_call(outcome)
+
+    def stream(self, prompt, wait=True):
+        """Yield response text chunks from a streamed generate_content call
+
+        A failed attempt is only retried while nothing has been yielded yet.
+        """
+        outcome = None
+        self._before_call()
+        try:
+            attempt = 0
+            while True:
+                yielded = False
+                try:
+                    for text in self._stream_once(prompt, wait):
+                        yielded = True
+                        yield text
+                    break
+                except RETRYABLE_ERRORS:
+                    if yielded or attempt >= self.retries:
+                        raise
+                    self._backoff(attempt)
+                    attempt += 1
+            outcome = "success"
+        except (GeminiBusyError, RateLimitedError):
+            raise
+        except Exception:
+            outcome = "failure"
+            raise
+        finally:
+            self._after_call(outcome)
+
+    def _generate_once(self, prompt, wait):
+        deadline = self._acquire(wait)
+        calls = []
+        try:
+            response = self._call(self.model.generate_content, prompt, deadline=deadline, calls=calls)
+            return response.text
+        finally:
+            self._release(calls)
+
+    def _stream_once(self, prompt, wait):
+        deadline = self._acquire(wait)
+        calls = []
+        try:
+            response = self._call(self.model.generate_content, prompt, stream=True, deadline=deadline, calls=calls)
+            chunks = iter(response)
+            while True:
+                chunk = self._call(next, chunks, _STREAM_END, deadline=deadline, calls=calls)
+                if chunk is _STREAM_END:
+                    break
+                yield chunk.text
+        finally:
+            self._release(calls)
+
+    def stats(self) -> dict:
+        """Snapshot of the concurrency, rate limit and breaker counters"""
+        with self._lock:
+            stats = {
+                "in_flight": self._in_flight,
+                "waiting": self._waiting,
+                "max_concurrency": self.max_concurrency,
+                "requests": self.requests,
+                "timeouts": self.timeouts,
+                "rejected": self.rejected,
+                "retried": self.retried,
+            }
+        if self.rate_limiter is not None:
+            stats["rate_limiter"] = self.rate_limiter.stats()
+            stats["queue_depth"] = stats["waiting"] + stats["rate_limiter"]["waiting"]
+        else:
+            stats["queue_depth"] = stats["waiting"]
+        if self.breaker is not None:
+            stats["breaker"] = self.breaker.stats()
+        return stats
+
+    def _before_call(self):
+        if self.breaker is not None:
+            self.breaker.before_call()
+
+    def _after_call(self, outcome):
+        if self.breaker is None:
+            return
+        if outcome == "success":
+            self.breaker.record_success()
+        elif outcome == "failure":
+            self.breaker.record_failure()
+        else:
+            # Rejected locally before reaching Gemini
+            self.breaker.cancel()
+
+    def _backoff(self, attempt):
+        with self._lock:
+            self.retried += 1
+        time.sleep(backoff_delay(attempt))
+
+    def _acquire(self, wait=True):
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(timeout=self.queue_timeout if wait else 0)
+        with self._lock:
+            self._waiting += 1
+        acquired = self._slots.acquire(timeout=self.queue_timeout if wait else 0)
+        with self._lock:
+            self._waiting -= 1
+            if not acquired:
+                self.rejected += 1
+                raise GeminiBusyError("Too many feedback requests in progress, please try again")
+            self._in_flight += 1
+            self.requests += 1
+        return time.monotonic() + self.timeout
+
+    def _release(self, calls=()):
+        """Free the slot once the last upstream call of this attempt has really finished
+
+        A call that timed out keeps running on the pool; its slot stays taken
+        until it returns, so new callers wait for a slot instead of queueing
+        behind it on the pool against their own deadline.
+        """
+        if calls:
+            calls[-1].add_done_callback(lambda _: self._free_slot())
+        else:
+            self._free_slot()
+
+    def _free_slot(self):
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def _call(self, fn, *args, deadline, calls=None, **kwargs):
+        future = self._pool.submit(fn, *args, **kwargs)
+        if calls is not None:
+            calls.append(future)
+        try:
+            return future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FuturesTimeoutError:
+            with self._lock:
+                self.timeouts += 1
+            raise TimeoutError(f"Gemini did not answer within {self.timeout:g}s") from None
@@ -0,0 +1,277 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+DEFAULT_LEASE_SECONDS = 60.0
+DEFAULT_WAIT_TIMEOUT = 45.0
+DEFAULT_POLL_INTERVAL = 0.25
+DEFAULT_RETENTION_SECONDS = 60 * 60
+# Workers that have not checked in for this long are presumed gone
+WORKER_STALE_SECONDS = 15.0
+MAX_ATTEMPTS = 3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    request TEXT NOT NULL,
+    status TEXT NOT NULL,
+    partial TEXT,
+    result TEXT,
+    error TEXT,
+    worker TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, id);
+
+CREATE TABLE IF NOT EXISTS workers (
+    worker TEXT PRIMARY KEY,
+    heartbeat_at REAL NOT NULL
+);
+"""
+
+
+class JobFailedError(RuntimeError):
+    """Raised when a worker could not complete a job"""
+
+
+class JobTimeoutError(RuntimeError):
+    """Raised when no worker finished a job in time"""
+
+
+class FeedbackJobQueue:
+    """Feedback requests handed from the UI to worker processes through one SQLite file
+
+    The UI enqueues a job and reads its row now and then without waiting;
+    workers claim jobs, publish partial feedback fields while Gemini streams,
+    and store the result. A
+    running job whose worker stops updating it for lease_seconds is handed
+    to another worker, up to MAX_ATTEMPTS times. WAL mode lets the pollers
+    read while a worker writes.
+    """
+
+    def __init__(self, path, lease_seconds=DEFAULT_LEASE_SECONDS, poll_interval=DEFAULT_POLL_INTERVAL,
+                 wait_timeout=DEFAULT_WAIT_TIMEOUT):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.wait_timeout = wait_timeout
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._connection().executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self.enqueued = 0
+        self.completed = 0
+        self.timeouts = 0
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+        return conn
+
+    # UI side
+    def run(self, request):
+        """Queue a JSON-serializable request and return its job id without waiting for it
+
+        Read the job with check(), or block until it finishes with wait().
+        """
+        now = time.time()
+        cursor = self._connection().execute(
+            "INSERT INTO jobs (request, status, created_at, updated_at) VALUES (?, ?, ?, ?)",
+            (json.dumps(request, ensure_ascii=False), QUEUED, now, now),
+        )
+        with self._lock:
+            self.enqueued += 1
+        return cursor.lastrowid
+
+    def get(self, job_id):
+        """(status, partial fields, result, error) of a job, or None if it is unknown"""
+        row = self._connection().execute(
+            "SELECT status, partial, result, error FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        status, partial, result, error = row
+        return status, json.loads(partial) if partial else None, json.loads(result) if result else None, error
+
+    def cancel(self, job_id):
+        """Withdraw a job no worker has started yet"""
+        self._connection().execute(
+            "UPDATE jobs SET status = ?, updated_at = ? WHERE id = ? AND status = ?",
+            (CANCELLED, time.time(), job_id, QUEUED),
+        )
+
+    def deadline(self, timeout=None):
+        """time.monotonic() value by which a job queued now should be finished"""
+        return time.monotonic() + (self.wait_timeout if timeout is None else timeout)
+
+    def check(self, job_id, deadline):
+        """(status, partial fields, result) of a job, read once
+
+        Raises JobFailedError if the job failed or was withdrawn, and cancels
+        the job and raises JobTimeoutError if it is unfinished at deadline.
+        """
+        job = self.get(job_id)
+        if job is None or job[0] == CANCELLED:
+            raise JobFailedError(f"feedback job {job_id} was withdrawn")
+        status, partial, result, error = job
+        if status == DONE:
+            with self._lock:
+                self.completed += 1
+            return status, partial, result
+        if status == FAILED:
+            raise JobFailedError(error or "feedback job failed")
+        if time.monotonic() >= deadline:
+            self.cancel(job_id)
+            with self._lock:
+                self.timeouts += 1
+            raise JobTimeoutError(f"feedback job {job_id} not finished in time")
+        return status, partial, None
+
+    def wait(self, job_id, on_partial=None, timeout=None):
+        """Block until a job finishes and return its result, passing each new partial result to on_partial
+
+        For callers without a page to refresh, such as scripts; the app
+        checks its jobs between reruns instead.
+        """
+        deadline = self.deadline(timeout)
+        last_partial = None
+        while True:
+            status, partial, result = self.check(job_id, deadline)
+            if status == DONE:
+                return result
+            if partial is not None and partial != last_partial and on_partial is not None:
+                on_partial(partial)
+                last_partial = partial
+            time.sleep(self.poll_interval)
+
+    def has_workers(self):
+        """Whether any worker checked in recently"""
+        row = self._connection().execute(
+            "SELECT 1 FROM workers WHERE heartbeat_at > ? LIMIT 1", (time.time() - WORKER_STALE_SECONDS,)
+        ).fetchone()
+        return row is not None
+
+    # Worker side
+    def claim(self, worker):
+        """(job id, request) of the oldest job that is queued or whose lease expired, or None"""
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT id, request FROM jobs WHERE status = ? "
+                "OR (status = ? AND updated_at < ? AND attempts < ?) ORDER BY id LIMIT 1",
+                (QUEUED, RUNNING, now - self.lease_seconds, MAX_ATTEMPTS),
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, worker = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                    (RUNNING, worker, now, row[0]),
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def publish(self, job_id, fields):
+        """Store the feedback fields completed so far; also renews the lease"""
+        self._connection().execute(
+            "UPDATE jobs SET partial = ?, updated_at = ? WHERE id = ?",
+            (json.dumps(fields, ensure_ascii=False), time.time(), job_id),
+        )
+
+    def complete(self, job_id, worker, result):
+        self._finish(job_id, worker, DONE, result=json.dumps(result, ensure_ascii=False))
+
+    def fail(self, job_id, worker, error):
+        self._finish(job_id, worker, FAILED, error=error)
+
+    def _finish(self, job_id, worker, status, result=None, error=None):
+        # A worker whose lease was taken over no longer owns the job
+        self._connection().execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ? WHERE id = ? AND worker = ?",
+            (status, result, error, time.time(), job_id, worker),
+        )
+
+    def heartbeat(self, worker):
+        """Record that the worker process named worker is alive"""
+        self._connection().execute(
+            """INSERT INTO workers (worker, heartbeat_at) VALUES (?, ?)
+               ON CONFLICT(worker) DO UPDATE SET heartbeat_at = excluded.heartbeat_at""",
+            (worker, time.time()),
+        )
+
+    def prune(self, retention_seconds=DEFAULT_RETENTION_SECONDS):
+        """Delete finished jobs and departed workers older than retention_seconds; returns jobs deleted"""
+        now = time.time()
+        cutoff = now - retention_seconds
+        conn = self._connection()
+        # Jobs that lost their worker too often are given up on
+        conn.execute(
+            "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE status = ? AND updated_at < ? AND attempts >= ?",
+            (FAILED, "worker lost", now, RUNNING, now - self.lease_seconds, MAX_ATTEMPTS),
+        )
+        cursor = conn.execute(
+            "DELETE FROM jobs WHERE status IN (?, ?, ?) AND updated_at < ?", (DONE, FAILED, CANCELLED, cutoff)
+        )
+        conn.execute("DELETE FROM workers WHERE heartbeat_at < ?", (cutoff,))
+        return cursor.rowcount
+
+    def stats(self) -> dict:
+        counts = dict(self._connection().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        workers = self._connection().execute(
+            "SELECT COUNT(*) FROM workers WHERE heartbeat_at > ?", (time.time() - WORKER_STALE_SECONDS,)
+        ).fetchone()[0]
+        with self._lock:
+            return {
+                "queued": counts.get(QUEUED, 0),
+                "running": counts.get(RUNNING, 0),
+                "workers": workers,
+                "enqueued": self.enqueued,
+                "completed": self.completed,
+                "timeouts": self.timeouts,
+            }
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def open_job_queue(url, environ=os.environ):
+    """Open the feedback job queue described by url, or return None when unset
+
+    Accepts a plain file path or a ``sqlite:///path`` URL.
+    """
+    if not url:
+        return None
+    if url.startswith("sqlite:///"):
+        url = url[len("sqlite:///"):]
+    elif "://" in url:
+        raise ValueError(f"Unsupported feedback queue: {url}")
+    return FeedbackJobQueue(
+        url,
+        lease_seconds=float(environ.get("FEEDBACK_QUEUE_LEASE", DEFAULT_LEASE_SECONDS)),
+        poll_interval=float(environ.get("FEEDBACK_QUEUE_POLL_MS", DEFAULT_POLL_INTERVAL * 1000)) / 1000,
+        wait_timeout=float(environ.get("FEEDBACK_QUEUE_TIMEOUT", DEFAULT_WAIT_TIMEOUT)),
+    )
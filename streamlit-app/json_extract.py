@@ -0,0 +1,166 @@
+import json
+import re
+
+_json_decoder = json.JSONDecoder()
+_SCORE_RE = re.compile(r"-?\d+(?:[.,]\d+)?")
+
+
+class JSONObjectScanner:
+    """Finds the first balanced JSON object in text that arrives in chunks
+
+    Each chunk is scanned once, tracking brace depth and string/escape state,
+    so prose or code fences around the object are ignored and the object is
+    available the moment its closing brace arrives.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self._pos = 0
+        self._start = None
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self.text = None
+
+    def feed(self, chunk):
+        """Add a chunk; returns the object's text once it is complete, else None"""
+        self.buffer += chunk
+        if self.text is not None:
+            return self.text
+        buffer = self.buffer
+        for i in range(self._pos, len(buffer)):
+            char = buffer[i]
+            if self._start is None:
+                if char == "{":
+                    self._start = i
+                    self._depth = 1
+                continue
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{":
+                self._depth += 1
+            elif char == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    self.text = buffer[self._start:i + 1]
+                    self._pos = i + 1
+                    return self.text
+        self._pos = len(buffer)
+        return None
+
+    @property
+    def partial(self):
+        """Text of the object seen so far, or "" before its opening brace"""
+        if self._start is None:
+            return ""
+        return self.buffer[self._start:]
+
+    def result(self):
+        """Decode the object, falling back to a lenient parse of an unbalanced tail
+
+        Raises ValueError when no object can be recovered.
+        """
+        if self.text is not None:
+            return json.loads(self.text)
+        # The stream ended early: try closing what is open
+        partial = self.partial
+        if not partial:
+            raise ValueError("No JSON object found in model output")
+        closing = ('"' if self._in_string else "") + "}" * self._depth
+        return json.loads(partial + closing)
+
+
+def extract_json_object(text):
+    """The first balanced JSON object in text, ignoring any surrounding prose"""
+    scanner = JSONObjectScanner()
+    scanner.feed(text)
+    return scanner.result()
+
+
+def _as_score(value, low, high):
+    if isinstance(value, bool):
+        raise ValueError("not a score")
+    if isinstance(value, (int, float)):
+        number = float(value)
+    else:
+        match = _SCORE_RE.search(str(value))
+        if not match:
+            raise ValueError("not a score")
+        number = float(match.group(0).replace(",", "."))
+    return int(min(max(round(number), low), high))
+
+
+def _as_text(value):
+    if isinstance(value, (list, tuple)):
+        value = " ".join(str(v) for v in value)
+    if not isinstance(value, (str, int, float)) or isinstance(value, bool):
+        raise ValueError("not text")
+    value = str(value).strip()
+    if not value:
+        raise ValueError("empty")
+    return value
+
+
+def _as_text_list(value):
+    if isinstance(value, str):
+        value = [value]
+    if not isinstance(value, (list, tuple)):
+        raise ValueError("not a list")
+    items = [str(v).strip() for v in value if str(v).strip()]
+    if not items:
+        raise ValueError("empty")
+    return items
+
+
+class FieldSchema:
+    """Compiled validator for a flat JSON object of required fields
+
+    fields maps names to one of "score", "text" or "text_list". validate()
+    coerces near misses (a score of "4/5", a single string where a list is
+    expected) and reports the fields that are missing or unusable, so only
+    those need to be repaired.
+    """
+
+    KINDS = {"score", "text", "text_list"}
+
+    def __init__(self, fields, score_range=(1, 5)):
+        unknown = set(fields.values()) - self.KINDS
+        if unknown:
+            raise ValueError(f"Unknown field kinds: {sorted(unknown)}")
+        low, high = score_range
+        converters = {
+            "score": lambda value: _as_score(value, low, high),
+            "text": _as_text,
+            "text_list": _as_text_list,
+        }
+        self.fields = dict(fields)
+        self._converters = [(name, converters[kind]) for name, kind in fields.items()]
+
+    def validate(self, obj):
+        """Return (clean, missing): the coerced valid fields and the names still needed"""
+        clean = {}
+        missing = []
+        if not isinstance(obj, dict):
+            obj = {}
+        for name, convert in self._converters:
+            if name not in obj:
+                missing.append(name)
+                continue
+            try:
+                clean[name] = convert(obj[name])
+            except (ValueError, TypeError):
+                missing.append(name)
+        return clean, missing
+
+    def template(self, names):
+        """A JSON skeleton listing just the given fields, for a repair prompt"""
+        placeholders = {"score": "<number>", "text": "<text>", "text_list": ["<text>", "<text>"]}
+        body = {name: placeholders[self.fields[name]] for name in names}
+        return json.dumps(body, indent=4, ensure_ascii=False)
@@ -0,0 +1,261 @@
+import contextvars
+import itertools
+import math
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+NAMESPACE = "deutsch_fluent"
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TOKEN_BUCKETS = (50, 100, 200, 400, 800, 1600, 3200, 6400)
+DEFAULT_TRACES = 50
+
+_INVALID_NAME_RE = re.compile(r"[^a-zA-Z0-9_]")
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+_trace_ids = itertools.count(1)
+
+
+class Histogram:
+    """Cumulative-bucket histogram with bounded memory, as in Prometheus
+
+    Quantiles are interpolated within the bucket that holds them, so they
+    are estimates whose precision follows the bucket layout.
+    """
+
+    def __init__(self, buckets=SECONDS_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                if index == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index else 0.0
+                return lower + (self.buckets[index] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    pairs = ",".join(f'{name}="{str(value).replace(chr(34), chr(39))}"' for name, value in labels)
+    return "{" + pairs + "}"
+
+
+def _number(value):
+    if value is None:
+        return "NaN"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, float) and math.isinf(value):
+        return "+Inf"
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry:
+    """Process-wide counters, histograms and recent request traces
+
+    Counters and histograms are keyed by name and a sorted tuple of labels.
+    Gauges are not stored: collectors registered with add_collector are
+    asked for their current values at export time, so components keep their
+    own counters and nothing is counted twice.
+    """
+
+    def __init__(self, max_traces=DEFAULT_TRACES):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._collectors = {}
+        self.traces = deque(maxlen=max_traces)
+
+    def incr(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, value, buckets=SECONDS_BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    @contextmanager
+    def span(self, stage, **labels):
+        """Time a stage into the stage_seconds histogram and the current trace"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.observe("stage_seconds", elapsed, stage=stage, **labels)
+            trace = _current_trace.get()
+            if trace is not None:
+                trace["spans"].append((stage, round(elapsed * 1000, 2)))
+
+    @contextmanager
+    def trace(self, name, **attributes):
+        """Collect the spans of one request, kept among the most recent traces"""
+        trace = {"id": next(_trace_ids), "name": name, "started": time.time(),
+                 "attributes": dict(attributes), "spans": []}
+        token = _current_trace.set(trace)
+        started = time.perf_counter()
+        try:
+            yield trace
+        finally:
+            _current_trace.reset(token)
+            trace["total_ms"] = round((time.perf_counter() - started) * 1000, 2)
+            with self._lock:
+                self.traces.append(trace)
+
+    def annotate(self, **attributes):
+        """Add attributes to the trace in progress, if any"""
+        trace = _current_trace.get()
+        if trace is not None:
+            trace["attributes"].update(attributes)
+
+    def add_collector(self, name, collect):
+        """Export the numeric values of collect() as gauges named name_<key> on every scrape"""
+        with self._lock:
+            self._collectors[name] = collect
+
+    def _gauges(self):
+        gauges = []
+        for prefix, collect in list(self._collectors.items()):
+            try:
+                values = collect()
+            except Exception:
+                continue
+            for key, value in _flatten(values):
+                gauges.append((_INVALID_NAME_RE.sub("_", f"{prefix}_{key}"), value))
+        return gauges
+
+    def snapshot(self) -> dict:
+        """Counters, histogram quantiles and gauges as plain data"""
+        with self._lock:
+            counters = {(name, labels): value for (name, labels), value in self._counters.items()}
+            histograms = {
+                (name, labels): {
+                    "count": histogram.count,
+                    "sum": histogram.sum,
+                    "p50": histogram.quantile(0.5),
+                    "p95": histogram.quantile(0.95),
+                    "p99": histogram.quantile(0.99),
+                }
+                for (name, labels), histogram in self._histograms.items()
+            }
+        return {"counters": counters, "histograms": histograms, "gauges": dict(self._gauges())}
+
+    def render_prometheus(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(
+                ((key, histogram.buckets, list(histogram.counts), histogram.sum, histogram.count)
+                 for key, histogram in self._histograms.items()),
+                key=lambda item: item[0],
+            )
+        typed = set()
+        for (name, labels), value in counters:
+            metric = f"{NAMESPACE}_{name}_total"
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} counter")
+                typed.add(metric)
+            lines.append(f"{metric}{_label_text(labels)} {_number(value)}")
+        for (name, labels), buckets, counts, total, count in histograms:
+            metric = f"{NAMESPACE}_{name}"
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} histogram")
+                typed.add(metric)
+            cumulative = 0
+            for bound, bucket_count in zip(buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                lines.append(f"{metric}_bucket{_label_text(labels + (('le', _number(float(bound))),))} {cumulative}")
+            lines.append(f"{metric}_sum{_label_text(labels)} {_number(total)}")
+            lines.append(f"{metric}_count{_label_text(labels)} {count}")
+        for name, value in self._gauges():
+            metric = f"{NAMESPACE}_{name}"
+            lines.append(f"# TYPE {metric} gauge")
+            lines.append(f"{metric} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+    def write_file(self, path):
+        """Write the Prometheus text atomically, for node_exporter's textfile collector"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.render_prometheus())
+        os.replace(tmp_path, path)
+
+
+def _flatten(values, prefix=""):
+    """(key, number) pairs of a nested stats dict; strings and None are skipped"""
+    for key, value in values.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            yield from _flatten(value, f"{name}_")
+        elif isinstance(value, (int, float)):
+            yield name, value
+
+
+def serve_metrics(registry, port, host="0.0.0.0"):
+    """Serve registry on http://host:port/metrics from a daemon thread"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+def write_metrics_periodically(registry, path, interval=15.0):
+    """Rewrite the metrics file every interval seconds from a daemon thread"""
+
+    def loop():
+        while True:
+            try:
+                registry.write_file(path)
+            except OSError:
+                pass
+            time.sleep(interval)
+
+    thread = threading.Thread(target=loop, name="metrics-file", daemon=True)
+    thread.start()
+    return thread
+
+
+# Shared by every module in the process
+REGISTRY = MetricsRegistry()
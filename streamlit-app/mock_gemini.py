@@ -0,0 +1,127 @@
+import hashlib
+import json
+import random
+import threading
+import time
+
+from google.api_core import exceptions as api_exceptions
+
+DEFAULTS = {
+    "latency": 0.8,
+    "jitter": 0.3,
+    "first_token": 0.3,
+    "error_rate": 0.0,
+    "malformed_rate": 0.0,
+    "chunk_chars": 24,
+    "seed": None,
+}
+
+
+class _Text:
+    """Stands in for a response or a streamed chunk; only .text is read"""
+
+    def __init__(self, text):
+        self.text = text
+
+
+class _TokenCount:
+    def __init__(self, total_tokens):
+        self.total_tokens = total_tokens
+
+
+class MockGeminiModel:
+    """Local stand-in for genai.GenerativeModel with scripted latency and faults
+
+    Latency per call is log-normally distributed around latency seconds;
+    streamed calls deliver the first chunk after first_token of it and
+    spread the rest evenly. error_rate of calls raise ServiceUnavailable
+    (which the client retries) and malformed_rate of calls return truncated
+    or JSON-less text (which exercises partial parsing and repair).
+    Feedback is derived from a hash of the prompt, so runs are repeatable.
+    """
+
+    def __init__(self, latency=DEFAULTS["latency"], jitter=DEFAULTS["jitter"], first_token=DEFAULTS["first_token"],
+                 error_rate=DEFAULTS["error_rate"], malformed_rate=DEFAULTS["malformed_rate"],
+                 chunk_chars=DEFAULTS["chunk_chars"], seed=DEFAULTS["seed"]):
+        self.latency = latency
+        self.jitter = jitter
+        self.first_token = first_token
+        self.error_rate = error_rate
+        self.malformed_rate = malformed_rate
+        self.chunk_chars = chunk_chars
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.malformed = 0
+
+    @classmethod
+    def from_spec(cls, spec):
+        """Model configured from "latency=0.5,error_rate=0.05,..."; "1" uses the defaults"""
+        options = {}
+        for part in spec.split(","):
+            name, _, value = part.strip().partition("=")
+            if not value:
+                continue
+            if name not in DEFAULTS:
+                raise ValueError(f"Unknown mock Gemini option: {name}")
+            options[name] = int(value) if name in ("chunk_chars", "seed") else float(value)
+        return cls(**options)
+
+    def _draw(self):
+        """(delay, fail, malformed, cut point) for one call"""
+        with self._lock:
+            self.calls += 1
+            delay = self.latency * self._random.lognormvariate(0, self.jitter) if self.latency else 0.0
+            fail = self._random.random() < self.error_rate
+            malformed = not fail and self._random.random() < self.malformed_rate
+            cut = self._random.random()
+            if fail:
+                self.errors += 1
+            if malformed:
+                self.malformed += 1
+        return delay, fail, malformed, cut
+
+    def count_tokens(self, contents):
+        return _TokenCount(len(str(contents)) // 4 + 1)
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        delay, fail, malformed, cut = self._draw()
+        text = feedback_text(prompt)
+        if malformed:
+            # Either cut off mid-object or no JSON at all
+            text = text[:max(1, int(len(text) * cut))] if cut < 0.7 else "Leider kann ich das nicht bewerten."
+        if not stream:
+            time.sleep(delay)
+            if fail:
+                raise api_exceptions.ServiceUnavailable("mock Gemini is unavailable")
+            return _Text(text)
+        return self._stream(text, delay, fail)
+
+    def _stream(self, text, delay, fail):
+        chunks = [text[i:i + self.chunk_chars] for i in range(0, len(text), self.chunk_chars)]
+        time.sleep(delay * self.first_token)
+        if fail:
+            raise api_exceptions.ServiceUnavailable("mock Gemini is unavailable")
+        rest = delay * (1 - self.first_token) / max(1, len(chunks) - 1)
+        for index, chunk in enumerate(chunks):
+            if index:
+                time.sleep(rest)
+            yield _Text(chunk)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"calls": self.calls, "errors": self.errors, "malformed": self.malformed}
+
+
+def feedback_text(prompt):
+    """Plausible feedback JSON in a code fence, as Gemini tends to answer"""
+    digest = hashlib.sha1(prompt.encode("utf-8")).digest()
+    feedback = {
+        "relevance_score": 1 + digest[0] % 5,
+        "what_worked": ["Die Antwort passt zur Frage.", "Der Satzbau ist verständlich."],
+        "improvement": "Verwenden Sie einen vollständigen Satz mit Verb an zweiter Stelle.",
+        "suggested_response": "Es war toll! Ich war am Samstag wandern und habe am Sonntag entspannt.",
+        "score_explanation": "Gute Antwort mit kleinen Verbesserungsmöglichkeiten.",
+    }
+    return "```json\n" + json.dumps(feedback, ensure_ascii=False, indent=2) + "\n```"
@@ -0,0 +1,597 @@
+import atexit
+import hashlib
+from abc import ABC, abstractmethod
+import hmac
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from collections import defaultdict
+from datetime import datetime
+
+# Aggregate row holding the totals over all scenarios
+ALL_SCENARIOS = "*"
+
+DEFAULT_BATCH_SIZE = 200
+DEFAULT_FLUSH_INTERVAL = 0.05
+# Backoff between attempts at a batch the database would not take, doubling up to the maximum
+RETRY_DELAY = 0.1
+MAX_RETRY_DELAY = 30.0
+PASSWORD_ITERATIONS = 200_000
+
+logger = logging.getLogger(__name__)
+
+_USERNAME_RE = re.compile(r"^[a-z0-9_.-]{3,32}$")
+# Account user ids carry this prefix so they are never taken from a URL
+ACCOUNT_ID_PREFIX = "acct-"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS progress (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    scenario_key TEXT NOT NULL,
+    scenario TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    response TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    day TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_progress_user_created ON progress (user_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_progress_user_scenario ON progress (user_id, scenario_key, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_progress_user_day ON progress (user_id, day);
+
+CREATE TABLE IF NOT EXISTS progress_totals (
+    user_id TEXT NOT NULL,
+    scenario_key TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    score_sum INTEGER NOT NULL,
+    PRIMARY KEY (user_id, scenario_key)
+);
+
+CREATE TABLE IF NOT EXISTS progress_daily (
+    user_id TEXT NOT NULL,
+    day TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (user_id, day)
+);
+
+CREATE TABLE IF NOT EXISTS accounts (
+    username TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    salt BLOB NOT NULL,
+    password_hash BLOB NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+
+class AccountError(ValueError):
+    """Raised for usernames or passwords that cannot be used for an account"""
+
+
+class UsernameTakenError(AccountError):
+    """Raised when creating an account whose username already exists"""
+
+
+class EmptyPasswordError(AccountError):
+    """Raised when creating an account without a password"""
+
+
+def normalize_username(username):
+    """Lower-cased username, or AccountError when it is not 3-32 letters, digits or ._-"""
+    username = (username or "").strip().lower()
+    if not _USERNAME_RE.match(username):
+        raise AccountError(f"Invalid username: {username!r}")
+    return username
+
+
+def is_account_id(user_id):
+    """Whether user_id belongs to an account rather than an anonymous learner"""
+    return (user_id or "").startswith(ACCOUNT_ID_PREFIX)
+
+
+def _hash_password(password, salt):
+    return hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, PASSWORD_ITERATIONS)
+
+
+def today():
+    """Local calendar day used to bucket progress entries"""
+    return datetime.now().strftime("%Y-%m-%d")
+
+
+class ProgressStore(ABC):
+    """Interface for durable per-user practice history"""
+
+    def add(self, user_id, scenario_key, scenario, score, response):
+        """Record one graded response"""
+        self.add_many([(user_id, scenario_key, scenario, score, response, time.time())])
+
+    @abstractmethod
+    def add_many(self, entries):
+        """Record (user_id, scenario_key, scenario, score, response, created_at) entries in one write"""
+
+    @abstractmethod
+    def page(self, user_id, limit, before=None):
+        """Return (entries, cursor): up to limit entries older than the before cursor, newest first
+
+        Entries carry an id but no response text (see response()). cursor is
+        None on the last page.
+        """
+
+    @abstractmethod
+    def response(self, user_id, entry_id):
+        """Return the response text of one entry, or None"""
+
+    @abstractmethod
+    def summary(self, user_id):
+        """Return count, average and per-scenario averages from the running totals"""
+
+    @abstractmethod
+    def count_on(self, user_id, day):
+        """Return how many responses were recorded on day (YYYY-MM-DD)"""
+
+    @abstractmethod
+    def create_account(self, username, password):
+        """Register username with password under a fresh user id and return that id
+
+        Raises UsernameTakenError if the username exists and
+        EmptyPasswordError without a password.
+        """
+
+    @abstractmethod
+    def authenticate(self, username, password):
+        """Return the user_id of the account, or None if the username or password is wrong"""
+
+    def flush(self):
+        """Wait until every recorded entry is durable"""
+
+    def stats(self) -> dict:
+        return {}
+
+    def close(self):
+        pass
+
+
+class SQLiteProgressStore(ProgressStore):
+    """Progress store in a single SQLite file in WAL mode
+
+    Totals per user and scenario and counts per user and day are updated in
+    the same transaction as each insert, so summaries and the "today" counter
+    are single-row lookups however much history a learner has. A batch of
+    entries is written in one transaction with one rollup update per key.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        conn.executescript(_SCHEMA)
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+        return conn
+
+    def add_many(self, entries):
+        rows = []
+        totals = defaultdict(lambda: [0, 0])
+        daily = defaultdict(int)
+        for user_id, scenario_key, scenario, score, response, created_at in entries:
+            day = datetime.fromtimestamp(created_at).strftime("%Y-%m-%d")
+            score = int(score)
+            rows.append((user_id, scenario_key, scenario, score, response, created_at, day))
+            for key in ((user_id, scenario_key), (user_id, ALL_SCENARIOS)):
+                totals[key][0] += 1
+                totals[key][1] += score
+            daily[(user_id, day)] += 1
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT INTO progress (user_id, scenario_key, scenario, score, response, created_at, day) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            conn.executemany(
+                """INSERT INTO progress_totals (user_id, scenario_key, count, score_sum) VALUES (?, ?, ?, ?)
+                   ON CONFLICT(user_id, scenario_key) DO UPDATE SET count = count + excluded.count,
+                                                                  score_sum = score_sum + excluded.score_sum""",
+                [(user_id, scenario_key, count, score_sum) for (user_id, scenario_key), (count, score_sum) in totals.items()],
+            )
+            conn.executemany(
+                """INSERT INTO progress_daily (user_id, day, count) VALUES (?, ?, ?)
+                   ON CONFLICT(user_id, day) DO UPDATE SET count = count + excluded.count""",
+                [(user_id, day, count) for (user_id, day), count in daily.items()],
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def page(self, user_id, limit, before=None):
+        # Keyset pagination: each page is one index range scan, however deep
+        if before is None:
+            rows = self._connection().execute(
+                "SELECT id, scenario_key, scenario, score, created_at FROM progress "
+                "WHERE user_id = ? ORDER BY created_at DESC, id DESC LIMIT ?",
+                (user_id, limit + 1),
+            ).fetchall()
+        else:
+            rows = self._connection().execute(
+                "SELECT id, scenario_key, scenario, score, created_at FROM progress "
+                "WHERE user_id = ? AND (created_at, id) < (?, ?) ORDER BY created_at DESC, id DESC LIMIT ?",
+                (user_id, before[0], before[1], limit + 1),
+            ).fetchall()
+        cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            cursor = (rows[-1][4], rows[-1][0])
+        entries = [
+            {
+                "id": entry_id,
+                "scenario_key": scenario_key,
+                "scenario": scenario,
+                "score": score,
+                "date": datetime.fromtimestamp(created_at).strftime("%Y-%m-%d %H:%M"),
+            }
+            for entry_id, scenario_key, scenario, score, created_at in rows
+        ]
+        return entries, cursor
+
+    def response(self, user_id, entry_id):
+        row = self._connection().execute(
+            "SELECT response FROM progress WHERE id = ? AND user_id = ?", (entry_id, user_id)
+        ).fetchone()
+        return row[0] if row else None
+
+    def summary(self, user_id):
+        rows = self._connection().execute(
+            "SELECT scenario_key, count, score_sum FROM progress_totals WHERE user_id = ?", (user_id,)
+        ).fetchall()
+        summary = {"count": 0, "average": None, "scenarios": {}}
+        for scenario_key, count, score_sum in rows:
+            average = score_sum / count if count else None
+            if scenario_key == ALL_SCENARIOS:
+                summary["count"] = count
+                summary["average"] = average
+            else:
+                summary["scenarios"][scenario_key] = {"count": count, "average": average}
+        return summary
+
+    def count_on(self, user_id, day):
+        row = self._connection().execute(
+            "SELECT count FROM progress_daily WHERE user_id = ? AND day = ?", (user_id, day)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def create_account(self, username, password):
+        username = normalize_username(username)
+        if not password:
+            raise EmptyPasswordError("Password must not be empty")
+        user_id = ACCOUNT_ID_PREFIX + uuid.uuid4().hex
+        salt = os.urandom(16)
+        try:
+            self._connection().execute(
+                "INSERT INTO accounts (username, user_id, salt, password_hash, created_at) VALUES (?, ?, ?, ?, ?)",
+                (username, user_id, salt, _hash_password(password, salt), time.time()),
+            )
+        except sqlite3.IntegrityError as e:
+            raise UsernameTakenError(f"Username already exists: {username}") from e
+        return user_id
+
+    def authenticate(self, username, password):
+        try:
+            username = normalize_username(username)
+        except AccountError:
+            return None
+        row = self._connection().execute(
+            "SELECT user_id, salt, password_hash FROM accounts WHERE username = ?", (username,)
+        ).fetchone()
+        if row is None:
+            return None
+        user_id, salt, password_hash = row
+        if not hmac.compare_digest(_hash_password(password or "", salt), password_hash):
+            return None
+        return user_id
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class BatchedProgressStore(ProgressStore):
+    """Write-behind wrapper that group-commits queued entries from one writer thread
+
+    add() only queues the entry. The writer collects up to batch_size
+    entries, or whatever arrived within flush_interval of the first, and
+    records them with one add_many call, so concurrent learners never
+    contend for the database lock. Entries leave the queue only once they
+    are committed: a failed write is logged and retried with a backoff of
+    up to MAX_RETRY_DELAY. Reads never wait for the writer; they combine
+    the committed data with the reader's entries still in the queue.
+    """
+
+    def __init__(self, store, batch_size=DEFAULT_BATCH_SIZE, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        self.store = store
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._cond = threading.Condition()
+        self._queue = []
+        self._urgent = False
+        self._closed = False
+        self._retry_at = 0.0
+        self.written = 0
+        self.batches = 0
+        self.largest_batch = 0
+        self.retries = 0
+        self.failed = 0
+        self.last_error = None
+        self._thread = threading.Thread(target=self._run, name="progress-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def add_many(self, entries):
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("progress store is closed")
+            was_empty = not self._queue
+            self._queue.extend(entries)
+            # The first entry starts the writer's flush timer; a full batch cuts it short
+            if was_empty or len(self._queue) >= self.batch_size:
+                self._cond.notify_all()
+
+    def _run(self):
+        delay = RETRY_DELAY
+        while True:
+            with self._cond:
+                while not self._closed:
+                    now = time.monotonic()
+                    if self._queue and now >= self._retry_at:
+                        break
+                    self._cond.wait(self._retry_at - now if self._queue else None)
+                if not self._queue:
+                    return
+                # Give concurrent writers a moment to join this batch
+                deadline = time.monotonic() + self.flush_interval
+                while len(self._queue) < self.batch_size and not self._urgent and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._queue[:self.batch_size]
+                self._urgent = False
+            try:
+                self.store.add_many(batch)
+            except Exception as e:
+                logger.warning("Writing %d progress entries failed, retrying in %.1fs: %s", len(batch), delay, e)
+                with self._cond:
+                    self.retries += 1
+                    self.last_error = str(e)
+                    if self._closed:
+                        # Nobody is left to retry at exit
+                        logger.error("Dropped %d unwritten progress entries at shutdown", len(self._queue))
+                        self.failed += len(self._queue)
+                        self._queue = []
+                        self._cond.notify_all()
+                        return
+                    self._retry_at = time.monotonic() + delay
+                delay = min(MAX_RETRY_DELAY, delay * 2)
+                continue
+            delay = RETRY_DELAY
+            with self._cond:
+                # New entries are only ever appended, so the batch is still the head of the queue
+                del self._queue[:len(batch)]
+                self.written += len(batch)
+                self.batches += 1
+                self.largest_batch = max(self.largest_batch, len(batch))
+                self._cond.notify_all()
+
+    def _unwritten(self, user_id):
+        """Queued entries of user_id, oldest first"""
+        with self._cond:
+            return [entry for entry in self._queue if entry[0] == user_id]
+
+    @staticmethod
+    def _entry_id(created_at):
+        # Negative, so it never collides with a row id and sorts before any cursor of a written row
+        return -int(created_at * 1_000_000)
+
+    def flush(self):
+        """Wait until every queued entry is written"""
+        with self._cond:
+            while self._queue and not self._closed:
+                self._urgent = True
+                self._retry_at = 0.0
+                self._cond.notify_all()
+                self._cond.wait(0.1)
+
+    def page(self, user_id, limit, before=None):
+        # Queued entries are newer than every written one, so they come first
+        queued = [entry for entry in reversed(self._unwritten(user_id)) if before is None or entry[5] < before[0]]
+        if not queued:
+            return self.store.page(user_id, limit, before)
+        entries = [
+            {
+                "id": self._entry_id(created_at),
+                "scenario_key": scenario_key,
+                "scenario": scenario,
+                "score": int(score),
+                "date": datetime.fromtimestamp(created_at).strftime("%Y-%m-%d %H:%M"),
+            }
+            for _, scenario_key, scenario, score, _, created_at in queued[:limit]
+        ]
+        if len(entries) < limit:
+            written, cursor = self.store.page(user_id, limit - len(entries), before)
+            return entries + written, cursor
+        # A cursor at a queued entry continues with whatever is older, queued or written
+        cursor = (queued[limit - 1][5], -1)
+        if len(queued) > limit or self.store.page(user_id, 1, cursor)[0]:
+            return entries, cursor
+        return entries, None
+
+    def response(self, user_id, entry_id):
+        if entry_id < 0:
+            for _, _, _, _, response, created_at in self._unwritten(user_id):
+                if self._entry_id(created_at) == entry_id:
+                    return response
+            # Written since the page was read
+            return None
+        return self.store.response(user_id, entry_id)
+
+    def summary(self, user_id):
+        summary = self.store.summary(user_id)
+        unwritten = self._unwritten(user_id)
+        if not unwritten:
+            return summary
+        totals = {key: [values["count"], values["count"] * values["average"]]
+                  for key, values in summary["scenarios"].items() if values["average"] is not None}
+        count, score_sum = summary["count"], summary["count"] * (summary["average"] or 0)
+        for _, scenario_key, _, score, _, _ in unwritten:
+            totals.setdefault(scenario_key, [0, 0])
+            totals[scenario_key][0] += 1
+            totals[scenario_key][1] += int(score)
+            count += 1
+            score_sum += int(score)
+        return {
+            "count": count,
+            "average": score_sum / count,
+            "scenarios": {key: {"count": n, "average": total / n} for key, (n, total) in totals.items()},
+        }
+
+    def count_on(self, user_id, day):
+        unwritten = sum(1 for *_, created_at in self._unwritten(user_id)
+                        if datetime.fromtimestamp(created_at).strftime("%Y-%m-%d") == day)
+        return self.store.count_on(user_id, day) + unwritten
+
+    def create_account(self, username, password):
+        return self.store.create_account(username, password)
+
+    def authenticate(self, username, password):
+        return self.store.authenticate(username, password)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "queued": len(self._queue),
+                "written": self.written,
+                "batches": self.batches,
+                "largest_batch": self.largest_batch,
+                "retries": self.retries,
+                "failed": self.failed,
+                "last_error": self.last_error,
+            }
+
+    def close(self):
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._retry_at = 0.0
+            self._cond.notify_all()
+        self._thread.join()
+        self.store.close()
+
+
+class ShardedProgressStore(ProgressStore):
+    """Progress spread over several stores by a hash of the user id
+
+    Every learner's entries, totals and daily counts live in one shard, so
+    all reads stay single-shard and writes to different shards never share
+    a lock. Accounts are placed by username, since that is all a sign-in
+    knows. Changing the number of shards moves users to other shards.
+    """
+
+    def __init__(self, shards):
+        self.shards = list(shards)
+
+    def shard_for(self, key):
+        return self.shards[zlib.crc32(key.encode("utf-8")) % len(self.shards)]
+
+    def add_many(self, entries):
+        by_shard = defaultdict(list)
+        for entry in entries:
+            by_shard[id(self.shard_for(entry[0]))].append(entry)
+        for shard in self.shards:
+            if id(shard) in by_shard:
+                shard.add_many(by_shard[id(shard)])
+
+    def page(self, user_id, limit, before=None):
+        return self.shard_for(user_id).page(user_id, limit, before)
+
+    def response(self, user_id, entry_id):
+        return self.shard_for(user_id).response(user_id, entry_id)
+
+    def summary(self, user_id):
+        return self.shard_for(user_id).summary(user_id)
+
+    def count_on(self, user_id, day):
+        return self.shard_for(user_id).count_on(user_id, day)
+
+    def create_account(self, username, password):
+        return self.shard_for(normalize_username(username)).create_account(username, password)
+
+    def authenticate(self, username, password):
+        try:
+            shard = self.shard_for(normalize_username(username))
+        except AccountError:
+            return None
+        return shard.authenticate(username, password)
+
+    def flush(self):
+        for shard in self.shards:
+            shard.flush()
+
+    def stats(self) -> dict:
+        totals = {"shards": len(self.shards)}
+        for shard in self.shards:
+            for key, value in shard.stats().items():
+                if key == "largest_batch":
+                    totals[key] = max(totals.get(key, 0), value)
+                elif isinstance(value, (int, float)):
+                    totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def close(self):
+        for shard in self.shards:
+            shard.close()
+
+
+def shard_paths(path, shards):
+    """File paths of shards shards of the store at path: progress.db becomes progress-00.db, ..."""
+    if shards == 1:
+        return [path]
+    root, ext = os.path.splitext(path)
+    return [f"{root}-{index:02d}{ext}" for index in range(shards)]
+
+
+def open_progress_store(url, shards=1, batch_size=DEFAULT_BATCH_SIZE, flush_interval=DEFAULT_FLUSH_INTERVAL):
+    """Open the progress store described by url
+
+    Accepts a plain file path or a ``sqlite:///path`` URL. With shards > 1
+    users are spread over that many files next to path. Writes are batched
+    unless flush_interval is 0.
+    """
+    if url.startswith("sqlite:///"):
+        url = url[len("sqlite:///"):]
+    elif "://" in url:
+        raise ValueError(f"Unsupported progress store: {url}")
+    stores = []
+    for path in shard_paths(url, shards):
+        store = SQLiteProgressStore(path)
+        if flush_interval > 0:
+            store = BatchedProgressStore(store, batch_size, flush_interval)
+        stores.append(store)
+    return stores[0] if len(stores) == 1 else ShardedProgressStore(stores)
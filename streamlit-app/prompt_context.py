@@ -0,0 +1,126 @@
+from collections import deque
+
+DEFAULT_TOKEN_BUDGET = 600
+DEFAULT_SUMMARY_TOKENS = 120
+SUMMARY_WORDS = 8
+
+# Rough average for German text with Gemini's tokenizer; used for budgeting only
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    """Cheap token estimate, good enough to keep prompts within a budget"""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _shorten(text, words=SUMMARY_WORDS):
+    parts = text.split()
+    if len(parts) <= words:
+        return " ".join(parts)
+    return " ".join(parts[:words]) + " …"
+
+
+class ConversationContext:
+    """Incrementally rendered "Previous conversation" block with a token budget
+
+    Each turn is rendered once when it is first seen and kept in a sliding
+    window. Once the window exceeds the budget, the oldest turns are folded
+    into one-line summaries, and the oldest summaries are dropped once those
+    exceed their own budget, so the block never grows past
+    token_budget + summary_tokens however long the session runs.
+    """
+
+    def __init__(self, token_budget=DEFAULT_TOKEN_BUDGET, summary_tokens=DEFAULT_SUMMARY_TOKENS):
+        self.token_budget = token_budget
+        self.summary_tokens = summary_tokens
+        self._window = deque()
+        self._window_tokens = 0
+        self._summaries = deque()
+        self._summary_tokens = 0
+        self._omitted = 0
+        self._seen = 0
+        self._last_turn = None
+        self._rendered = None
+
+    def update(self, history):
+        """Bring the context up to date with history, appending only new turns
+
+        A history that is shorter than before or differs from what was seen
+        (a restarted scenario) starts the context over. A history that has
+        spilled its oldest turns says how many with a dropped attribute;
+        spilled turns the context never saw count as omitted.
+        """
+        dropped = getattr(history, "dropped", 0)
+        if dropped + len(history) < self._seen or (
+                self._seen > dropped and history[self._seen - 1 - dropped] != self._last_turn):
+            self.reset()
+        if self._seen < dropped:
+            self._omitted += dropped - self._seen
+            self._seen = dropped
+            self._rendered = None
+        for turn in history[self._seen - dropped:]:
+            self.append(turn)
+        return self
+
+    def append(self, turn):
+        text = f"Prompt: {turn['prompt']}\nUser: {turn['response']}\n\n"
+        tokens = estimate_tokens(text)
+        self._window.append((turn, text, tokens))
+        self._window_tokens += tokens
+        self._seen += 1
+        self._last_turn = turn
+        self._rendered = None
+
+        # Keep the newest turn verbatim even if it alone exceeds the budget
+        while self._window_tokens > self.token_budget and len(self._window) > 1:
+            old_turn, _, old_tokens = self._window.popleft()
+            self._window_tokens -= old_tokens
+            self._summarize(old_turn)
+
+    def _summarize(self, turn):
+        line = f"- {_shorten(turn['prompt'])} → {_shorten(turn['response'])}\n"
+        tokens = estimate_tokens(line)
+        self._summaries.append((line, tokens))
+        self._summary_tokens += tokens
+        while self._summary_tokens > self.summary_tokens and self._summaries:
+            _, dropped = self._summaries.popleft()
+            self._summary_tokens -= dropped
+            self._omitted += 1
+
+    def render(self):
+        """The context block for the system prompt, or "" before the first turn"""
+        if self._rendered is not None:
+            return self._rendered
+        if not self._seen:
+            self._rendered = ""
+            return self._rendered
+
+        parts = ["Previous conversation:\n"]
+        if self._summaries or self._omitted:
+            parts.append("Earlier turns (summarized):\n")
+            if self._omitted:
+                parts.append(f"- ({self._omitted} earlier turns omitted)\n")
+            parts.extend(line for line, _ in self._summaries)
+            parts.append("\n")
+        parts.extend(text for _, text, _ in self._window)
+        self._rendered = "".join(parts)
+        return self._rendered
+
+    def reset(self):
+        self._window.clear()
+        self._window_tokens = 0
+        self._summaries.clear()
+        self._summary_tokens = 0
+        self._omitted = 0
+        self._seen = 0
+        self._last_turn = None
+        self._rendered = None
+
+    def stats(self) -> dict:
+        return {
+            "turns": self._seen,
+            "window_turns": len(self._window),
+            "summarized_turns": len(self._summaries),
+            "omitted_turns": self._omitted,
+            "estimated_tokens": self._window_tokens + self._summary_tokens,
+        }
@@ -0,0 +1,156 @@
+import difflib
+import os
+import re
+import threading
+import time
+from functools import lru_cache
+
+from scenario_index import fold
+from speech import FRAME_SECONDS, SAMPLE_RATE, decode_wav, energy_threshold, frame_energy, np
+
+DEFAULT_BUDGET_SECONDS = 4.0
+_WORD_RE = re.compile(r"\w+(?:['-]\w+)*", re.UNICODE)
+
+# Word score adjustments
+SUBSTITUTION_FACTOR = 0.6
+PACE_TOLERANCE = 2.5
+PACE_FACTOR = 0.8
+MIN_VOICED = 0.3
+UNVOICED_FACTOR = 0.7
+
+
+@lru_cache(maxsize=1024)
+def expected_words(text):
+    """(word, folded word) pairs of the text the learner reads aloud"""
+    return tuple((word, fold(word)) for word in _WORD_RE.findall(text))
+
+
+def normalize_heard(word):
+    """Recognized word folded and stripped of punctuation"""
+    return "".join(_WORD_RE.findall(fold(word)))
+
+
+def align(expected, heard):
+    """Pair expected word indexes with heard word indexes
+
+    Returns (expected index, heard index or None, similarity) for every
+    expected word, in order. Words the recognizer added are left out.
+    """
+    matcher = difflib.SequenceMatcher(None, expected, heard, autojunk=False)
+    pairs = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            pairs.extend((i, j1 + offset, 1.0) for offset, i in enumerate(range(i1, i2)))
+        elif tag == "replace":
+            for offset, i in enumerate(range(i1, i2)):
+                j = j1 + offset
+                if j < j2:
+                    pairs.append((i, j, difflib.SequenceMatcher(None, expected[i], heard[j]).ratio()))
+                else:
+                    pairs.append((i, None, 0.0))
+        elif tag == "delete":
+            pairs.extend((i, None, 0.0) for i in range(i1, i2))
+    return pairs
+
+
+def word_features(samples, spans):
+    """Voiced fraction and seconds per character for each (start, end, characters) span
+
+    Frame energies are computed once for the whole recording and a cumulative
+    sum of voiced frames turns every span into two lookups.
+    """
+    energy = frame_energy(samples)
+    if len(spans) == 0 or len(energy) == 0:
+        return np.zeros(len(spans)), np.zeros(len(spans))
+    voiced = np.concatenate(([0], np.cumsum(energy > energy_threshold(energy))))
+    starts, ends, characters = (np.asarray(column, dtype=np.float64) for column in zip(*spans))
+    first = np.clip((starts / FRAME_SECONDS).astype(np.int64), 0, len(energy) - 1)
+    last = np.clip(np.ceil(ends / FRAME_SECONDS).astype(np.int64), first + 1, len(energy))
+    voiced_fraction = (voiced[last] - voiced[first]) / (last - first)
+    pace = (ends - starts) / np.maximum(characters, 1)
+    return voiced_fraction, pace
+
+
+class PronunciationScorer:
+    """Scores a recording of the learner reading a German text, word by word
+
+    The recognizer's shared Whisper model supplies word timings and
+    confidences; words are aligned to the expected text and adjusted by
+    acoustic features of their span. Recognition stops at the latency budget
+    and the words it did not reach are left unscored.
+    """
+
+    def __init__(self, recognizer, budget_seconds=DEFAULT_BUDGET_SECONDS):
+        self.recognizer = recognizer
+        self.budget_seconds = budget_seconds
+        self._lock = threading.Lock()
+        self.assessments = 0
+        self.over_budget = 0
+        self.total_ms = 0.0
+
+    @classmethod
+    def from_env(cls, recognizer, environ=os.environ):
+        return cls(recognizer, float(environ.get("PRONUNCIATION_BUDGET_SECONDS", DEFAULT_BUDGET_SECONDS)))
+
+    def score(self, wav_bytes, expected_text) -> dict:
+        """Per-word and overall scores (0-100) for a recording of expected_text
+
+        Each word carries the expected word, what was heard, its score and
+        its timing. A score of None means the budget ran out before the word
+        was reached.
+        """
+        started = time.monotonic()
+        samples = decode_wav(wav_bytes)
+        heard, complete = self.recognizer.recognize_words(samples, deadline=started + self.budget_seconds)
+        expected = expected_words(expected_text)
+        pairs = align([folded for _, folded in expected], [normalize_heard(word[0]) for word in heard])
+
+        matched = [(i, j, similarity) for i, j, similarity in pairs if j is not None]
+        voiced_fraction, pace = word_features(
+            samples, [(heard[j][1], heard[j][2], len(expected[i][1])) for i, j, _ in matched]
+        )
+        typical_pace = float(np.median(pace)) if len(pace) else 0.0
+
+        scores = {}
+        for position, (i, j, similarity) in enumerate(matched):
+            score = 100.0 * heard[j][3] * (similarity if similarity == 1.0 else similarity * SUBSTITUTION_FACTOR)
+            if typical_pace and not 1 / PACE_TOLERANCE <= pace[position] / typical_pace <= PACE_TOLERANCE:
+                score *= PACE_FACTOR
+            if voiced_fraction[position] < MIN_VOICED:
+                score *= UNVOICED_FACTOR
+            scores[i] = (round(score), j)
+
+        # Words after the last one heard were never reached when the budget ran out
+        reached = max(scores, default=-1)
+        words = []
+        for i, (word, _) in enumerate(expected):
+            if i in scores:
+                score, j = scores[i]
+                words.append({"word": word, "heard": heard[j][0], "score": score,
+                              "start": round(heard[j][1], 2), "end": round(heard[j][2], 2)})
+            else:
+                words.append({"word": word, "heard": "", "score": 0 if complete or i < reached else None,
+                              "start": None, "end": None})
+
+        scored = [word["score"] for word in words if word["score"] is not None]
+        elapsed_ms = (time.monotonic() - started) * 1000
+        with self._lock:
+            self.assessments += 1
+            self.over_budget += not complete
+            self.total_ms += elapsed_ms
+        return {
+            "words": words,
+            "score": round(sum(scored) / len(scored)) if scored else 0,
+            "accuracy": round(sum(similarity == 1.0 for _, _, similarity in matched) / len(expected), 2) if expected else 0.0,
+            "duration": round(len(samples) / SAMPLE_RATE, 1),
+            "complete": complete,
+            "latency_ms": round(elapsed_ms),
+        }
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "assessments": self.assessments,
+                "over_budget": self.over_budget,
+                "average_ms": round(self.total_ms / self.assessments) if self.assessments else None,
+            }
@@ -0,0 +1,129 @@
+import difflib
+import re
+import unicodedata
+from bisect import bisect_left
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Field weights: a hit in the title counts more than one in the context
+FIELD_WEIGHTS = {
+    "title": 3.0, "title_en": 3.0,
+    "context": 1.0, "context_en": 1.0,
+    "difficulty": 2.0, "difficulty_en": 2.0,
+    "formality": 2.0,
+}
+PREFIX_FACTOR = 0.7
+FUZZY_FACTOR = 0.5
+FUZZY_CUTOFF = 0.75
+DEFAULT_PAGE_SIZE = 9
+
+
+def fold(text):
+    """Lowercase and strip accents, so that anfanger finds Anfänger"""
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def terms(text):
+    return _TOKEN_RE.findall(fold(text or ""))
+
+
+class SearchResult:
+    """One page of matching scenario keys plus facet counts over all matches"""
+
+    def __init__(self, keys, total, page, page_size, facets):
+        self.keys = keys
+        self.total = total
+        self.page = page
+        self.page_size = page_size
+        self.facets = facets
+
+    @property
+    def pages(self):
+        return max(1, -(-self.total // self.page_size))
+
+
+class ScenarioIndex:
+    """In-memory inverted index over scenario titles, contexts and levels in both languages
+
+    Terms are accent-folded. Exact terms are dictionary lookups, prefixes a
+    bisect over the sorted vocabulary, and terms with neither fall back to a
+    fuzzy match against vocabulary words of similar length. Facets are
+    precomputed key sets per difficulty and formality.
+    """
+
+    def __init__(self, scenarios):
+        self.order = {key: position for position, key in enumerate(scenarios)}
+        self.postings = {}
+        self.facets = {"difficulty": {}, "formality": {}}
+        for key, scenario in scenarios.items():
+            for field, weight in FIELD_WEIGHTS.items():
+                for term in terms(scenario.get(field, "")):
+                    postings = self.postings.setdefault(term, {})
+                    postings[key] = max(postings.get(key, 0.0), weight)
+            for facet in self.facets:
+                self.facets[facet].setdefault(scenario[facet], set()).add(key)
+        self.vocabulary = sorted(self.postings)
+        self._by_length = {}
+        for term in self.vocabulary:
+            self._by_length.setdefault(len(term), []).append(term)
+
+    def facet_values(self, facet):
+        """Values of a facet in catalog order of first appearance"""
+        values = self.facets[facet]
+        return sorted(values, key=lambda value: min(self.order[key] for key in values[value]))
+
+    def _prefix_terms(self, prefix):
+        start = bisect_left(self.vocabulary, prefix)
+        matches = []
+        for term in self.vocabulary[start:]:
+            if not term.startswith(prefix):
+                break
+            matches.append(term)
+        return matches
+
+    def _fuzzy_terms(self, term):
+        candidates = []
+        for length in range(max(1, len(term) - 2), len(term) + 3):
+            candidates.extend(self._by_length.get(length, ()))
+        return difflib.get_close_matches(term, candidates, n=3, cutoff=FUZZY_CUTOFF)
+
+    def _term_scores(self, term):
+        """Scores per scenario key for one query term"""
+        scores = {}
+        expansions = [(term, 1.0)] if term in self.postings else []
+        expansions += [(match, PREFIX_FACTOR) for match in self._prefix_terms(term) if match != term]
+        if not expansions:
+            expansions = [(match, FUZZY_FACTOR) for match in self._fuzzy_terms(term)]
+        for match, factor in expansions:
+            for key, weight in self.postings[match].items():
+                scores[key] = max(scores.get(key, 0.0), weight * factor)
+        return scores
+
+    def search(self, query="", difficulty=None, formality=None, page=0, page_size=DEFAULT_PAGE_SIZE):
+        """Matching scenario keys, best first, as one page of a SearchResult
+
+        Every query term must match (exactly, as a prefix or fuzzily). An
+        empty query lists the catalog in its own order.
+        """
+        candidates = set(self.order)
+        if difficulty:
+            candidates &= self.facets["difficulty"].get(difficulty, set())
+        if formality:
+            candidates &= self.facets["formality"].get(formality, set())
+
+        scores = dict.fromkeys(candidates, 0.0)
+        for term in terms(query):
+            term_scores = self._term_scores(term)
+            scores = {key: score + term_scores[key] for key, score in scores.items() if key in term_scores}
+            if not scores:
+                break
+
+        ranked = sorted(scores, key=lambda key: (-scores[key], self.order[key]))
+        facets = {
+            facet: {value: len(keys & scores.keys()) for value, keys in values.items()}
+            for facet, values in self.facets.items()
+        }
+        page = max(0, min(page, max(0, (len(ranked) - 1) // page_size)))
+        start = page * page_size
+        return SearchResult(ranked[start:start + page_size], len(ranked), page, page_size, facets)
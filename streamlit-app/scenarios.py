@@ -0,0 +1,157 @@
+import json
+import os
+import threading
+import time
+from types import MappingProxyType
+
+from scenario_index import ScenarioIndex
+
+CONTENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "content")
+DEFAULT_RELOAD_SECONDS = 2.0
+
+SCENARIO_FIELDS = ("title", "context", "difficulty", "formality", "icon", "prompts")
+PROMPT_FIELDS = ("german",)
+# Every other language must translate the same keys as this one
+REFERENCE_LANGUAGE = "en"
+
+
+def freeze(value):
+    """Read-only copy of parsed JSON: dicts become mapping proxies, lists tuples"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def validate_scenarios(scenarios, source="scenarios"):
+    """Raise ValueError naming the first scenario or prompt with missing fields"""
+    if not isinstance(scenarios, dict) or not scenarios:
+        raise ValueError(f"{source}: expected a non-empty object of scenarios")
+    for key, scenario in scenarios.items():
+        missing = [name for name in SCENARIO_FIELDS if name not in scenario]
+        if missing:
+            raise ValueError(f"{source}: scenario {key!r} is missing {', '.join(missing)}")
+        if not scenario["prompts"]:
+            raise ValueError(f"{source}: scenario {key!r} has no prompts")
+        for index, prompt in enumerate(scenario["prompts"]):
+            missing = [name for name in PROMPT_FIELDS if name not in prompt]
+            if missing:
+                raise ValueError(f"{source}: prompt {index} of {key!r} is missing {', '.join(missing)}")
+
+
+def validate_translations(translations, source="translations"):
+    """Raise ValueError naming the first language with a missing, extra or non-text key"""
+    if not isinstance(translations, dict) or REFERENCE_LANGUAGE not in translations:
+        raise ValueError(f"{source}: expected an object of languages including {REFERENCE_LANGUAGE!r}")
+    reference = translations[REFERENCE_LANGUAGE]
+    if not isinstance(reference, dict) or not reference:
+        raise ValueError(f"{source}: language {REFERENCE_LANGUAGE!r} has no keys")
+    for lang, strings in translations.items():
+        if not isinstance(strings, dict):
+            raise ValueError(f"{source}: language {lang!r} is not an object of keys")
+        missing = [key for key in reference if key not in strings]
+        if missing:
+            raise ValueError(f"{source}: language {lang!r} is missing {', '.join(missing)}")
+        extra = [key for key in strings if key not in reference]
+        if extra:
+            raise ValueError(f"{source}: language {lang!r} has keys missing from {REFERENCE_LANGUAGE!r}: "
+                             f"{', '.join(extra)}")
+        not_text = [key for key, value in strings.items() if not isinstance(value, str)]
+        if not_text:
+            raise ValueError(f"{source}: language {lang!r} has non-text values for {', '.join(not_text)}")
+
+
+class Catalog:
+    """Immutable scenario and translation content, compiled once per file version
+
+    scenarios keeps the insertion order of the source file. prompts indexes
+    every prompt by (scenario key, German prompt text), and index is the
+    search index used by the scenario selection screen.
+    """
+
+    def __init__(self, scenarios, translations, version=None):
+        validate_scenarios(scenarios)
+        validate_translations(translations)
+        self.scenarios = freeze(scenarios)
+        self.translations = freeze(translations)
+        self.version = version
+        self.prompts = MappingProxyType({
+            (key, prompt["german"]): prompt
+            for key, scenario in self.scenarios.items()
+            for prompt in scenario["prompts"]
+        })
+        self.index = ScenarioIndex(self.scenarios)
+
+    def __len__(self):
+        return len(self.scenarios)
+
+
+def _read_json(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _file_version(paths):
+    return tuple((os.stat(path).st_mtime_ns, os.stat(path).st_size) for path in paths)
+
+
+def load_catalog(content_dir=CONTENT_DIR):
+    """Compile scenarios.json and translations.json from content_dir into a Catalog"""
+    scenarios_path = os.path.join(content_dir, "scenarios.json")
+    translations_path = os.path.join(content_dir, "translations.json")
+    version = _file_version((scenarios_path, translations_path))
+    try:
+        scenarios = _read_json(scenarios_path)
+    except ValueError as e:
+        raise ValueError(f"{scenarios_path}: {e}") from None
+    try:
+        translations = _read_json(translations_path)
+    except ValueError as e:
+        raise ValueError(f"{translations_path}: {e}") from None
+    return Catalog(scenarios, translations, version=version)
+
+
+class CatalogLoader:
+    """Serves the current Catalog and reloads it when the content files change
+
+    Files are stat'ed at most once per check_interval, so asking for the
+    catalog on every rerun costs a clock read. A broken edit keeps the last
+    good catalog in service and is reported through last_error.
+    """
+
+    def __init__(self, content_dir=CONTENT_DIR, check_interval=DEFAULT_RELOAD_SECONDS):
+        self.content_dir = content_dir
+        self.check_interval = check_interval
+        self.last_error = None
+        self.reloads = 0
+        self._lock = threading.Lock()
+        self._catalog = load_catalog(content_dir)
+        self._checked_at = time.monotonic()
+
+    def get(self):
+        """The current catalog, reloaded first if the files changed"""
+        if time.monotonic() - self._checked_at >= self.check_interval:
+            with self._lock:
+                if time.monotonic() - self._checked_at >= self.check_interval:
+                    self._checked_at = time.monotonic()
+                    self._reload_if_changed()
+        return self._catalog
+
+    def _reload_if_changed(self):
+        paths = [os.path.join(self.content_dir, name) for name in ("scenarios.json", "translations.json")]
+        try:
+            if _file_version(paths) == self._catalog.version:
+                return
+            self._catalog = load_catalog(self.content_dir)
+            self.reloads += 1
+            self.last_error = None
+        except (OSError, ValueError) as e:
+            self.last_error = str(e)
+
+    def stats(self) -> dict:
+        return {
+            "scenarios": len(self._catalog),
+            "reloads": self.reloads,
+            "last_error": self.last_error,
+        }
@@ -0,0 +1,184 @@
+import math
+import re
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+_SENTENCE_START_RE = re.compile(r"(?:^|[.!?]\s+)(\w+)", re.UNICODE)
+
+# Address forms; capitalised Sie/Ihnen/Ihr are formal, lowercase du-forms informal
+FORMAL_TOKENS = frozenset({"Sie", "Ihnen", "Ihr", "Ihre", "Ihren", "Ihrem", "Ihrer", "Ihres"})
+INFORMAL_TOKENS = frozenset({"du", "dir", "dich", "dein", "deine", "deinen", "deinem", "deiner", "deines", "deins"})
+
+# Frequent German and English function words, used to tell which language an answer is in
+GERMAN_MARKERS = frozenset({
+    "ich", "bin", "ist", "sind", "und", "oder", "aber", "das", "der", "die", "den", "dem", "ein",
+    "eine", "einen", "es", "nicht", "mein", "meine", "mir", "mich", "wir", "habe", "hat", "haben",
+    "war", "gut", "ja", "nein", "danke", "bitte", "gerne", "sehr", "auch", "mit", "für", "auf",
+    "zu", "im", "in", "noch", "schon", "heute", "hallo", "guten", "tag", "morgen", "kann",
+    "können", "möchte", "würde", "wie", "was", "sie", "du", "dir", "ihnen", "ihr",
+})
+# Only words that are not also German, so "was", "in" or "so" count for neither side
+ENGLISH_MARKERS = frozenset({
+    "i", "i'm", "you", "he", "she", "it", "we", "they", "my", "your", "our", "their", "the", "a", "an",
+    "is", "are", "am", "were", "be", "been", "have", "has", "had", "do", "does", "did", "not", "no", "yes",
+    "and", "or", "but", "of", "to", "for", "on", "at", "with", "from", "this", "that", "there", "what",
+    "how", "why", "when", "where", "who", "can", "could", "would", "will", "should", "very", "really",
+    "great", "good", "fine", "thanks", "thank", "please", "hello", "hi", "today", "yesterday", "work",
+    "meeting", "weekend", "think", "like", "just", "about",
+})
+_GERMAN_LETTERS_RE = re.compile(r"[äöüß]", re.IGNORECASE)
+
+
+def tokenize(text):
+    """Split text into word tokens, keeping their original case"""
+    return _TOKEN_RE.findall(text or "")
+
+
+def looks_german(text):
+    """False only when text is clearly in another language, mostly English
+
+    Short answers with no function words at all ("Prima!", "Langweilig.")
+    carry too little evidence and count as German; the model judges them.
+    So do mixed answers unless English words outnumber German ones twice over.
+    """
+    if _GERMAN_LETTERS_RE.search(text or ""):
+        return True
+    words = [word.lower() for word in re.findall(r"[\w']+", text or "", re.UNICODE)]
+    english = sum(1 for word in words if word in ENGLISH_MARKERS)
+    german = sum(1 for word in words if word in GERMAN_MARKERS)
+    return english < 2 or english < 2 * german
+
+
+def detect_formality(text):
+    """Return (uses_formal, uses_informal) for the forms of address in text
+
+    A capitalised "Sie" at the start of a sentence may just be "they", so it
+    only counts as formal address elsewhere in the sentence.
+    """
+    text = text or ""
+    sentence_starts = {match.start(1) for match in _SENTENCE_START_RE.finditer(text)}
+    uses_formal = uses_informal = False
+    for match in _TOKEN_RE.finditer(text):
+        token = match.group(0)
+        if token in FORMAL_TOKENS:
+            if token != "Sie" or match.start() not in sentence_starts:
+                uses_formal = True
+        elif token.lower() in INFORMAL_TOKENS:
+            uses_informal = True
+    return uses_formal, uses_informal
+
+
+class PromptScorer:
+    """Deterministic scorer for one scenario prompt
+
+    The prompt's keywords are compiled once into a single alternation regex
+    anchored at word starts (so "problem" also matches "Probleme"), and
+    scoring a response is one scan plus a tokenizer pass.
+    """
+
+    def __init__(self, formality, keywords=(), suggested_response=""):
+        self.formality = formality
+        self.keywords = tuple(k.lower() for k in keywords)
+        self.suggested_response = suggested_response
+        if self.keywords:
+            alternation = "|".join(re.escape(k) for k in sorted(self.keywords, key=len, reverse=True))
+            self._keyword_re = re.compile(r"\b(?:%s)" % alternation)
+        else:
+            self._keyword_re = None
+
+    def keyword_matches(self, normalized):
+        if self._keyword_re is None:
+            return []
+        seen = []
+        for match in self._keyword_re.finditer(normalized):
+            if match.group(0) not in seen:
+                seen.append(match.group(0))
+        return seen
+
+    def score(self, response):
+        """Score a response and return feedback in the same shape as Gemini's"""
+        normalized = (response or "").lower().strip()
+        words = tokenize(normalized)
+        matches = self.keyword_matches(normalized)
+        uses_formal, uses_informal = detect_formality(response or "")
+
+        # Gate answers that are not worth an LLM call; anything else gets a provisional score
+        gate = None
+        if not words:
+            gate = "empty"
+        elif not looks_german(response):
+            gate = "not_german"
+
+        score = 1.0
+        if len(words) >= 10:
+            score += 1
+        elif len(words) >= 5:
+            score += 0.5
+
+        if len(matches) >= 3:
+            score += 2
+        elif len(matches) >= 2:
+            score += 1.5
+        elif len(matches) >= 1:
+            score += 1
+
+        formality_correct = (
+            (self.formality == "Sie" and uses_formal and not uses_informal)
+            or (self.formality == "Du" and uses_informal)
+            or (self.formality == "Du/Sie" and (uses_formal or uses_informal))
+        )
+        if formality_correct:
+            score += 0.5
+
+        # Half points round up, as Math.round does in the web client
+        score = int(min(max(math.floor(score + 0.5), 1), 5))
+        if gate is not None:
+            score = 1
+
+        what_worked = []
+        if len(words) >= 5:
+            what_worked.append("Gute Antwortlänge – Sie bringen sich ins Gespräch ein")
+        if matches:
+            what_worked.append("Passender Wortschatz: " + ", ".join(f'"{m}"' for m in matches[:2]))
+        if formality_correct:
+            what_worked.append(f"Angemessene Anrede ({self.formality})")
+        if not what_worked:
+            what_worked.append("Sie haben versucht, auf Deutsch zu antworten – ein guter Anfang!")
+
+        if gate == "empty":
+            improvement = "Bitte geben Sie eine Antwort ein."
+        elif gate == "not_german":
+            improvement = "Antworten Sie bitte auf Deutsch."
+        elif len(words) < 5:
+            improvement = "Geben Sie ausführlichere Antworten, damit das Gespräch natürlich weiterläuft."
+        elif len(matches) < 2:
+            improvement = "Verwenden Sie mehr themenbezogenen Wortschatz."
+        elif not formality_correct and self.formality == "Sie":
+            improvement = "Denken Sie an die formelle Anrede (Sie) im beruflichen Kontext."
+        elif not formality_correct and self.formality == "Du":
+            improvement = "Das ist ein informeller Kontext – mit Kollegen können Sie \"du\" verwenden."
+        else:
+            improvement = "Stellen Sie eine Rückfrage, um Interesse am Gespräch zu zeigen."
+
+        return {
+            "relevance_score": score,
+            "transcript": response,
+            "what_worked": what_worked,
+            "improvement": improvement,
+            "suggested_response": self.suggested_response or "Eine natürlichere Antwort wäre hilfreich",
+            "score_explanation": f"Automatische Bewertung: {len(words)} Wörter, {len(matches)} Schlüsselwörter",
+            "source": "local",
+            "gate": gate,
+        }
+
+
+def build_scorers(scenarios):
+    """Precompile a PromptScorer for every prompt, keyed by (scenario key, German prompt)"""
+    scorers = {}
+    for key, scenario in scenarios.items():
+        for prompt in scenario['prompts']:
+            scorers[(key, prompt['german'])] = PromptScorer(
+                scenario['formality'],
+                prompt.get('keywords', ()),
+                prompt.get('suggested_response', ""),
+            )
+    return scorers
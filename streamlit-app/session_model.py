@@ -0,0 +1,359 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import weakref
+
+DEFAULT_MAX_TURNS = 20
+DEFAULT_IDLE_SECONDS = 15 * 60
+DEFAULT_EXPIRE_SECONDS = 24 * 60 * 60
+DEFAULT_SPILL_DIR = os.path.join(tempfile.gettempdir(), "deutsch-fluent-sessions")
+
+
+class ChatMessage:
+    """One chat bubble: a scenario prompt by index, or the learner's own text"""
+
+    __slots__ = ("index", "content")
+
+    def __init__(self, index=None, content=None):
+        self.index = index
+        self.content = content
+
+    @property
+    def is_prompt(self):
+        return self.index is not None
+
+    def to_json(self):
+        return {"index": self.index} if self.is_prompt else {"content": self.content}
+
+
+class Turn:
+    """One answered prompt; the prompt text stays in the catalog and is looked up by index
+
+    Supports turn['prompt'] and turn['response'], so it can stand in for the
+    history dicts the feedback pipeline reads.
+    """
+
+    __slots__ = ("prompts", "index", "response")
+
+    def __init__(self, prompts, index, response):
+        self.prompts = prompts
+        self.index = index
+        self.response = response
+
+    @property
+    def prompt(self):
+        return self.prompts[self.index]['german']
+
+    def __getitem__(self, name):
+        if name not in ("prompt", "response"):
+            raise KeyError(name)
+        return getattr(self, name)
+
+    def __eq__(self, other):
+        if not isinstance(other, Turn):
+            return NotImplemented
+        return self.prompts is other.prompts and self.index == other.index and self.response == other.response
+
+    def to_json(self):
+        return {"index": self.index, "response": self.response}
+
+
+class TurnHistory(list):
+    """The answered turns still in memory; dropped counts those spilled to disk before them"""
+
+    dropped = 0
+
+
+class Transcript:
+    """Messages and answered turns of one scenario conversation, capped in memory
+
+    Prompts are referenced by their index in the scenario rather than copied
+    into every message and turn. Once more than max_turns turns are held,
+    the oldest turns and the messages up to them are appended to a spill
+    file and dropped from memory; spilled() reads them back when the full
+    transcript is wanted. hibernate() spills everything of an idle session
+    and the next access brings it back. The reaper hibernates from another
+    thread, so every change happens under a lock, and spilling replaces the
+    message and turn lists rather than trimming them, so lists already
+    handed out are never cut short. New messages and turns are appended.
+    """
+
+    __slots__ = ("scenario_key", "prompts", "max_turns", "spill_path", "_messages", "_turns",
+                 "_spilled_messages", "_hibernated", "_lock", "__weakref__")
+
+    def __init__(self, scenario_key, prompts, max_turns=DEFAULT_MAX_TURNS, spill_path=None):
+        self.scenario_key = scenario_key
+        self.prompts = prompts
+        self.max_turns = max_turns
+        self.spill_path = spill_path
+        self._messages = []
+        self._turns = TurnHistory()
+        self._spilled_messages = 0
+        self._hibernated = False
+        self._lock = threading.RLock()
+
+    # Reading
+    @property
+    def messages(self):
+        """Messages still in memory, oldest first"""
+        with self._lock:
+            self._wake()
+            return self._messages
+
+    @property
+    def history(self):
+        """Answered turns still in memory, as a TurnHistory"""
+        with self._lock:
+            self._wake()
+            return self._turns
+
+    @property
+    def message_count(self):
+        """Messages in the whole transcript, spilled ones included"""
+        with self._lock:
+            self._wake()
+            return self._spilled_messages + len(self._messages)
+
+    @property
+    def spilled_count(self):
+        """Messages of the transcript that are on disk rather than in memory"""
+        with self._lock:
+            self._wake()
+            return self._spilled_messages
+
+    def messages_since(self, count):
+        """Messages after the first count of the whole transcript that are still in memory"""
+        with self._lock:
+            return self.messages[max(0, count - self._spilled_messages):]
+
+    def prompt(self, index):
+        return self.prompts[index]
+
+    def spilled(self):
+        """Messages that were spilled to disk, read back in order"""
+        with self._lock:
+            messages, _ = self._read_spill()
+        return messages
+
+    # Writing
+    def add_prompt(self, index):
+        with self._lock:
+            self.messages.append(ChatMessage(index=index))
+
+    def add_response(self, content):
+        with self._lock:
+            self.messages.append(ChatMessage(content=content))
+
+    def add_turn(self, index, response):
+        with self._lock:
+            self.history.append(Turn(self.prompts, index, response))
+            if len(self._turns) > self.max_turns and self.spill_path is not None:
+                self._spill(len(self._turns) - self.max_turns)
+
+    def clear_messages(self):
+        """Start the chat over; answered turns stay as conversation context"""
+        with self._lock:
+            self._wake()
+            if self._spilled_messages:
+                _, turns = self._read_spill()
+                self._rewrite([], turns)
+            self._spilled_messages = 0
+            self._messages = []
+
+    def _spill(self, turn_count, all_messages=False):
+        """Append the oldest turn_count turns, and the messages up to the last of them, to the spill file"""
+        turns = self._turns[:turn_count]
+        if all_messages:
+            message_count = len(self._messages)
+        else:
+            # Keep messages from the oldest prompt still answered in memory
+            answered = 0
+            message_count = 0
+            for position, message in enumerate(self._messages):
+                if not message.is_prompt:
+                    answered += 1
+                    if answered == turn_count:
+                        message_count = position + 1
+                        break
+        os.makedirs(os.path.dirname(os.path.abspath(self.spill_path)), exist_ok=True)
+        with open(self.spill_path, "a", encoding="utf-8") as f:
+            for message in self._messages[:message_count]:
+                f.write(json.dumps({"message": message.to_json()}, ensure_ascii=False) + "\n")
+            for turn in turns:
+                f.write(json.dumps({"turn": turn.to_json()}, ensure_ascii=False) + "\n")
+        turns = TurnHistory(self._turns[turn_count:])
+        turns.dropped = self._turns.dropped + turn_count
+        self._messages = self._messages[message_count:]
+        self._turns = turns
+        self._spilled_messages += message_count
+
+    def hibernate(self):
+        """Move the whole transcript to disk until it is next read; False if there was nothing to do"""
+        with self._lock:
+            if self._hibernated or self.spill_path is None:
+                return False
+            self._spill(len(self._turns), all_messages=True)
+            self._hibernated = True
+            return True
+
+    def _wake(self):
+        if not self._hibernated:
+            return
+        self._hibernated = False
+        # Bring back the messages and turns that fit the cap
+        messages, turns = self._read_spill()
+        keep = turns[-self.max_turns:]
+        answered = sum(1 for message in messages if not message.is_prompt)
+        skip = answered - len(keep)
+        start = 0
+        for position, message in enumerate(messages):
+            if skip <= 0:
+                break
+            if not message.is_prompt:
+                skip -= 1
+                start = position + 1
+        self._rewrite(messages[:start], turns[:len(turns) - len(keep)])
+        self._messages = messages[start:]
+        self._turns = TurnHistory(keep)
+        self._turns.dropped = len(turns) - len(keep)
+        self._spilled_messages = start
+
+    def _read_spill(self):
+        """(messages, turns) in the spill file, oldest first"""
+        messages, turns = [], []
+        if self.spill_path is None or not os.path.exists(self.spill_path):
+            return messages, turns
+        with open(self.spill_path, encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                if "message" in record:
+                    messages.append(ChatMessage(**record["message"]))
+                else:
+                    turns.append(Turn(self.prompts, record["turn"]["index"], record["turn"]["response"]))
+        return messages, turns
+
+    def _rewrite(self, messages, turns):
+        """Replace the spill file with just what stays on disk"""
+        tmp_path = f"{self.spill_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for message in messages:
+                f.write(json.dumps({"message": message.to_json()}, ensure_ascii=False) + "\n")
+            for turn in turns:
+                f.write(json.dumps({"turn": turn.to_json()}, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, self.spill_path)
+
+    def discard(self):
+        """Delete the spill file"""
+        with self._lock:
+            if self.spill_path is not None and os.path.exists(self.spill_path):
+                os.remove(self.spill_path)
+
+
+class SessionReaper:
+    """Tracks the transcripts of live sessions and hibernates idle ones
+
+    Transcripts are held weakly, so sessions Streamlit has already dropped
+    cost nothing here. Sessions idle for idle_seconds have their transcript
+    moved to disk. A session has ended once Streamlit drops its transcript;
+    its spill file is deleted then. Spill files left by earlier processes
+    are deleted once they are expire_seconds old. A live session's file is
+    never deleted, however long it idles. sweep() is rate limited and cheap
+    to call on every rerun.
+    """
+
+    def __init__(self, spill_dir=DEFAULT_SPILL_DIR, max_turns=DEFAULT_MAX_TURNS, idle_seconds=DEFAULT_IDLE_SECONDS,
+                 expire_seconds=DEFAULT_EXPIRE_SECONDS):
+        self.spill_dir = spill_dir
+        self.max_turns = max_turns
+        self.idle_seconds = idle_seconds
+        self.expire_seconds = expire_seconds
+        os.makedirs(spill_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._transcripts = weakref.WeakValueDictionary()
+        self._last_seen = {}
+        self._swept_at = time.monotonic()
+        self.hibernated = 0
+        self.expired = 0
+
+    @classmethod
+    def from_env(cls, environ=os.environ):
+        return cls(
+            spill_dir=environ.get("SESSION_SPILL_DIR", DEFAULT_SPILL_DIR),
+            max_turns=int(environ.get("SESSION_MAX_TURNS", DEFAULT_MAX_TURNS)),
+            idle_seconds=float(environ.get("SESSION_IDLE_SECONDS", DEFAULT_IDLE_SECONDS)),
+            expire_seconds=float(environ.get("SESSION_EXPIRE_SECONDS", DEFAULT_EXPIRE_SECONDS)),
+        )
+
+    def new_transcript(self, session_id, scenario_key, prompts):
+        """A fresh transcript for session_id, replacing and discarding its previous one"""
+        with self._lock:
+            previous = self._transcripts.pop(session_id, None)
+        if previous is not None:
+            previous.discard()
+        transcript = Transcript(scenario_key, prompts, self.max_turns, self._spill_path(session_id))
+        with self._lock:
+            self._transcripts[session_id] = transcript
+            self._last_seen[session_id] = time.monotonic()
+        return transcript
+
+    def touch(self, session_id):
+        with self._lock:
+            self._last_seen[session_id] = time.monotonic()
+
+    def _spill_path(self, session_id):
+        return os.path.join(self.spill_dir, f"{session_id}.jsonl")
+
+    def sweep(self):
+        """Hibernate idle transcripts and delete the spill files of ended sessions, at most once a minute"""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._swept_at < min(60.0, self.idle_seconds):
+                return
+            self._swept_at = now
+            idle = [(session_id, seen) for session_id, seen in self._last_seen.items()
+                    if now - seen >= self.idle_seconds]
+        for session_id, seen in idle:
+            transcript = self._transcripts.get(session_id)
+            if transcript is None:
+                # Streamlit dropped the session
+                with self._lock:
+                    self._last_seen.pop(session_id, None)
+                path = self._spill_path(session_id)
+                if os.path.exists(path):
+                    os.remove(path)
+                    self.expired += 1
+                continue
+            with self._lock:
+                # Seen again since the idle list was taken
+                if self._last_seen.get(session_id) != seen:
+                    continue
+            if transcript.hibernate():
+                self.hibernated += 1
+        self._remove_orphans()
+
+    def _remove_orphans(self):
+        """Delete spill files older than expire_seconds that belong to no session of this process"""
+        cutoff = time.time() - self.expire_seconds
+        with self._lock:
+            known = set(self._last_seen)
+        for entry in os.scandir(self.spill_dir):
+            session_id, extension = os.path.splitext(entry.name)
+            if extension != ".jsonl" or session_id in known:
+                continue
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    self.expired += 1
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sessions": len(self._last_seen),
+                "live_transcripts": len(self._transcripts),
+                "hibernated": self.hibernated,
+                "expired": self.expired,
+            }
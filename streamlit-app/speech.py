@@ -0,0 +1,243 @@
+import os
+import struct
+import threading
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    from faster_whisper import WhisperModel
+except ImportError:
+    WhisperModel = None
+
+SAMPLE_RATE = 16000
+DEFAULT_MODEL = "small"
+DEFAULT_MAX_CONCURRENCY = 2
+
+# Voice activity detection
+FRAME_SECONDS = 0.03
+MIN_SPEECH_SECONDS = 0.25
+MAX_GAP_SECONDS = 0.4
+PAD_SECONDS = 0.15
+MAX_CHUNK_SECONDS = 30.0
+ENERGY_FLOOR = 0.01
+
+
+class SpeechUnavailableError(RuntimeError):
+    """Raised when voice input is used without faster-whisper and numpy installed"""
+
+
+def speech_available():
+    """Whether the optional speech-to-text dependencies are installed"""
+    return np is not None and WhisperModel is not None
+
+
+def decode_wav(data):
+    """Decode WAV bytes into mono float32 samples at SAMPLE_RATE
+
+    The PCM payload is read in place through np.frombuffer over a memoryview
+    of the upload, so the only copy is the float conversion the model needs.
+    Supports 16-bit PCM and 32-bit float WAV, mono or multi-channel.
+    """
+    if np is None:
+        raise SpeechUnavailableError("numpy is required for voice input")
+    view = memoryview(data)
+    if len(view) < 12 or bytes(view[0:4]) != b"RIFF" or bytes(view[8:12]) != b"WAVE":
+        raise ValueError("Not a WAV recording")
+
+    fmt = None
+    offset = 12
+    while offset + 8 <= len(view):
+        chunk_id = bytes(view[offset:offset + 4])
+        (size,) = struct.unpack_from("<I", view, offset + 4)
+        body = offset + 8
+        if chunk_id == b"fmt ":
+            fmt = struct.unpack_from("<HHIIHH", view, body)
+        elif chunk_id == b"data":
+            if fmt is None:
+                raise ValueError("WAV data before format chunk")
+            # Recorders streaming to a blob may leave the size at 0 or too large
+            size = min(size, len(view) - body) if size else len(view) - body
+            return _to_float_mono(view[body:body + size], fmt)
+        offset = body + size + (size & 1)
+    raise ValueError("WAV recording has no audio data")
+
+
+def _to_float_mono(payload, fmt):
+    audio_format, channels, sample_rate, _, _, bits = fmt
+    if audio_format == 1 and bits == 16:
+        count = len(payload) // 2
+        samples = np.frombuffer(payload, dtype="<i2", count=count).astype(np.float32)
+        samples *= 1.0 / 32768.0
+    elif audio_format == 3 and bits == 32:
+        samples = np.frombuffer(payload, dtype="<f4", count=len(payload) // 4)
+    else:
+        raise ValueError(f"Unsupported WAV encoding (format {audio_format}, {bits} bit)")
+
+    if channels > 1:
+        samples = samples[:len(samples) - len(samples) % channels].reshape(-1, channels).mean(axis=1)
+    if sample_rate != SAMPLE_RATE:
+        duration = len(samples) / sample_rate
+        target = np.linspace(0, duration, int(duration * SAMPLE_RATE), endpoint=False, dtype=np.float32)
+        source = np.arange(len(samples), dtype=np.float32) / sample_rate
+        samples = np.interp(target, source, samples).astype(np.float32)
+    return np.ascontiguousarray(samples, dtype=np.float32)
+
+
+def frame_energy(samples):
+    """RMS energy of each FRAME_SECONDS frame, computed over a reshaped view"""
+    frame = int(FRAME_SECONDS * SAMPLE_RATE)
+    frames = len(samples) // frame
+    return np.sqrt(np.mean(np.square(samples[:frames * frame].reshape(frames, frame)), axis=1))
+
+
+def energy_threshold(energy):
+    """Speech/silence threshold adapted to the recording's noise floor"""
+    return max(ENERGY_FLOOR, float(np.percentile(energy, 20)) * 3.0)
+
+
+def speech_segments(samples):
+    """(start, end) sample ranges that contain speech, split to at most MAX_CHUNK_SECONDS
+
+    Frame energy is compared against a threshold adapted to the recording's
+    noise floor; short pauses are bridged and very short blips dropped.
+    """
+    frame = int(FRAME_SECONDS * SAMPLE_RATE)
+    energy = frame_energy(samples)
+    if len(energy) == 0:
+        return []
+    voiced = np.flatnonzero(energy > energy_threshold(energy))
+    if len(voiced) == 0:
+        return []
+
+    max_gap = int(MAX_GAP_SECONDS / FRAME_SECONDS)
+    runs = []
+    start = prev = int(voiced[0])
+    for index in voiced[1:]:
+        index = int(index)
+        if index - prev > max_gap:
+            runs.append((start, prev + 1))
+            start = index
+        prev = index
+    runs.append((start, prev + 1))
+
+    pad = int(PAD_SECONDS * SAMPLE_RATE)
+    min_length = int(MIN_SPEECH_SECONDS * SAMPLE_RATE)
+    max_length = int(MAX_CHUNK_SECONDS * SAMPLE_RATE)
+    segments = []
+    for first, last in runs:
+        begin = max(0, first * frame - pad)
+        end = min(len(samples), last * frame + pad)
+        if end - begin < min_length:
+            continue
+        for chunk_start in range(begin, end, max_length):
+            segments.append((chunk_start, min(end, chunk_start + max_length)))
+    return segments
+
+
+class SpeechRecognizer:
+    """CPU Whisper model loaded once per process and shared by every session
+
+    A semaphore caps concurrent transcriptions at the model's worker count,
+    so many speakers queue for a slot instead of oversubscribing the CPU.
+    """
+
+    def __init__(self, model_name=DEFAULT_MODEL, max_concurrency=DEFAULT_MAX_CONCURRENCY, cpu_threads=0,
+                 language="de", model=None):
+        if model is None:
+            if not speech_available():
+                raise SpeechUnavailableError("Install faster-whisper to enable voice input")
+            model = WhisperModel(
+                model_name, device="cpu", compute_type="int8",
+                cpu_threads=cpu_threads, num_workers=max_concurrency,
+            )
+        self.model = model
+        self.model_name = model_name
+        self.language = language
+        self.max_concurrency = max_concurrency
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self.transcriptions = 0
+        self.audio_seconds = 0.0
+        self.busy_seconds = 0.0
+
+    @classmethod
+    def from_env(cls, environ=os.environ):
+        """Recognizer configured from STT_* variables; STT_MODEL="" disables voice input"""
+        model_name = environ.get("STT_MODEL", DEFAULT_MODEL)
+        if not model_name:
+            raise SpeechUnavailableError("Voice input is disabled")
+        return cls(
+            model_name,
+            max_concurrency=int(environ.get("STT_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY)),
+            cpu_threads=int(environ.get("STT_THREADS", 0)),
+        )
+
+    def transcribe_chunks(self, wav_bytes):
+        """Yield the transcript of each speech segment as soon as it is ready"""
+        samples = decode_wav(wav_bytes)
+        segments = speech_segments(samples)
+        started = time.perf_counter()
+        with self._slots:
+            try:
+                for begin, end in segments:
+                    # A slice is a view into the decoded buffer, not a copy
+                    pieces, _ = self.model.transcribe(
+                        samples[begin:end], language=self.language, beam_size=1,
+                        condition_on_previous_text=False, vad_filter=False,
+                    )
+                    text = " ".join(piece.text.strip() for piece in pieces).strip()
+                    if text:
+                        yield text
+            finally:
+                with self._lock:
+                    self.transcriptions += 1
+                    self.audio_seconds += len(samples) / SAMPLE_RATE
+                    self.busy_seconds += time.perf_counter() - started
+
+    def recognize_words(self, samples, deadline=None):
+        """Return (words, complete) for decoded samples, with word timings and confidences
+
+        words are (text, start, end, probability) tuples with times in seconds
+        from the start of the recording. Recognition stops between segments
+        once time.monotonic() passes deadline, and complete is then False.
+        """
+        words = []
+        complete = True
+        started = time.perf_counter()
+        with self._slots:
+            try:
+                for begin, end in speech_segments(samples):
+                    if deadline is not None and time.monotonic() > deadline:
+                        complete = False
+                        break
+                    offset = begin / SAMPLE_RATE
+                    pieces, _ = self.model.transcribe(
+                        samples[begin:end], language=self.language, beam_size=1,
+                        condition_on_previous_text=False, vad_filter=False, word_timestamps=True,
+                    )
+                    for piece in pieces:
+                        for word in piece.words or ():
+                            words.append((word.word.strip(), offset + word.start, offset + word.end, word.probability))
+            finally:
+                with self._lock:
+                    self.transcriptions += 1
+                    self.audio_seconds += len(samples) / SAMPLE_RATE
+                    self.busy_seconds += time.perf_counter() - started
+        return words, complete
+
+    def transcribe(self, wav_bytes):
+        """Full transcript of a WAV recording, "" when no speech was detected"""
+        return " ".join(self.transcribe_chunks(wav_bytes))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "model": self.model_name,
+                "transcriptions": self.transcriptions,
+                "audio_seconds": round(self.audio_seconds, 1),
+                "real_time_factor": round(self.busy_seconds / self.audio_seconds, 3) if self.audio_seconds else None,
+            }
@@ -1,9 +1,46 @@
 import streamlit as st
-import google.generativeai as genai
+import streamlit.components.v1 as components
 from audio_recorder_streamlit import audio_recorder
 import os
-from datetime import datetime
-import json
+import uuid
+import time
+import hashlib
+from feedback import FeedbackService
+from fragments import (LANDING_CONTENT, assistant_bubble_html, landing_header_html, pronunciation_html,
+                       scenario_card_html, stylesheet, stylesheet_injector_html, user_bubble_html)
+from job_queue import DEFAULT_POLL_INTERVAL
+from metrics import REGISTRY, serve_metrics, write_metrics_periodically
+from progress_store import (AccountError, EmptyPasswordError, UsernameTakenError, is_account_id, normalize_username,
+                            open_progress_store, today)
+from pronunciation import PronunciationScorer
+from scenarios import CONTENT_DIR, CatalogLoader
+from session_model import SessionReaper
+from speech import SpeechRecognizer, SpeechUnavailableError
+from tts import SpeechCache, SpeechSynthesisError
+
+# Partial reruns need streamlit 1.33+; older versions rerun the whole script
+_fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None)
+fragment = _fragment or (lambda func: func)
+# Messages chat_turn redraws on its own before a full run takes them over
+FRAGMENT_MAX_MESSAGES = 8
+# How often the page reads back an answer a queue worker is grading
+FEEDBACK_POLL_SECONDS = float(os.environ.get("FEEDBACK_QUEUE_POLL_MS", DEFAULT_POLL_INTERVAL * 1000)) / 1000
+
+def polling_fragment(seconds):
+    """Like fragment, but the function also reruns on its own every seconds
+    
+    Without fragment support the whole script is rerun after seconds instead.
+    """
+    if _fragment is not None:
+        return _fragment(run_every=seconds)
+    
+    def decorator(func):
+        def rerun_after(*args):
+            func(*args)
+            time.sleep(seconds)
+            st.rerun()
+        return rerun_after
+    return decorator
 
 # Page config
 st.set_page_config(
@@ -13,254 +50,10 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Custom CSS for chat interface
-st.markdown("""
-<style>
-    @import url('https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600;700&family=Source+Serif+4:wght@600;700&display=swap');
-    
-    /* Hide Streamlit default elements */
-    #MainMenu {visibility: hidden;}
-    footer {visibility: hidden;}
-    header {visibility: hidden;}
-    
-    /* Base styling */
-    .stApp {
-        background-color: #faf9f7;
-        font-family: 'Inter', system-ui, sans-serif;
-        color: #1e293b !important;
-    }
-    
-    h1, h2, h3, h4 {
-        font-family: 'Source Serif 4', Georgia, serif;
-        color: #1e293b !important;
-    }
-    
-    /* German Stripe */
-    .german-stripe {
-        width: 100%;
-        height: 4px;
-        background: linear-gradient(90deg, #000000 0%, #000000 33%, #DD0000 33%, #DD0000 66%, #FFCE00 66%, #FFCE00 100%);
-        margin: 0;
-        padding: 0;
-    }
-    
-    /* Chat bubble styling */
-    .chat-bubble {
-        max-width: 85%;
-        border-radius: 16px;
-        padding: 12px 16px;
-        margin-bottom: 16px;
-        word-wrap: break-word;
-    }
-    
-    .chat-bubble-user {
-        background-color: #2563eb;
-        color: white !important;
-        margin-left: auto;
-        border-bottom-right-radius: 4px;
-        text-align: left;
-    }
-    
-    .chat-bubble-assistant {
-        background-color: #f1f5f9;
-        color: #1e293b !important;
-        margin-right: auto;
-        border-bottom-left-radius: 4px;
-    }
-    
-    .chat-translation {
-        font-size: 12px;
-        font-style: italic;
-        margin-top: 8px;
-        opacity: 0.7;
-        color: #64748b !important;
-    }
-    
-    /* Context banner */
-    .context-banner {
-        background-color: rgba(37, 99, 235, 0.05);
-        border-bottom: 1px solid rgba(37, 99, 235, 0.1);
-        padding: 12px 16px;
-    }
-    
-    /* Practice header */
-    .practice-header {
-        background: white;
-        border-bottom: 1px solid #e2e8f0;
-        padding: 12px 16px;
-        position: sticky;
-        top: 0;
-        z-index: 10;
-    }
-    
-    /* Input container */
-    .chat-input-container {
-        background: white;
-        border: 1px solid #e2e8f0;
-        border-radius: 9999px;
-        padding: 12px 16px;
-        display: flex;
-        align-items: center;
-        gap: 8px;
-        box-shadow: 0 1px 2px 0 rgba(0, 0, 0, 0.05);
-    }
-    
-    /* Text input */
-    .stTextInput > div > div > input {
-        background: transparent;
-        border: none;
-        outline: none;
-        font-size: 14px;
-        color: #1e293b !important;
-    }
-    
-    .stTextInput > div > div > input::placeholder {
-        color: #94a3b8;
-    }
-    
-    /* Ensure ALL text is visible - comprehensive rules */
-    body, .stApp {
-        color: #1e293b !important;
-    }
-    
-    /* All text elements */
-    p, span, div, h1, h2, h3, h4, h5, h6, a, li, ul, ol, strong, em, b, i {
-        color: #1e293b !important;
-    }
-    
-    /* Streamlit markdown - very specific */
-    .stMarkdown {
-        color: #1e293b !important;
-    }
-    
-    .stMarkdown p, .stMarkdown div, .stMarkdown h1, .stMarkdown h2, .stMarkdown h3, .stMarkdown h4, .stMarkdown span, .stMarkdown strong, .stMarkdown em {
-        color: #1e293b !important;
-    }
-    
-    /* Streamlit containers */
-    .element-container, .stText, .stMarkdown, .stContainer, .block-container {
-        color: #1e293b !important;
-    }
-    
-    .element-container p, .element-container div, .element-container span, .element-container h1, .element-container h2, .element-container h3 {
-        color: #1e293b !important;
-    }
-    
-    /* Sidebar - white text on dark background */
-    [data-testid="stSidebar"] {
-        background-color: #1e293b !important;
-        color: white !important;
-    }
-    
-    [data-testid="stSidebar"] p, [data-testid="stSidebar"] div, [data-testid="stSidebar"] h1, [data-testid="stSidebar"] h2, [data-testid="stSidebar"] h3, [data-testid="stSidebar"] h4, [data-testid="stSidebar"] span, [data-testid="stSidebar"] strong, [data-testid="stSidebar"] em {
-        color: white !important;
-    }
-    
-    /* Sidebar buttons */
-    [data-testid="stSidebar"] .stButton > button {
-        color: white !important;
-        background-color: rgba(255, 255, 255, 0.1) !important;
-        border: 1px solid rgba(255, 255, 255, 0.2) !important;
-    }
-    
-    [data-testid="stSidebar"] .stButton > button:hover {
-        background-color: rgba(255, 255, 255, 0.2) !important;
-        color: white !important;
-    }
-    
-    /* Sidebar radio buttons */
-    [data-testid="stSidebar"] .stRadio label, [data-testid="stSidebar"] .stRadio > label {
-        color: white !important;
-    }
-    
-    /* Sidebar markdown */
-    [data-testid="stSidebar"] .stMarkdown, [data-testid="stSidebar"] .stMarkdown *, [data-testid="stSidebar"] .stMarkdown p, [data-testid="stSidebar"] .stMarkdown div, [data-testid="stSidebar"] .stMarkdown h1, [data-testid="stSidebar"] .stMarkdown h2, [data-testid="stSidebar"] .stMarkdown h3, [data-testid="stSidebar"] .stMarkdown h4 {
-        color: white !important;
-    }
-    
-    /* Sidebar separators */
-    [data-testid="stSidebar"] hr {
-        border-color: rgba(255, 255, 255, 0.2) !important;
-    }
-    
-    /* Sidebar containers and text elements */
-    [data-testid="stSidebar"] .element-container, [data-testid="stSidebar"] .block-container {
-        color: white !important;
-    }
-    
-    [data-testid="stSidebar"] .element-container p, [data-testid="stSidebar"] .element-container div, [data-testid="stSidebar"] .element-container span, [data-testid="stSidebar"] .element-container h1, [data-testid="stSidebar"] .element-container h2, [data-testid="stSidebar"] .element-container h3 {
-        color: white !important;
-    }
-    
-    /* Button text - white text on all buttons */
-    .stButton > button {
-        color: white !important;
-    }
-    
-    .stButton > button:not([kind="primary"]) {
-        background-color: #1e293b !important;
-        border: 1px solid rgba(255, 255, 255, 0.2) !important;
-    }
-    
-    .stButton > button:not([kind="primary"]):hover {
-        background-color: #334155 !important;
-        color: white !important;
-    }
-    
-    .stButton > button[kind="primary"] {
-        color: white !important;
-    }
-    
-    .stButton > button[kind="primary"]:hover {
-        color: white !important;
-    }
-    
-    /* Button text content */
-    .stButton > button span, .stButton > button div, .stButton > button p {
-        color: white !important;
-    }
-    
-    /* Radio buttons */
-    .stRadio > label, .stRadio label {
-        color: #1e293b !important;
-    }
-    
-    /* Text input labels and all labels */
-    label, .stTextInput label, .stTextArea label, .stSelectbox label {
-        color: #1e293b !important;
-    }
-    
-    /* Info boxes */
-    .stInfo, .stInfo p, .stInfo div, .stSuccess, .stSuccess p, .stWarning, .stWarning p, .stError, .stError p {
-        color: #1e293b !important;
-    }
-    
-    /* Expander */
-    .streamlit-expanderHeader, .streamlit-expanderHeader p, .streamlit-expanderHeader div {
-        color: #1e293b !important;
-    }
-    
-    /* Metric */
-    .stMetric, .stMetric label, .stMetric div {
-        color: #1e293b !important;
-    }
-    
-    /* Column content */
-    [data-testid="column"] p, [data-testid="column"] div, [data-testid="column"] span, [data-testid="column"] h1, [data-testid="column"] h2, [data-testid="column"] h3 {
-        color: #1e293b !important;
-    }
-    
-    /* Exception: User chat bubbles should be white */
-    .chat-bubble-user, .chat-bubble-user p, .chat-bubble-user div, .chat-bubble-user span {
-        color: white !important;
-    }
-    
-    /* Exception: Primary buttons should be white */
-    .stButton > button[kind="primary"], .stButton > button[kind="primary"] span {
-        color: white !important;
-    }
-</style>
-""", unsafe_allow_html=True)
+# Custom CSS for chat interface, sent once per session and again only when style.css changes
+if st.session_state.get('stylesheet_version') != stylesheet()[0]:
+    components.html(stylesheet_injector_html(), height=0)
+    st.session_state.stylesheet_version = stylesheet()[0]
 
 # Initialize session state
 if 'current_screen' not in st.session_state:
@@ -271,242 +64,174 @@ if 'user_response' not in st.session_state:
     st.session_state.user_response = ""
 if 'feedback_data' not in st.session_state:
     st.session_state.feedback_data = None
-if 'progress' not in st.session_state:
-    st.session_state.progress = []
+if 'user_id' not in st.session_state:
+    # Anonymous ids are kept in the URL so a refresh or bookmark finds the same
+    # history; an account's id only ever comes from signing in
+    url_user = st.query_params.get("user")
+    st.session_state.user_id = url_user if url_user and not is_account_id(url_user) else uuid.uuid4().hex
+    st.query_params["user"] = st.session_state.user_id
 if 'current_turn' not in st.session_state:
     st.session_state.current_turn = 0
-if 'conversation_history' not in st.session_state:
-    st.session_state.conversation_history = []
 if 'language' not in st.session_state:
     st.session_state.language = 'de'  # 'de' for German, 'en' for English
-if 'chat_messages' not in st.session_state:
-    st.session_state.chat_messages = []
-
-# Configure Gemini
-genai.configure(api_key=os.environ.get("GEMINI_API_KEY"))
-
-# Translations
-TRANSLATIONS = {
-    'de': {
-        'app_title': '🇩🇪 Deutsch Üben',
-        'subtitle': 'Workplace Conversation Practice',
-        'start_practice': '🚀 Start Practice',
-        'choose_scenario': '📚 Choose a Practice Scenario',
-        'select_scenario': 'Select a conversation scenario to practice:',
-        'level': 'Level',
-        'formality': 'Formality',
-        'practice': 'Practice',
-        'back': 'Back',
-        'skip': 'Skip',
-        'your_response': 'Your Response',
-        'type_response': 'Type your response...',
-        'submit': 'Submit',
-        'back_to_scenarios': 'Back to Scenarios',
-        'continue_conversation': 'Continue Conversation',
-        'new_scenario': 'New Scenario',
-        'try_again': 'Try Again',
-        'view_progress': 'View Progress',
-        'feedback': 'Feedback',
-        'what_worked': 'What Worked Well',
-        'improve': 'Area to Improve',
-        'suggested': 'Suggested Response',
-        'your_progress': 'Your Practice Progress',
-        'no_sessions': 'No practice sessions yet. Start practicing to see your progress!',
-        'total_sessions': 'Total Sessions',
-        'average_score': 'Average Score',
-        'recent_sessions': 'Recent Practice Sessions',
-        'sessions_today': 'Sessions Today',
-        'home': 'Home',
-        'scenarios': 'Scenarios',
-        'progress': 'Progress',
-    },
-    'en': {
-        'app_title': '🇩🇪 Practice German',
-        'subtitle': 'Workplace Conversation Practice',
-        'start_practice': '🚀 Start Practice',
-        'choose_scenario': '📚 Choose a Practice Scenario',
-        'select_scenario': 'Select a conversation scenario to practice:',
-        'level': 'Level',
-        'formality': 'Formality',
-        'practice': 'Practice',
-        'back': 'Back',
-        'skip': 'Skip',
-        'your_response': 'Your Response',
-        'type_response': 'Type your response...',
-        'submit': 'Submit',
-        'back_to_scenarios': 'Back to Scenarios',
-        'continue_conversation': 'Continue Conversation',
-        'new_scenario': 'New Scenario',
-        'try_again': 'Try Again',
-        'view_progress': 'View Progress',
-        'feedback': 'Feedback',
-        'what_worked': 'What Worked Well',
-        'improve': 'Area to Improve',
-        'suggested': 'Suggested Response',
-        'your_progress': 'Your Practice Progress',
-        'no_sessions': 'No practice sessions yet. Start practicing to see your progress!',
-        'total_sessions': 'Total Sessions',
-        'average_score': 'Average Score',
-        'recent_sessions': 'Recent Practice Sessions',
-        'sessions_today': 'Sessions Today',
-        'home': 'Home',
-        'scenarios': 'Scenarios',
-        'progress': 'Progress',
-    }
-}
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+
+@st.cache_resource
+def get_catalog_loader():
+    """Scenario and translation content, reloaded when its files change"""
+    return CatalogLoader(
+        os.environ.get("CATALOG_DIR", CONTENT_DIR),
+        check_interval=float(os.environ.get("CATALOG_RELOAD_SECONDS", 2)),
+    )
+
+# Scenarios and translations for this run
+catalog = get_catalog_loader().get()
+SCENARIOS = catalog.scenarios
+TRANSLATIONS = catalog.translations
 
 def t(key: str) -> str:
     """Get translation for current language"""
     lang = st.session_state.language
     return TRANSLATIONS.get(lang, TRANSLATIONS['en']).get(key, key)
 
-# Scenarios data with English translations
-SCENARIOS = {
-    "small_talk": {
-        "title": "Small Talk mit Kollegen",
-        "title_en": "Small talk with colleagues",
-        "context": "Sie sind in der Kaffeepause. Ein Kollege spricht Sie an...",
-        "context_en": "You are on a coffee break. A colleague speaks to you...",
-        "difficulty": "Anfänger",
-        "difficulty_en": "Beginner",
-        "formality": "Du",
-        "icon": "☕",
-        "prompts": [
-            {"german": "Wie war dein Wochenende?", "english": "How was your weekend?"},
-            {"german": "Hast du etwas Schönes gemacht?", "english": "Did you do something nice?"}
-        ]
-    },
-    "explain_task": {
-        "title": "Aufgabe erklären",
-        "title_en": "Explaining a task",
-        "context": "Ihr Teamkollege fragt Sie nach den Details eines Projekts...",
-        "context_en": "Your colleague asks you about the details of a project...",
-        "difficulty": "Fortgeschritten",
-        "difficulty_en": "Advanced",
-        "formality": "Sie",
-        "icon": "📋",
-        "prompts": [
-            {"german": "Können Sie mir erklären, wie dieser Prozess funktioniert?", "english": "Can you explain to me how this process works?"},
-            {"german": "Welche Schritte sind am wichtigsten?", "english": "Which steps are most important?"}
-        ]
-    },
-    "answer_question": {
-        "title": "Frage beantworten",
-        "title_en": "Answering questions",
-        "context": "Ihr Manager fragt Sie nach dem Status Ihrer Arbeit...",
-        "context_en": "Your manager asks you about the status of your work...",
-        "difficulty": "Fortgeschritten",
-        "difficulty_en": "Advanced",
-        "formality": "Sie",
-        "icon": "💼",
-        "prompts": [
-            {"german": "Wie läuft das Projekt?", "english": "How is the project going?"},
-            {"german": "Gibt es irgendwelche Probleme?", "english": "Are there any problems?"}
-        ]
-    },
-    "ask_help": {
-        "title": "Um Hilfe bitten",
-        "title_en": "Asking for help",
-        "context": "Sie brauchen Unterstützung von einem Kollegen...",
-        "context_en": "You need support from a colleague...",
-        "difficulty": "Anfänger",
-        "difficulty_en": "Beginner",
-        "formality": "Du/Sie",
-        "icon": "🤝",
-        "prompts": [
-            {"german": "Kannst du mir kurz helfen?", "english": "Can you help me briefly?"},
-            {"german": "Womit brauchst du Hilfe?", "english": "What do you need help with?"}
-        ]
-    },
-    "introduce": {
-        "title": "Sich vorstellen",
-        "title_en": "Introducing yourself",
-        "context": "Es ist Ihr erster Tag im neuen Büro. Sie treffen Ihr Team...",
-        "context_en": "It's your first day in the new office. You meet your team...",
-        "difficulty": "Anfänger",
-        "difficulty_en": "Beginner",
-        "formality": "Sie",
-        "icon": "👋",
-        "prompts": [
-            {"german": "Hallo! Wie heißen Sie?", "english": "Hello! What's your name?"},
-            {"german": "Was ist Ihre Rolle hier?", "english": "What is your role here?"}
-        ]
-    }
-}
+@st.cache_resource
+def get_feedback_service():
+    """Feedback pipeline shared by every session in this process"""
+    service = FeedbackService.from_env(SCENARIOS)
+    REGISTRY.add_collector("feedback_cache", service.cache.stats)
+    REGISTRY.add_collector("gemini", service.client.stats)
+    REGISTRY.add_collector("fallbacks", service.fallbacks.snapshot)
+    REGISTRY.add_collector("repairs", service.repairs.snapshot)
+    REGISTRY.add_collector("coalescing", service.coalescing_stats)
+    if service.jobs is not None:
+        REGISTRY.add_collector("feedback_queue", service.jobs.stats)
+    return service
 
-def get_ai_feedback(scenario_key, prompt, user_response, conversation_history=[]):
-    """Generate AI feedback using Gemini API"""
-    
+@st.cache_resource
+def start_metrics_export():
+    """Export metrics on METRICS_PORT and/or to METRICS_FILE, once per process"""
+    port = os.environ.get("METRICS_PORT")
+    if port:
+        serve_metrics(REGISTRY, int(port))
+    path = os.environ.get("METRICS_FILE")
+    if path:
+        write_metrics_periodically(REGISTRY, path, float(os.environ.get("METRICS_FILE_INTERVAL", 15)))
+    return True
+
+@st.cache_resource
+def get_progress_store():
+    """Durable practice history shared by every session in this process"""
+    store = open_progress_store(
+        os.environ.get("PROGRESS_STORE", "progress.db"),
+        shards=int(os.environ.get("PROGRESS_SHARDS", 1)),
+        batch_size=int(os.environ.get("PROGRESS_BATCH_SIZE", 200)),
+        flush_interval=float(os.environ.get("PROGRESS_FLUSH_MS", 50)) / 1000,
+    )
+    REGISTRY.add_collector("progress", store.stats)
+    return store
+
+@st.cache_resource
+def get_speech_recognizer():
+    """Speech-to-text model shared by every session, or None without voice input"""
     try:
-        scenario = SCENARIOS[scenario_key]
-        
-        # Build conversation context
-        context_str = ""
-        if conversation_history:
-            context_str = "Previous conversation:\n"
-            for turn in conversation_history:
-                context_str += f"Prompt: {turn['prompt']}\nUser: {turn['response']}\n\n"
-        
-        system_prompt = f"""You are a German language tutor providing feedback on workplace conversation practice.
-
-Scenario: {scenario['title']}
-Context: {scenario['context']}
-Formality: {scenario['formality']}
-Difficulty: {scenario['difficulty']}
-
-{context_str}
-
-Current Prompt: "{prompt}"
-User Response: "{user_response}"
-
-Provide feedback in this exact JSON format:
-{{
-    "relevance_score": <1-5>,
-    "transcript": "{user_response}",
-    "what_worked": ["point 1", "point 2"],
-    "improvement": "one specific improvement area",
-    "suggested_response": "a better German response",
-    "score_explanation": "brief explanation of score"
-}}
-
-Evaluate:
-1. Relevance to the prompt (1-5)
-2. Appropriateness of formality ({scenario['formality']})
-3. Grammar and vocabulary
-4. Cultural appropriateness for German workplace
-
-Be encouraging but specific. Focus on practical improvements."""
-
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        response = model.generate_content(system_prompt)
-        
-        # Extract JSON from response
-        response_text = response.text.strip()
-        
-        # Remove markdown code blocks if present
-        if response_text.startswith('```json'):
-            response_text = response_text[7:]
-        if response_text.startswith('```'):
-            response_text = response_text[3:]
-        if response_text.endswith('```'):
-            response_text = response_text[:-3]
-        
-        response_text = response_text.strip()
-        
-        feedback = json.loads(response_text)
-        return feedback
-        
-    except Exception as e:
-        st.error(f"Error generating feedback: {str(e)}")
-        # Fallback feedback
-        return {
-            "relevance_score": 3,
-            "transcript": user_response,
-            "what_worked": ["Sie haben geantwortet", "Die Antwort ist verständlich"],
-            "improvement": "Versuchen Sie, mehr Details hinzuzufügen",
-            "suggested_response": "Eine natürlichere Antwort wäre hilfreich",
-            "score_explanation": "Gute Grundlage, aber es gibt Raum für Verbesserungen"
-        }
+        recognizer = SpeechRecognizer.from_env()
+    except SpeechUnavailableError:
+        return None
+    REGISTRY.add_collector("speech", recognizer.stats)
+    return recognizer
+
+@st.cache_resource
+def get_pronunciation_scorer():
+    """Pronunciation scoring on the shared speech model, or None without voice input"""
+    recognizer = get_speech_recognizer()
+    return PronunciationScorer.from_env(recognizer) if recognizer is not None else None
+
+@st.cache_resource
+def get_speech_cache():
+    """Server-side German TTS with its disk cache, or None without a TTS engine"""
+    cache = SpeechCache.from_env()
+    if cache is not None:
+        REGISTRY.add_collector("tts", cache.stats)
+    return cache
+
+def speech_audio_path(text):
+    """Cached audio file for text, or None when server-side TTS is unavailable"""
+    cache = get_speech_cache()
+    if cache is None or not text:
+        return None
+    try:
+        return cache.audio_path(text)
+    except SpeechSynthesisError:
+        return None
+
+@st.cache_resource
+def get_session_reaper():
+    """Spill directory and idle reaping for the transcripts of every session"""
+    reaper = SessionReaper.from_env()
+    REGISTRY.add_collector("sessions", reaper.stats)
+    return reaper
+
+def start_transcript(scenario_key):
+    """Start a new conversation in scenario_key, discarding this session's previous one"""
+    st.session_state.pop('show_spilled', None)
+    st.session_state.transcript = get_session_reaper().new_transcript(
+        st.session_state.session_id, scenario_key, SCENARIOS[scenario_key]['prompts'])
+    return st.session_state.transcript
+
+def transcript():
+    """This session's transcript of the selected scenario"""
+    current = st.session_state.get('transcript')
+    if current is None or current.scenario_key != st.session_state.selected_scenario:
+        current = start_transcript(st.session_state.selected_scenario)
+    return current
+
+def save_progress(scenario_key, scenario_title, score, response):
+    """Record a graded response once, however often the screen reruns"""
+    if st.session_state.get('last_saved_response') == response:
+        return
+    get_progress_store().add(st.session_state.user_id, scenario_key, scenario_title, score, response)
+    st.session_state.last_saved_response = response
+
+def conversation_context():
+    """This session's incrementally built, token-bounded conversation context"""
+    if 'conversation_context' not in st.session_state:
+        st.session_state.conversation_context = get_feedback_service().new_context()
+    return st.session_state.conversation_context
+
+def speculate_feedback(scenario_key, prompt, user_response, conversation_history):
+    """Start evaluating a typed but unsubmitted answer in the background
+    
+    Runs at most once per debounce interval per session. The result lands in
+    the shared feedback cache, where Submit picks it up if the text matches.
+    """
+    now = time.monotonic()
+    last = st.session_state.get('speculated_at', 0.0)
+    if now - last < float(os.environ.get("PREFETCH_DEBOUNCE_SECONDS", 1.0)):
+        return
+    service = get_feedback_service()
+    if service.speculate(scenario_key, prompt, user_response, conversation_history, conversation_context()):
+        st.session_state.speculated_at = now
+
+def prefetch_turn(scenario_key, turn):
+    """Warm the static prompt parts for an upcoming turn"""
+    get_feedback_service().prefetch(scenario_key, turn)
+
+def show_feedback_error(e):
+    """Tell the learner why their feedback comes from the local scorer"""
+    st.error(f"Error generating feedback: {str(e)}")
+
+def get_ai_feedback(scenario_key, prompt, user_response, conversation_history=[], on_partial=None):
+    """Generate AI feedback using Gemini API
+    
+    When on_partial is given the response is streamed and on_partial is called
+    with every newly completed set of fields, score first. It is called once
+    up front with the local provisional score, flagged as provisional.
+    """
+    return get_feedback_service().get_feedback(
+        scenario_key, prompt, user_response, conversation_history,
+        on_partial=on_partial, on_error=show_feedback_error, context=conversation_context(),
+    )
 
 def landing_page():
     """Landing page with app introduction"""
@@ -515,44 +240,14 @@ def landing_page():
     title_text = t('app_title')
     subtitle_text = t('subtitle')
     
-    st.markdown(f"""
-        <h1 style='text-align: center; color: #1f77b4 !important;'>{title_text}</h1>
-        <h3 style='text-align: center; color: #666 !important;'>{subtitle_text}</h3>
-    """, unsafe_allow_html=True)
+    st.markdown(landing_header_html(title_text, subtitle_text), unsafe_allow_html=True)
     
     st.markdown("---")
     
     col1, col2, col3 = st.columns([1, 2, 1])
     
     with col2:
-        if lang == 'en':
-            content = """
-            <div style='color: #1e293b !important;'>
-            <h3 style='color: #1e293b !important;'>Practice German workplace conversations with confidence</h3>
-            
-            <p style='color: #1e293b !important;'>✅ <strong>Low-pressure environment</strong> - Practice without judgment</p>
-            <p style='color: #1e293b !important;'>✅ <strong>Instant AI feedback</strong> - Get specific improvement tips</p>
-            <p style='color: #1e293b !important;'>✅ <strong>Real scenarios</strong> - Work-relevant conversations</p>
-            <p style='color: #1e293b !important;'>✅ <strong>Your pace</strong> - Practice anytime, anywhere</p>
-            
-            <p style='color: #1e293b !important;'>Perfect for professionals who can read German but want to improve speaking confidence.</p>
-            </div>
-            """
-        else:
-            content = """
-            <div style='color: #1e293b !important;'>
-            <h3 style='color: #1e293b !important;'>Üben Sie deutsche Gespräche am Arbeitsplatz mit Selbstvertrauen</h3>
-            
-            <p style='color: #1e293b !important;'>✅ <strong>Entspannte Umgebung</strong> - Üben Sie ohne Beurteilung</p>
-            <p style='color: #1e293b !important;'>✅ <strong>Sofortiges KI-Feedback</strong> - Erhalten Sie spezifische Verbesserungstipps</p>
-            <p style='color: #1e293b !important;'>✅ <strong>Echte Szenarien</strong> - Arbeitsrelevante Gespräche</p>
-            <p style='color: #1e293b !important;'>✅ <strong>Ihr Tempo</strong> - Üben Sie jederzeit, überall</p>
-            
-            <p style='color: #1e293b !important;'>Perfekt für Fachkräfte, die Deutsch lesen können, aber ihr Sprechvertrauen verbessern möchten.</p>
-            </div>
-            """
-        
-        st.markdown(content, unsafe_allow_html=True)
+        st.markdown(LANDING_CONTENT.get(lang, LANDING_CONTENT['de']), unsafe_allow_html=True)
         
         st.markdown("<br>", unsafe_allow_html=True)
         
@@ -566,37 +261,101 @@ def scenario_selection():
     
     st.markdown(f"<h2 style='color: #1e293b !important;'>{t('choose_scenario')}</h2>", unsafe_allow_html=True)
     st.markdown(f"<p style='color: #1e293b !important;'>{t('select_scenario')}</p>", unsafe_allow_html=True)
+    if st.session_state.pop('scenario_removed', False):
+        st.warning(t('scenario_removed'))
+    
+    # Search and facet filters; any change goes back to the first page
+    index = catalog.index
+    
+    def reset_page():
+        st.session_state.scenario_page = 0
+    
+    search_col, difficulty_col, formality_col = st.columns([4, 2, 2])
+    with search_col:
+        query = st.text_input(t('search_scenarios'), placeholder=t('search_scenarios'), key="scenario_query",
+                              label_visibility="collapsed", on_change=reset_page)
+    with difficulty_col:
+        difficulty_labels = {
+            scenario['difficulty']: scenario.get('difficulty_en' if lang == 'en' else 'difficulty', scenario['difficulty'])
+            for scenario in SCENARIOS.values()
+        }
+        difficulty = st.selectbox(t('level'), [None] + index.facet_values('difficulty'), key="scenario_difficulty",
+                                  format_func=lambda value: t('all') if value is None else difficulty_labels[value],
+                                  label_visibility="collapsed", on_change=reset_page)
+    with formality_col:
+        formality = st.selectbox(t('formality'), [None] + index.facet_values('formality'), key="scenario_formality",
+                                 format_func=lambda value: t('all') if value is None else value,
+                                 label_visibility="collapsed", on_change=reset_page)
+    
+    results = index.search(
+        query, difficulty=difficulty, formality=formality,
+        page=st.session_state.get('scenario_page', 0),
+        page_size=int(os.environ.get("SCENARIO_PAGE_SIZE", 9)),
+    )
+    if not results.total:
+        st.info(t('no_results'))
     
     cols = st.columns(3)
     
-    for idx, (key, scenario) in enumerate(SCENARIOS.items()):
+    for idx, key in enumerate(results.keys):
+        scenario = SCENARIOS[key]
         with cols[idx % 3]:
             with st.container():
                 scenario_title = scenario.get('title_en' if lang == 'en' else 'title', scenario['title'])
                 scenario_difficulty = scenario.get('difficulty_en' if lang == 'en' else 'difficulty', scenario['difficulty'])
                 scenario_context = scenario.get('context_en' if lang == 'en' else 'context', scenario['context'])
                 
-                st.markdown(f"<h3 style='color: #1e293b !important;'>{scenario['icon']} {scenario_title}</h3>", unsafe_allow_html=True)
-                st.markdown(f"<p style='color: #1e293b !important;'><strong>{t('level')}:</strong> {scenario_difficulty}</p>", unsafe_allow_html=True)
-                st.markdown(f"<p style='color: #1e293b !important;'><strong>{t('formality')}:</strong> {scenario['formality']}</p>", unsafe_allow_html=True)
-                st.markdown(f"<p style='color: #64748b !important; font-style: italic;'>{scenario_context[:60]}...</p>", unsafe_allow_html=True)
+                st.markdown(scenario_card_html(
+                    scenario['icon'], scenario_title, t('level'), scenario_difficulty,
+                    t('formality'), scenario['formality'], scenario_context,
+                ), unsafe_allow_html=True)
                 
                 if st.button(t('practice'), key=f"btn_{key}", use_container_width=True):
                     st.session_state.selected_scenario = key
                     st.session_state.current_screen = 'practice'
                     st.session_state.current_turn = 0
-                    st.session_state.conversation_history = []
-                    st.session_state.chat_messages = []
+                    start_transcript(key)
                     st.rerun()
     
+    if results.pages > 1:
+        col1, col2, col3 = st.columns([1, 2, 1])
+        with col1:
+            if results.page > 0 and st.button("⬅️ " + t('previous_page'), key="scenarios_prev", use_container_width=True):
+                st.session_state.scenario_page = results.page - 1
+                st.rerun()
+        with col2:
+            st.markdown(f"<p style='text-align: center; color: #1e293b !important;'>{t('page')} {results.page + 1} / {results.pages}</p>", unsafe_allow_html=True)
+        with col3:
+            if results.page < results.pages - 1 and st.button(t('next_page') + " ➡️", key="scenarios_next", use_container_width=True):
+                st.session_state.scenario_page = results.page + 1
+                st.rerun()
+    
     st.markdown("---")
     
     # Show progress
-    if st.session_state.progress:
+    recent, _ = get_progress_store().page(st.session_state.user_id, 5)
+    if recent:
         st.markdown(f"<h3 style='color: #1e293b !important;'>📊 {t('your_progress')}</h3>", unsafe_allow_html=True)
-        for entry in st.session_state.progress[-5:]:
+        for entry in recent:
             st.markdown(f"<p style='color: #1e293b !important;'>✓ {entry['scenario']} - Score: {entry['score']}/5 - {entry['date']}</p>", unsafe_allow_html=True)
 
+def render_feedback_preview(fields):
+    """Render whatever feedback fields have arrived so far"""
+    if fields.get('source') == 'fallback':
+        st.warning(t('fallback_notice'))
+    if 'relevance_score' in fields:
+        score = fields['relevance_score']
+        score_color = "#4caf50" if score >= 4 else "#ff9800" if score >= 3 else "#f44336"
+        label = f"{t('provisional_score')}: " if fields.get('provisional') else ""
+        st.markdown(f"<div style='padding: 12px 16px; background-color: {score_color}; color: white; border-radius: 12px; font-size: 20px; font-weight: 600;'>{label}{score}/5</div>", unsafe_allow_html=True)
+    if 'what_worked' in fields:
+        for point in fields['what_worked']:
+            st.success(f"• {point}")
+    if 'improvement' in fields:
+        st.warning(f"• {fields['improvement']}")
+    if 'suggested_response' in fields:
+        st.markdown(f"<div style='background-color: #f0f7ff; padding: 15px; border-radius: 10px; border-left: 4px solid #1f77b4; color: #1e293b !important;'>\"{fields['suggested_response']}\"</div>", unsafe_allow_html=True)
+
 def practice_screen():
     """Main practice screen with chat-like UI"""
     scenario_key = st.session_state.selected_scenario
@@ -609,14 +368,9 @@ def practice_screen():
     scenario_context = scenario.get('context_en' if lang == 'en' else 'context', scenario['context'])
     
     # Initialize chat messages if starting new conversation
-    if turn == 0 and len(st.session_state.chat_messages) == 0:
-        prompts = scenario['prompts']
-        current_prompt = prompts[0]
-        st.session_state.chat_messages = [{
-            'type': 'assistant',
-            'german': current_prompt['german'],
-            'english': current_prompt.get('english', '')
-        }]
+    messages = transcript()
+    if turn == 0 and messages.message_count == 0:
+        messages.add_prompt(0)
     
     # German Stripe
     st.markdown('<div class="german-stripe"></div>', unsafe_allow_html=True)
@@ -632,22 +386,11 @@ def practice_screen():
     with col1:
         if st.button("← " + t('back'), key="back_btn", use_container_width=True):
             st.session_state.current_screen = 'scenarios'
-            st.session_state.chat_messages = []
+            st.session_state.pop('feedback_job', None)
+            messages.clear_messages()
             st.rerun()
     with col2:
         st.markdown(f"<h2 style='text-align: center; margin: 0; font-family: \"Source Serif 4\", serif; font-size: 18px; font-weight: 600; color: #1e293b !important;'>{scenario_title}</h2>", unsafe_allow_html=True)
-    with col3:
-        prompts = scenario['prompts']
-        if turn < len(prompts) - 1:
-            if st.button("▷| " + t('skip'), key="skip_btn", use_container_width=True):
-                st.session_state.current_turn += 1
-                current_prompt = prompts[st.session_state.current_turn]
-                st.session_state.chat_messages.append({
-                    'type': 'assistant',
-                    'german': current_prompt['german'],
-                    'english': current_prompt.get('english', '')
-                })
-                st.rerun()
     
     st.markdown("</div></div></div>", unsafe_allow_html=True)
     
@@ -669,37 +412,151 @@ def practice_screen():
         <div style="max-width: 672px; margin: 0 auto; padding: 0 16px;">
     """, unsafe_allow_html=True)
     
-    # Display chat messages
-    for msg in st.session_state.chat_messages:
-        if msg['type'] == 'assistant':
-            # Assistant bubble (left, muted background)
-            german = msg.get('german', '')
-            english = msg.get('english', '')
-            display_text = english if lang == 'en' and english else german
-            translation_text = german if lang == 'en' and english else english
-            
-            st.markdown(f"""
-            <div style="display: flex; justify-content: flex-start; margin-bottom: 16px;">
-                <div class="chat-bubble chat-bubble-assistant" style="max-width: 85%;">
-                    <div style="display: flex; align-items: flex-start; gap: 8px;">
-                        <div style="flex: 1;">
-                            <p style="margin: 0; font-size: 14px; line-height: 1.6; color: #1e293b !important;">{display_text}</p>
-                            {f'<p class="chat-translation" style="margin: 8px 0 0 0; color: #64748b !important;">{translation_text}</p>' if translation_text else ''}
-                        </div>
-                        <button onclick="speakGerman('{german.replace("'", "\\'")}')" style="background: none; border: none; cursor: pointer; padding: 4px; flex-shrink: 0; opacity: 0.7;">🔊</button>
-                    </div>
-                </div>
-            </div>
-            """, unsafe_allow_html=True)
-        elif msg['type'] == 'user':
-            # User bubble (right, blue background)
-            st.markdown(f"""
-            <div style="display: flex; justify-content: flex-end; margin-bottom: 16px;">
-                <div class="chat-bubble chat-bubble-user" style="max-width: 85%;">
-                    <p style="margin: 0; font-size: 14px; line-height: 1.6; color: white !important;">{msg['content']}</p>
-                </div>
-            </div>
-            """, unsafe_allow_html=True)
+    # Messages spilled to disk are only read back when asked for
+    if messages.spilled_count:
+        if st.session_state.get('show_spilled'):
+            for msg in messages.spilled():
+                render_message(messages, msg, lang)
+        elif st.button(t('earlier_messages'), key="earlier_messages_btn"):
+            st.session_state.show_spilled = True
+            st.rerun()
+    
+    # Messages so far are rendered once per full run; chat_turn only adds new ones
+    st.session_state.transcript_rendered = messages.message_count
+    for msg in messages.messages:
+        render_message(messages, msg, lang)
+    
+    # Browser text-to-speech, used when server-side audio is unavailable or not ready yet
+    st.markdown("""
+    <script>
+    function speakGerman(text) {
+        if ('speechSynthesis' in window) {
+            const utterance = new SpeechSynthesisUtterance(text);
+            utterance.lang = 'de-DE';
+            utterance.rate = 0.9;
+            window.speechSynthesis.speak(utterance);
+        }
+    }
+    </script>
+    """, unsafe_allow_html=True)
+    
+    if 'feedback_job' in st.session_state:
+        feedback_progress()
+    chat_turn(scenario_key)
+
+def render_message(messages, msg, lang):
+    """Render one chat bubble of transcript messages"""
+    if msg.is_prompt:
+        prompt = messages.prompt(msg.index)
+        audio_path = speech_audio_path(prompt['german'])
+        st.markdown(assistant_bubble_html(prompt['german'], prompt.get('english', ''), lang, speak=audio_path is None),
+                    unsafe_allow_html=True)
+        if audio_path:
+            st.audio(audio_path, format="audio/wav")
+    else:
+        st.markdown(user_bubble_html(msg.content), unsafe_allow_html=True)
+
+def queue_response():
+    """Send button callback: take the typed answer and clear the input"""
+    response_text = st.session_state.chat_input
+    if response_text:
+        st.session_state.pending_response = response_text
+        transcript().add_response(response_text)
+        st.session_state.chat_input = ""
+
+def new_recording(name, audio_bytes):
+    """Whether a recorder returned a recording this session has not handled yet
+    
+    Recorders return their last recording on every rerun, so each one is
+    remembered by its hash.
+    """
+    digest = hashlib.sha1(audio_bytes).hexdigest()
+    if st.session_state.get(f'last_{name}') == digest:
+        return False
+    st.session_state[f'last_{name}'] = digest
+    return True
+
+def transcribe_recording(recognizer, audio_bytes):
+    """Transcript of a new recording, shown chunk by chunk as it is recognized
+    
+    Returns None for a recording that was already transcribed.
+    """
+    if not new_recording('voice_input', audio_bytes):
+        return None
+    
+    placeholder = st.empty()
+    parts = []
+    try:
+        for text in recognizer.transcribe_chunks(audio_bytes):
+            parts.append(text)
+            placeholder.caption("🎤 " + " ".join(parts))
+    except ValueError as e:
+        placeholder.error(f"Error transcribing recording: {str(e)}")
+        return None
+    if not parts:
+        placeholder.warning(t('no_speech'))
+        return None
+    placeholder.empty()
+    return " ".join(parts)
+
+def skip_turn(scenario_key):
+    """Skip button callback: move on to the next prompt"""
+    if scenario_key not in SCENARIOS:
+        return
+    prompts = SCENARIOS[scenario_key]['prompts']
+    if st.session_state.current_turn < len(prompts) - 1:
+        st.session_state.current_turn += 1
+        transcript().add_prompt(st.session_state.current_turn)
+
+def advance_turn(scenario_key):
+    """Move on to the next prompt, or to the feedback screen after the last one
+    
+    Returns True if a prompt was added.
+    """
+    prompts = SCENARIOS[scenario_key]['prompts']
+    if st.session_state.current_turn < len(prompts) - 1:
+        st.session_state.current_turn += 1
+        transcript().add_prompt(st.session_state.current_turn)
+        return True
+    st.session_state.current_screen = 'feedback'
+    return False
+
+@fragment
+def chat_turn(scenario_key):
+    """New messages, feedback and the input row
+    
+    Runs as a fragment, so Submit and Skip rerun only this part of the page.
+    It redraws the messages added since the last full run, and once there
+    are more than FRAGMENT_MAX_MESSAGES of them it hands them to a full run,
+    so a turn never redraws more than a few messages.
+    """
+    # Fragment reruns are activity too, or the reaper would hibernate a busy session
+    get_session_reaper().touch(st.session_state.session_id)
+    scenario = SCENARIOS[scenario_key]
+    prompts = scenario['prompts']
+    lang = st.session_state.language
+    messages = transcript()
+    
+    # Messages added since the last full run
+    new_messages = messages.messages_since(st.session_state.get('transcript_rendered', 0))
+    if len(new_messages) > FRAGMENT_MAX_MESSAGES:
+        st.rerun()
+    for msg in new_messages:
+        render_message(messages, msg, lang)
+    
+    # Handle message submission; an answer sent while a worker grades the last one waits its turn
+    grading = 'feedback_job' in st.session_state
+    response_text = None if grading else st.session_state.pop('pending_response', None)
+    if response_text:
+        turn = st.session_state.current_turn
+        if not submit_response(scenario_key, min(turn, len(prompts)-1), response_text):
+            # Queued for a worker; the full run starts feedback_progress on it
+            st.rerun()
+        if advance_turn(scenario_key):
+            render_message(messages, messages.messages[-1], lang)
+        else:
+            # Show feedback screen
+            st.rerun()
     
     st.markdown("</div></div>", unsafe_allow_html=True)
     
@@ -710,18 +567,23 @@ def practice_screen():
             <div class="chat-input-container">
     """, unsafe_allow_html=True)
     
-    # Chat input with mic and send
-    input_col1, input_col2, input_col3 = st.columns([0.3, 7.4, 1.3])
+    # Chat input with mic, send and skip
+    input_col1, input_col2, input_col3, input_col4 = st.columns([0.3, 6.6, 1.1, 1.1])
     
+    recognizer = get_speech_recognizer()
     with input_col1:
-        st.markdown("""
-        <div style="display: flex; align-items: center; justify-content: center; flex-shrink: 0;">
-            <span style="font-size: 20px; cursor: pointer;">🎤</span>
-        </div>
-        """, unsafe_allow_html=True)
+        if recognizer is not None:
+            audio_bytes = audio_recorder(text="", icon_size="1x", sample_rate=16000, key="voice_input")
+        else:
+            audio_bytes = None
+            st.markdown("""
+            <div style="display: flex; align-items: center; justify-content: center; flex-shrink: 0;">
+                <span style="font-size: 20px; cursor: pointer;">🎤</span>
+            </div>
+            """, unsafe_allow_html=True)
     
     with input_col2:
-        response_text = st.text_input(
+        typed_text = st.text_input(
             t('type_response'),
             placeholder=t('type_response'),
             key="chat_input",
@@ -729,76 +591,135 @@ def practice_screen():
         )
     
     with input_col3:
-        send_button = st.button("➤", key="send_btn", use_container_width=True, type="primary")
+        st.button("➤", key="send_btn", use_container_width=True, type="primary", on_click=queue_response,
+                  disabled=grading)
+    
+    with input_col4:
+        turn = st.session_state.current_turn
+        if turn < len(prompts) - 1:
+            st.button("▷|", key="skip_btn", help=t('skip'), use_container_width=True,
+                      on_click=skip_turn, args=(scenario_key,), disabled=grading)
     
     st.markdown("</div></div></div>", unsafe_allow_html=True)
     
-    # JavaScript for text-to-speech
-    st.markdown("""
-    <script>
-    function speakGerman(text) {
-        if ('speechSynthesis' in window) {
-            const utterance = new SpeechSynthesisUtterance(text);
-            utterance.lang = 'de-DE';
-            utterance.rate = 0.9;
-            window.speechSynthesis.speak(utterance);
-        }
-    }
-    </script>
-    """, unsafe_allow_html=True)
+    # A spoken answer is submitted like a typed one
+    if audio_bytes:
+        spoken_text = transcribe_recording(recognizer, audio_bytes)
+        if spoken_text:
+            st.session_state.pending_response = spoken_text
+            messages.add_response(spoken_text)
+            st.rerun()
     
-    # Handle message submission
-    if send_button and response_text:
-        prompts = scenario['prompts']
-        current_prompt_obj = prompts[min(turn, len(prompts)-1)]
-        current_prompt = current_prompt_obj['german'] if isinstance(current_prompt_obj, dict) else current_prompt_obj
-        
-        # Add user message
-        st.session_state.chat_messages.append({
-            'type': 'user',
-            'content': response_text
-        })
-        
-        # Generate feedback
-        with st.spinner("Analyzing your response..." if lang == 'en' else "Analysiere Ihre Antwort..."):
-            feedback = get_ai_feedback(
-                scenario_key,
-                current_prompt,
-                response_text,
-                st.session_state.conversation_history
-            )
-            st.session_state.feedback_data = feedback
-            st.session_state.user_response = response_text
-        
-        # Add to conversation history
-        st.session_state.conversation_history.append({
-            'prompt': current_prompt,
-            'response': response_text
-        })
-        
-        # Save progress
-        if len(st.session_state.progress) == 0 or st.session_state.progress[-1]['response'] != response_text:
-            st.session_state.progress.append({
-                'scenario': scenario_title,
-                'score': feedback['relevance_score'],
-                'date': datetime.now().strftime("%Y-%m-%d %H:%M"),
-                'response': response_text
-            })
-        
-        # Check if there are more prompts
-        if turn < len(prompts) - 1:
-            st.session_state.current_turn += 1
-            next_prompt = prompts[st.session_state.current_turn]
-            st.session_state.chat_messages.append({
-                'type': 'assistant',
-                'german': next_prompt['german'],
-                'english': next_prompt.get('english', '')
-            })
-        else:
-            # Show feedback screen
-            st.session_state.current_screen = 'feedback'
+    # Prepare the next turn and evaluate a typed answer before it is submitted
+    prefetch_turn(scenario_key, turn + 1)
+    if typed_text:
+        speculate_feedback(
+            scenario_key,
+            prompts[min(turn, len(prompts)-1)]['german'],
+            typed_text,
+            messages.history
+        )
+
+def submit_response(scenario_key, prompt_index, response_text):
+    """Grade a submitted answer to a prompt, painting each feedback field as soon as it streams in
+    
+    While queue workers are running the answer is only handed to one and
+    False is returned; feedback_progress then shows the feedback as it
+    arrives and finishes the turn.
+    """
+    messages = transcript()
+    current_prompt = messages.prompt(prompt_index)['german']
+    lang = st.session_state.language
+    
+    started = time.perf_counter()
+    timings = {'first_paint_ms': None}
+    preview = st.empty()
+    
+    def on_partial(fields):
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if fields.get('provisional'):
+            timings['provisional_ms'] = elapsed_ms
+        elif timings['first_paint_ms'] is None:
+            timings['first_paint_ms'] = elapsed_ms
+        with REGISTRY.span("render_preview"), preview.container():
+            render_feedback_preview(fields)
+    
+    with REGISTRY.trace("submit", scenario=scenario_key):
+        job = get_feedback_service().queue_feedback(scenario_key, current_prompt, response_text, messages.history)
+        if job is not None:
+            st.session_state.feedback_job = {
+                'job': job,
+                'scenario_key': scenario_key,
+                'prompt_index': prompt_index,
+                'started': started,
+                'timings': timings,
+            }
+            return False
         
-        st.rerun()
+        preview.caption("Analyzing your response..." if lang == 'en' else "Analysiere Ihre Antwort...")
+        feedback = get_ai_feedback(
+            scenario_key,
+            current_prompt,
+            response_text,
+            messages.history,
+            on_partial=on_partial
+        )
+    timings['total_ms'] = (time.perf_counter() - started) * 1000
+    finish_response(scenario_key, prompt_index, response_text, feedback, timings)
+    return True
+
+@polling_fragment(FEEDBACK_POLL_SECONDS)
+def feedback_progress():
+    """Feedback on the answer a queue worker is grading, as far as it has arrived
+    
+    Runs as a fragment that reads the job every FEEDBACK_QUEUE_POLL_MS, so the
+    page is never held up waiting for the worker. Once the feedback is in it
+    finishes the turn and reruns the page.
+    """
+    pending = st.session_state.get('feedback_job')
+    if pending is None:
+        return
+    job = pending['job']
+    timings = pending['timings']
+    elapsed_ms = (time.perf_counter() - pending['started']) * 1000
+    feedback = get_feedback_service().job_feedback(job, on_error=show_feedback_error)
+    if feedback is None:
+        if job.partial.get('provisional'):
+            timings.setdefault('provisional_ms', elapsed_ms)
+        elif timings['first_paint_ms'] is None:
+            timings['first_paint_ms'] = elapsed_ms
+        with REGISTRY.span("render_preview"):
+            render_feedback_preview(job.partial)
+        return
+    
+    timings['total_ms'] = elapsed_ms
+    del st.session_state.feedback_job
+    finish_response(pending['scenario_key'], pending['prompt_index'], job.user_response, feedback, timings)
+    advance_turn(pending['scenario_key'])
+    st.rerun()
+
+def finish_response(scenario_key, prompt_index, response_text, feedback, timings):
+    """Keep the feedback on a submitted answer and record the turn in the transcript and progress"""
+    scenario = SCENARIOS[scenario_key]
+    messages = transcript()
+    lang = st.session_state.language
+    scenario_title = scenario.get('title_en' if lang == 'en' else 'title', scenario['title'])
+    
+    st.session_state.feedback_timings = timings
+    st.session_state.feedback_data = feedback
+    st.session_state.user_response = response_text
+    
+    # Synthesize the suggested response while the learner reads the feedback
+    speech_cache = get_speech_cache()
+    if speech_cache is not None:
+        speech_cache.warm([feedback.get('suggested_response')])
+    
+    # Add to conversation history
+    messages.add_turn(prompt_index, response_text)
+    
+    # Save progress
+    with REGISTRY.span("save_progress"):
+        save_progress(scenario_key, scenario_title, feedback['relevance_score'], response_text)
 
 def feedback_screen():
     """Feedback display screen"""
@@ -811,6 +732,9 @@ def feedback_screen():
     
     st.markdown(f"<h2 style='color: #1e293b !important;'>📊 {t('feedback')}: {scenario_title}</h2>", unsafe_allow_html=True)
     
+    if feedback.get('source') == 'fallback':
+        st.warning(t('fallback_notice'))
+    
     # Score display
     score = feedback['relevance_score']
     score_color = "#4caf50" if score >= 4 else "#ff9800" if score >= 3 else "#f44336"
@@ -844,17 +768,16 @@ def feedback_screen():
     
     st.markdown(f"<h3 style='color: #1e293b !important;'>💡 {t('suggested')}</h3>", unsafe_allow_html=True)
     st.markdown(f"<div style='background-color: #f0f7ff; padding: 15px; border-radius: 10px; border-left: 4px solid #1f77b4; color: #1e293b !important;'>\"{feedback['suggested_response']}\"</div>", unsafe_allow_html=True)
+    audio_path = speech_audio_path(feedback['suggested_response'])
+    if audio_path:
+        st.audio(audio_path, format="audio/wav")
+    
+    pronunciation_section(feedback['suggested_response'])
     
     st.markdown("---")
     
     # Save progress
-    if len(st.session_state.progress) == 0 or st.session_state.progress[-1]['response'] != st.session_state.user_response:
-        st.session_state.progress.append({
-            'scenario': scenario_title,
-            'score': score,
-            'date': datetime.now().strftime("%Y-%m-%d %H:%M"),
-            'response': st.session_state.user_response
-        })
+    save_progress(scenario_key, scenario_title, score, st.session_state.user_response)
     
     # Action buttons
     col1, col2, col3 = st.columns(3)
@@ -862,7 +785,7 @@ def feedback_screen():
     with col1:
         if st.button("🔄 " + t('try_again'), use_container_width=True):
             st.session_state.current_screen = 'practice'
-            st.session_state.chat_messages = []
+            transcript().clear_messages()
             st.session_state.current_turn = 0
             st.rerun()
     
@@ -877,7 +800,7 @@ def feedback_screen():
         else:
             if st.button("🎯 " + t('new_scenario'), type="primary", use_container_width=True):
                 st.session_state.current_screen = 'scenarios'
-                st.session_state.chat_messages = []
+                transcript().clear_messages()
                 st.rerun()
     
     with col3:
@@ -885,32 +808,253 @@ def feedback_screen():
             st.session_state.current_screen = 'progress'
             st.rerun()
 
+def pronunciation_section(expected_text):
+    """Record the suggested response and score its pronunciation word by word"""
+    scorer = get_pronunciation_scorer()
+    if scorer is None or not expected_text:
+        return
+    
+    st.markdown(f"<h3 style='color: #1e293b !important;'>🗣 {t('pronunciation')}</h3>", unsafe_allow_html=True)
+    st.caption(t('read_aloud_hint'))
+    audio_bytes = audio_recorder(text="", icon_size="2x", sample_rate=16000, key="pronunciation_input")
+    if audio_bytes and new_recording('pronunciation_input', audio_bytes):
+        try:
+            result = scorer.score(audio_bytes, expected_text)
+        except ValueError as e:
+            st.error(f"Error scoring pronunciation: {str(e)}")
+            return
+        st.session_state.pronunciation = {'text': expected_text, 'result': result}
+    
+    assessment = st.session_state.get('pronunciation')
+    if not assessment or assessment['text'] != expected_text:
+        return
+    result = assessment['result']
+    st.metric(t('pronunciation'), f"{result['score']}/100")
+    words = tuple((word['word'], word['score']) for word in result['words'])
+    st.markdown(pronunciation_html(words), unsafe_allow_html=True)
+    if not result['complete']:
+        st.caption(t('pronunciation_partial'))
+
 def progress_screen():
     """Progress tracking screen"""
     st.markdown(f"<h2 style='color: #1e293b !important;'>📊 {t('your_progress')}</h2>", unsafe_allow_html=True)
     
-    if not st.session_state.progress:
+    store = get_progress_store()
+    summary = store.summary(st.session_state.user_id)
+    if not summary['count']:
         st.info(t('no_sessions'))
     else:
-        st.markdown(f"<h3 style='color: #1e293b !important;'>{t('total_sessions')}: {len(st.session_state.progress)}</h3>", unsafe_allow_html=True)
+        st.markdown(f"<h3 style='color: #1e293b !important;'>{t('total_sessions')}: {summary['count']}</h3>", unsafe_allow_html=True)
         
-        # Calculate average score
-        avg_score = sum([p['score'] for p in st.session_state.progress]) / len(st.session_state.progress)
-        st.metric(t('average_score'), f"{avg_score:.1f}/5")
+        # Averages come from running totals kept at insert time
+        st.metric(t('average_score'), f"{summary['average']:.1f}/5")
+        scenario_averages = [(key, totals) for key, totals in summary['scenarios'].items() if key in SCENARIOS]
+        if scenario_averages:
+            cols = st.columns(len(scenario_averages))
+            for col, (key, totals) in zip(cols, scenario_averages):
+                scenario = SCENARIOS[key]
+                title = scenario.get('title_en' if st.session_state.language == 'en' else 'title', scenario['title'])
+                col.metric(f"{scenario['icon']} {title}", f"{totals['average']:.1f}/5", f"{totals['count']}×", delta_color="off")
         
         st.markdown("---")
         st.markdown(f"<h3 style='color: #1e293b !important;'>{t('recent_sessions')}</h3>", unsafe_allow_html=True)
         
-        for entry in reversed(st.session_state.progress):
-            with st.expander(f"{entry['scenario']} - {entry['score']}/5 - {entry['date']}"):
-                st.markdown(f"<p style='color: #1e293b !important;'><strong>{t('your_response')}:</strong> {entry['response']}</p>", unsafe_allow_html=True)
+        progress_history(store)
     
     if st.button("⬅️ " + t('back_to_scenarios'), use_container_width=True):
         st.session_state.current_screen = 'scenarios'
         st.rerun()
 
+def progress_history(store):
+    """One page of past sessions, navigated with keyset cursors
+    
+    Only the current page is queried and rendered, and response texts are
+    fetched when asked for, so reruns cost the same however long the history.
+    """
+    user_id = st.session_state.user_id
+    page_size = int(os.environ.get("PROGRESS_PAGE_SIZE", 10))
+    # Cursors of the pages visited so far; None is the newest page
+    cursors = st.session_state.setdefault('progress_cursors', [None])
+    shown = st.session_state.setdefault('shown_responses', {})
+    
+    entries, next_cursor = store.page(user_id, page_size, before=cursors[-1])
+    for entry in entries:
+        with st.expander(f"{entry['scenario']} - {entry['score']}/5 - {entry['date']}"):
+            if entry['id'] not in shown:
+                if st.button(t('show_response'), key=f"show_response_{entry['id']}"):
+                    shown[entry['id']] = store.response(user_id, entry['id'])
+            if entry['id'] in shown:
+                st.markdown(f"<p style='color: #1e293b !important;'><strong>{t('your_response')}:</strong> {shown[entry['id']]}</p>", unsafe_allow_html=True)
+    
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col1:
+        if len(cursors) > 1 and st.button("⬅️ " + t('newer'), use_container_width=True):
+            cursors.pop()
+            st.rerun()
+    with col2:
+        st.markdown(f"<p style='text-align: center; color: #1e293b !important;'>{t('page')} {len(cursors)}</p>", unsafe_allow_html=True)
+    with col3:
+        if next_cursor is not None and st.button(t('older') + " ➡️", use_container_width=True):
+            cursors.append(next_cursor)
+            st.rerun()
+
+def switch_user(user_id):
+    """Make user_id this session's learner; only anonymous ids go in the URL"""
+    st.session_state.user_id = user_id
+    if is_account_id(user_id):
+        st.query_params.pop("user", None)
+    else:
+        st.query_params["user"] = user_id
+    for key in ('progress_cursors', 'shown_responses', 'last_saved_response'):
+        st.session_state.pop(key, None)
+
+def sign_in(username, user_id):
+    st.session_state.username = normalize_username(username)
+    switch_user(user_id)
+    st.rerun()
+
+def account_panel():
+    """Sign in, or create an account; the signed-in learner lives only in this session"""
+    store = get_progress_store()
+    username = st.session_state.get('username')
+    if username:
+        st.markdown(f"<p style='color: white !important;'>👤 {t('signed_in_as')} <strong>{username}</strong></p>", unsafe_allow_html=True)
+        if st.button(t('sign_out'), key="sign_out_btn"):
+            st.session_state.username = None
+            switch_user(uuid.uuid4().hex)
+            st.rerun()
+        return
+    
+    with st.expander("👤 " + t('account')):
+        name = st.text_input(t('username'), key="account_username")
+        password = st.text_input(t('password'), type="password", key="account_password")
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button(t('sign_in'), key="sign_in_btn"):
+                user_id = store.authenticate(name, password)
+                if user_id is None:
+                    st.error(t('invalid_login'))
+                else:
+                    sign_in(name, user_id)
+        with col2:
+            if st.button(t('create_account'), key="create_account_btn"):
+                try:
+                    user_id = store.create_account(name, password)
+                except UsernameTakenError:
+                    st.error(t('username_taken'))
+                except EmptyPasswordError:
+                    st.error(t('empty_password'))
+                except AccountError:
+                    st.error(t('invalid_username'))
+                else:
+                    sign_in(name, user_id)
+
+def debug_enabled():
+    """Debug panel and metrics page are shown only with DEBUG_PANEL=1, never from the URL"""
+    return os.environ.get("DEBUG_PANEL") == "1"
+
+def debug_panel():
+    """Sidebar panel with latency and cache diagnostics"""
+    with st.expander("🛠 Debug"):
+        timings = st.session_state.get('feedback_timings')
+        if timings:
+            first_paint = timings['first_paint_ms']
+            if 'provisional_ms' in timings:
+                st.metric("Provisional score", f"{timings['provisional_ms']:.1f} ms")
+            st.metric("Time to first paint", f"{first_paint:.0f} ms" if first_paint is not None else "–")
+            st.metric("Total feedback time", f"{timings['total_ms']:.0f} ms")
+        stats = get_feedback_service().stats()
+        st.json(stats["cache"])
+        st.json(stats["gemini"])
+        st.json({"fallbacks": stats["fallbacks"], "repairs": stats["repairs"], "coalescing": stats["coalescing"]})
+        if stats["queue"] is not None:
+            st.json({"queue": stats["queue"]})
+        st.json({"context": conversation_context().stats()})
+        st.json({"catalog": get_catalog_loader().stats()})
+        st.json({"sessions": get_session_reaper().stats()})
+        st.json({"progress": get_progress_store().stats()})
+        speech_cache = get_speech_cache()
+        if speech_cache is not None:
+            st.json({"tts": speech_cache.stats()})
+        recognizer = get_speech_recognizer()
+        if recognizer is not None:
+            st.json({"speech": recognizer.stats(), "pronunciation": get_pronunciation_scorer().stats()})
+
+def metrics_screen():
+    """Admin page with stage latency percentiles, counters and recent request traces"""
+    st.markdown("<h2 style='color: #1e293b !important;'>📈 Metrics</h2>", unsafe_allow_html=True)
+    snapshot = REGISTRY.snapshot()
+    
+    # Latency per stage
+    rows = []
+    for (name, labels), histogram in sorted(snapshot['histograms'].items()):
+        if name != 'stage_seconds' or not histogram['count']:
+            continue
+        rows.append({
+            "stage": ", ".join(str(value) for _, value in labels),
+            "count": histogram['count'],
+            "p50 ms": round(histogram['p50'] * 1000, 1),
+            "p95 ms": round(histogram['p95'] * 1000, 1),
+            "p99 ms": round(histogram['p99'] * 1000, 1),
+        })
+    st.markdown("<h3 style='color: #1e293b !important;'>Stages</h3>", unsafe_allow_html=True)
+    st.table(rows)
+    
+    # Token estimates and request counters
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown("<h3 style='color: #1e293b !important;'>Tokens per request</h3>", unsafe_allow_html=True)
+        for name in ('prompt_tokens', 'response_tokens'):
+            histogram = snapshot['histograms'].get((name, ()))
+            if histogram and histogram['count']:
+                st.metric(name.replace('_', ' ').capitalize(),
+                          f"{histogram['sum'] / histogram['count']:.0f} avg", f"p95 {histogram['p95']:.0f}",
+                          delta_color="off")
+    with col2:
+        st.markdown("<h3 style='color: #1e293b !important;'>Requests</h3>", unsafe_allow_html=True)
+        st.json({
+            f"{name} {' '.join(f'{key}={value}' for key, value in labels)}".strip(): value
+            for (name, labels), value in sorted(snapshot['counters'].items())
+        })
+    
+    with st.expander("Gauges"):
+        st.json(snapshot['gauges'])
+    with st.expander("Recent requests"):
+        for trace in reversed(list(REGISTRY.traces)[-10:]):
+            st.json(trace, expanded=False)
+    
+    with st.expander("Prometheus"):
+        st.code(REGISTRY.render_prometheus(), language="text")
+
 # Main app router
 def main():
+    start_metrics_export()
+    
+    # Keep this session's transcript in memory and move idle ones to disk
+    reaper = get_session_reaper()
+    reaper.touch(st.session_state.session_id)
+    reaper.sweep()
+    
+    # A hot reload may have removed the scenario this session is in
+    if st.session_state.current_screen in ('practice', 'feedback') and \
+            st.session_state.selected_scenario not in SCENARIOS:
+        st.session_state.selected_scenario = None
+        st.session_state.current_screen = 'scenarios'
+        st.session_state.current_turn = 0
+        st.session_state.feedback_data = None
+        removed = st.session_state.pop('transcript', None)
+        if removed is not None:
+            removed.discard()
+        st.session_state.scenario_removed = True
+    
+    # Warm the shared feedback cache on the first run of this process
+    get_feedback_service().use_scenarios(SCENARIOS)
+    
+    # Synthesize every prompt in the background, once per catalog
+    speech_cache = get_speech_cache()
+    if speech_cache is not None:
+        speech_cache.use_scenarios(SCENARIOS)
+    
     # Sidebar
     with st.sidebar:
         st.markdown(f"<h3 style='color: white !important;'>{t('app_title')}</h3>", unsafe_allow_html=True)
@@ -950,19 +1094,29 @@ def main():
             st.rerun()
         
         st.markdown("---")
-        st.markdown(f"<p style='color: white !important;'><strong>{t('sessions_today')}:</strong> {str(len(st.session_state.progress))}</p>", unsafe_allow_html=True)
+        account_panel()
+        st.markdown(f"<p style='color: white !important;'><strong>{t('sessions_today')}:</strong> {get_progress_store().count_on(st.session_state.user_id, today())}</p>", unsafe_allow_html=True)
+        
+        if debug_enabled():
+            debug_panel()
+            if st.button("📈 Metrics"):
+                st.session_state.current_screen = 'metrics'
+                st.rerun()
     
     # Route to correct screen
-    if st.session_state.current_screen == 'landing':
-        landing_page()
-    elif st.session_state.current_screen == 'scenarios':
-        scenario_selection()
-    elif st.session_state.current_screen == 'practice':
-        practice_screen()
-    elif st.session_state.current_screen == 'feedback':
-        feedback_screen()
-    elif st.session_state.current_screen == 'progress':
-        progress_screen()
+    with REGISTRY.span("render", screen=st.session_state.current_screen):
+        if st.session_state.current_screen == 'landing':
+            landing_page()
+        elif st.session_state.current_screen == 'scenarios':
+            scenario_selection()
+        elif st.session_state.current_screen == 'practice':
+            practice_screen()
+        elif st.session_state.current_screen == 'feedback':
+            feedback_screen()
+        elif st.session_state.current_screen == 'progress':
+            progress_screen()
+        elif st.session_state.current_screen == 'metrics' and debug_enabled():
+            metrics_screen()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,250 @@
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+DEFAULT_CACHE_DIR = "tts_cache"
+DEFAULT_WORKERS = 2
+# How long a page render waits for audio that is still being synthesized
+DEFAULT_WAIT_SECONDS = 1.0
+# Audio other than the catalog's prompts, mostly suggested responses
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+SYNTHESIS_TIMEOUT = 30
+
+
+class SpeechSynthesisError(RuntimeError):
+    """Raised when the TTS engine fails to produce audio"""
+
+
+class PiperEngine:
+    """Piper neural TTS with a local German voice model"""
+
+    def __init__(self, model_path, binary="piper"):
+        self.model_path = model_path
+        self.binary = binary
+        self.id = f"piper:{os.path.basename(model_path)}"
+
+    def command(self, output_path):
+        return [self.binary, "--model", self.model_path, "--output_file", output_path]
+
+
+class EspeakEngine:
+    """eSpeak NG formant synthesis, small and available on most Linux hosts"""
+
+    def __init__(self, voice="de", binary="espeak-ng"):
+        self.voice = voice
+        self.binary = binary
+        self.id = f"espeak-ng:{voice}"
+
+    def command(self, output_path):
+        return [self.binary, "-v", self.voice, "-s", "150", "--stdin", "-w", output_path]
+
+
+def open_tts_engine(spec):
+    """Open the TTS engine described by spec, or None when none is available
+
+    Accepts ``piper:/path/to/voice.onnx``, ``espeak-ng`` or ``espeak-ng:<voice>``,
+    or an empty value to use eSpeak NG when it is installed.
+    """
+    if not spec:
+        return EspeakEngine() if shutil.which("espeak-ng") else None
+    name, _, argument = spec.partition(":")
+    if name == "piper":
+        if not argument:
+            raise ValueError("piper needs a voice model: piper:/path/to/voice.onnx")
+        return PiperEngine(argument)
+    if name == "espeak-ng":
+        return EspeakEngine(argument or "de")
+    if name == "off":
+        return None
+    raise ValueError(f"Unsupported TTS engine: {spec}")
+
+
+class SpeechCache:
+    """Synthesized German audio, content-addressed on disk
+
+    Files are named by a hash of the engine, voice and text, so identical
+    sentences are synthesized once and a voice change never serves stale
+    audio. Each text is synthesized at most once at a time; concurrent
+    requests for it wait on the same future, for at most wait_seconds.
+
+    Audio of the current catalog's prompts is kept; all other files are
+    evicted least recently used first once they exceed max_bytes.
+    """
+
+    def __init__(self, engine, directory=DEFAULT_CACHE_DIR, workers=DEFAULT_WORKERS,
+                 wait_seconds=DEFAULT_WAIT_SECONDS, max_bytes=DEFAULT_MAX_BYTES):
+        self.engine = engine
+        self.directory = directory
+        self.wait_seconds = wait_seconds
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tts")
+        self.scenarios = None
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._failed = set()
+        self._pinned = set()
+        # Evictable files and their sizes, least recently used first
+        self._evictable = OrderedDict(self._scan())
+        self._evictable_bytes = sum(self._evictable.values())
+        self.hits = 0
+        self.synthesized = 0
+        self.errors = 0
+        self.not_ready = 0
+        self.evicted = 0
+
+    @classmethod
+    def from_env(cls, environ=os.environ):
+        """Cache configured from TTS_* variables, or None without a TTS engine"""
+        engine = open_tts_engine(environ.get("TTS_ENGINE", ""))
+        if engine is None:
+            return None
+        return cls(
+            engine,
+            directory=environ.get("TTS_CACHE_DIR", DEFAULT_CACHE_DIR),
+            workers=int(environ.get("TTS_WORKERS", DEFAULT_WORKERS)),
+            wait_seconds=float(environ.get("TTS_WAIT_SECONDS", DEFAULT_WAIT_SECONDS)),
+            max_bytes=int(float(environ.get("TTS_CACHE_MAX_MB", DEFAULT_MAX_BYTES / (1024 * 1024))) * 1024 * 1024),
+        )
+
+    def _scan(self):
+        """(path, size) of the audio files already on disk, oldest first"""
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith(".wav"):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    files.append((stat.st_mtime, path, stat.st_size))
+        return [(path, size) for _, path, size in sorted(files)]
+
+    def path_for(self, text):
+        digest = hashlib.sha256(f"{self.engine.id}\0{text}".encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, digest[:2], f"{digest}.wav")
+
+    def _synthesize(self, text, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(suffix=".wav", dir=os.path.dirname(path))
+        os.close(fd)
+        try:
+            subprocess.run(
+                self.engine.command(tmp_path), input=text.encode("utf-8"),
+                check=True, capture_output=True, timeout=SYNTHESIS_TIMEOUT,
+            )
+            if os.path.getsize(tmp_path) == 0:
+                raise SpeechSynthesisError("no audio produced")
+            # Readers only ever see complete files
+            os.replace(tmp_path, path)
+        except (OSError, subprocess.SubprocessError, SpeechSynthesisError) as e:
+            with self._lock:
+                self.errors += 1
+                self._failed.add(path)
+            raise SpeechSynthesisError(f"{self.engine.id} failed: {e}") from e
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        with self._lock:
+            self.synthesized += 1
+            if path not in self._pinned:
+                self._evictable[path] = os.path.getsize(path)
+                self._evictable_bytes += self._evictable[path]
+                self._evict()
+        return path
+
+    def _evict(self):
+        """Delete least recently used evictable files until they fit max_bytes; call with the lock held"""
+        while self._evictable_bytes > self.max_bytes and len(self._evictable) > 1:
+            path, size = self._evictable.popitem(last=False)
+            self._evictable_bytes -= size
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            self.evicted += 1
+
+    def _submit(self, text):
+        """Future for the audio file of text, sharing one already in flight"""
+        path = self.path_for(text)
+        with self._lock:
+            future = self._in_flight.get(path)
+            if future is None:
+                future = self.executor.submit(self._synthesize, text, path)
+                self._in_flight[path] = future
+                future.add_done_callback(lambda _: self._forget(path))
+        return future
+
+    def _forget(self, path):
+        with self._lock:
+            self._in_flight.pop(path, None)
+
+    def audio_path(self, text):
+        """Path of the audio file for text, or None if it is not ready within wait_seconds
+
+        Text that is not on disk yet is synthesized in the background either
+        way, so a later call finds it.
+        """
+        path = self.path_for(text)
+        if os.path.exists(path):
+            with self._lock:
+                self.hits += 1
+                if path in self._evictable:
+                    self._evictable.move_to_end(path)
+            return path
+        # A text the engine failed on is not retried on every rerun
+        if path in self._failed:
+            raise SpeechSynthesisError(f"{self.engine.id} failed on this text before")
+        try:
+            return self._submit(text).result(timeout=self.wait_seconds)
+        except TimeoutError:
+            with self._lock:
+                self.not_ready += 1
+            return None
+
+    def warm(self, texts):
+        """Synthesize texts in the background, skipping those already on disk"""
+        for text in texts:
+            if not text:
+                continue
+            path = self.path_for(text)
+            if not os.path.exists(path) and path not in self._failed:
+                self._submit(text)
+
+    def use_scenarios(self, scenarios):
+        """Pre-synthesize every prompt of a newly loaded catalog"""
+        if scenarios is self.scenarios:
+            return
+        self.scenarios = scenarios
+        texts = [prompt['german'] for scenario in scenarios.values() for prompt in scenario['prompts']]
+        pinned = {self.path_for(text) for text in texts}
+        with self._lock:
+            # Prompts of a replaced catalog become evictable like any other audio
+            for path in self._pinned - pinned:
+                if os.path.exists(path):
+                    self._evictable[path] = os.path.getsize(path)
+                    self._evictable_bytes += self._evictable[path]
+            for path in pinned:
+                self._evictable_bytes -= self._evictable.pop(path, 0)
+            self._pinned = pinned
+            self._evict()
+        self.warm(texts)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "engine": self.engine.id,
+                "hits": self.hits,
+                "synthesized": self.synthesized,
+                "errors": self.errors,
+                "not_ready": self.not_ready,
+                "in_flight": len(self._in_flight),
+                "evictable_bytes": self._evictable_bytes,
+                "evicted": self.evicted,
+            }